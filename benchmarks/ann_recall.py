@@ -0,0 +1,94 @@
+"""
+Бенчмарк точности и задержки приближенного поиска IVF относительно точного поиска
+
+Запуск из корня проекта:
+    python -m benchmarks.ann_recall --size 200000 --nprobe 1 4 8 16 32
+"""
+
+import argparse
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.common import summarize, write_report
+from src.chatbot_app.vector_backends import LocalBackend
+
+
+def make_corpus(size: int, dimension: int, clusters: int, seed: int) -> np.ndarray:
+    """Синтетический кластеризованный корпус, похожий по структуре на эмбеддинги текстов"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, size)
+    return centers[labels] + 0.5 * rng.standard_normal((size, dimension)).astype(np.float32)
+
+
+def measure(backend: LocalBackend, queries: np.ndarray, top_k: int) -> Dict[str, Any]:
+    """Задержки поиска и найденные идентификаторы для набора запросов"""
+    latencies = []
+    found: List[List[str]] = []
+    for query in queries:
+        started = time.perf_counter()
+        results = backend.query(query, top_k, "bench")
+        latencies.append(time.perf_counter() - started)
+        found.append([r["id"] for r in results])
+    return {"found": found, **summarize(latencies)}
+
+
+def recall(found: List[List[str]], expected: List[List[str]]) -> float:
+    """Доля истинных top-k, найденных приближенным поиском"""
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found, expected))
+    return hits / sum(len(e) for e in expected)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100000, help="Размер корпуса")
+    parser.add_argument("--dimension", type=int, default=312, help="Размерность (rubert-tiny2 - 312)")
+    parser.add_argument("--clusters", type=int, default=500, help="Число кластеров в синтетических данных")
+    parser.add_argument("--queries", type=int, default=200, help="Число запросов")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="Число кластеров IVF (0 - 4 * sqrt(n))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Файл для сохранения отчета в JSON")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.size, args.dimension, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = corpus[rng.choice(args.size, args.queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+    records = [{"id": str(i), "values": row} for i, row in enumerate(corpus)]
+
+    exact = LocalBackend(index_type="flat")
+    exact.start(args.dimension)
+    exact.upsert(records, "bench")
+    baseline = measure(exact, queries, args.top_k)
+
+    ivf = LocalBackend(index_type="ivf", nlist=args.nlist, min_train_size=1)
+    ivf.start(args.dimension)
+    started = time.perf_counter()
+    ivf.upsert(records, "bench")
+    build_s = time.perf_counter() - started
+
+    report: Dict[str, Any] = {
+        "size": args.size,
+        "dimension": args.dimension,
+        "top_k": args.top_k,
+        "ivf_build_s": build_s,
+        "exact": {k: v for k, v in baseline.items() if k != "found"},
+        "ivf": [],
+    }
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        result = measure(ivf, queries, args.top_k)
+        report["ivf"].append({
+            "nprobe": nprobe,
+            "recall": recall(result["found"], baseline["found"]),
+            **{k: v for k, v in result.items() if k != "found"},
+        })
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
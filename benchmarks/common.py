@@ -0,0 +1,63 @@
+"""
+Общие функции бенчмарков: замер задержек и машиночитаемые сводки
+"""
+
+import json
+import platform
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def summarize(latencies_s: List[float], wall_s: Optional[float] = None) -> Dict[str, float]:
+    """
+    Сводка задержек: p50/p95/p99/mean в миллисекундах и пропускная способность
+
+    Args:
+        latencies_s: Задержки отдельных операций в секундах
+        wall_s: Общее время прогона (для конкурентной нагрузки); по умолчанию сумма задержек
+    """
+    if not latencies_s:
+        return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0, "qps": 0.0}
+    latencies_ms = np.asarray(latencies_s) * 1000
+    wall_s = wall_s if wall_s is not None else float(np.sum(latencies_s))
+    return {
+        "count": int(len(latencies_ms)),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "mean_ms": float(latencies_ms.mean()),
+        "qps": float(len(latencies_ms) / wall_s) if wall_s else 0.0,
+    }
+
+
+def timeit(func: Callable[[], Any], repeat: int, warmup: int = 3) -> Dict[str, float]:
+    """Многократный замер функции без аргументов"""
+    for _ in range(warmup):
+        func()
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+
+def environment() -> Dict[str, Any]:
+    """Сведения об окружении прогона для сравнения результатов"""
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def write_report(report: Dict[str, Any], output: Optional[str]) -> None:
+    """Вывод отчета в stdout и, при необходимости, в JSON файл"""
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
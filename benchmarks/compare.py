@@ -0,0 +1,86 @@
+"""
+Сравнение двух отчетов бенчмарков и поиск регрессий
+
+Сравниваются все совпадающие метрики задержек (*_ms) и пропускной способности (qps)
+во вложенных секциях отчетов. Код выхода 1, если хотя бы одна метрика ухудшилась
+больше порога.
+
+Запуск из корня проекта:
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, Tuple
+
+# Метрики, для которых больше - лучше; для остальных (*_ms) лучше меньше
+HIGHER_IS_BETTER = ("qps", "queries_per_second", "recall")
+LOWER_IS_BETTER_SUFFIX = "_ms"
+
+
+def iter_metrics(report: Any, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """Плоский список числовых метрик отчета с путями вида search.flat.p95_ms"""
+    if isinstance(report, dict):
+        for key, value in report.items():
+            if key in ("environment", "params", "service_stats"):
+                continue
+            yield from iter_metrics(value, f"{prefix}{key}.")
+    elif isinstance(report, list):
+        for i, value in enumerate(report):
+            yield from iter_metrics(value, f"{prefix}{i}.")
+    elif isinstance(report, (int, float)) and not isinstance(report, bool):
+        name = prefix.rstrip(".")
+        metric = name.rsplit(".", 1)[-1]
+        if metric in HIGHER_IS_BETTER or metric.endswith(LOWER_IS_BETTER_SUFFIX):
+            yield name, float(report)
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """
+    Изменения метрик кандидата относительно базового отчета
+
+    Args:
+        threshold: Допустимое ухудшение в процентах
+    """
+    base = dict(iter_metrics(baseline))
+    rows = []
+    for name, value in iter_metrics(candidate):
+        if name not in base or base[name] == 0:
+            continue
+        change = (value - base[name]) / base[name] * 100
+        metric = name.rsplit(".", 1)[-1]
+        worse = -change if metric in HIGHER_IS_BETTER else change
+        rows.append({
+            "metric": name,
+            "baseline": base[name],
+            "candidate": value,
+            "change_pct": change,
+            "regression": worse > threshold,
+        })
+    return {"threshold_pct": threshold, "metrics": rows, "regressions": [r["metric"] for r in rows if r["regression"]]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline", help="Базовый отчет JSON")
+    parser.add_argument("candidate", help="Новый отчет JSON")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Допустимое ухудшение в процентах")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    result = compare(baseline, candidate, args.threshold)
+    for row in result["metrics"]:
+        mark = "REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<60} {row['baseline']:>12.4f} {row['candidate']:>12.4f} {row['change_pct']:>+8.1f}% {mark}")
+    if result["regressions"]:
+        print(f"Регрессии больше {args.threshold}%: {len(result['regressions'])}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
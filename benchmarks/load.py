@@ -0,0 +1,210 @@
+"""
+Нагрузочный тест HTTP API чат-бота с фиксированным числом конкурентных клиентов
+
+Запуск против уже работающего сервиса:
+    python -m benchmarks.load --url http://localhost:8010 --concurrency 16 --duration 30
+
+Запуск с локальными заглушками Pinecone и n8n (сервис поднимается в отдельном
+процессе, наружу запросы не уходят; нужна установленная модель):
+    python -m benchmarks.load --spawn --pinecone-latency-ms 20 --concurrency 16 --output load.json
+
+Отчет содержит p50/p95/p99, пропускную способность, распределение кодов ответа
+и параметры прогона; два отчета сравниваются через benchmarks.compare.
+"""
+
+import argparse
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from benchmarks.common import environment, summarize, write_report
+from src.chatbot_app.inference import REFERENCE_QUERIES
+
+logger = logging.getLogger(__name__)
+
+
+def wait_ready(url: str, timeout: float) -> None:
+    """Ожидание готовности сервиса по /ready"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/ready", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Сервис {url} не готов за {timeout} с")
+
+
+def spawn_service(port: int, workers: int, pinecone_host: str, webhook_url: str,
+                  extra_env: Dict[str, str]) -> subprocess.Popen:
+    """Запуск сервиса в отдельном процессе с адресами заглушек вместо внешних сервисов"""
+    env = dict(os.environ)
+    env.update({
+        "PINECONE_API_KEY": env.get("PINECONE_API_KEY") or "benchmark",
+        "PINECONE_HOST": pinecone_host,
+        "N8N_WEBHOOK_URL": webhook_url,
+    })
+    env.update(extra_env)
+    command = [
+        sys.executable, "-m", "uvicorn", "src.chatbot_app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, env=env)
+
+
+def make_payload(endpoint: str, batch_size: int, rng: random.Random) -> Dict[str, Any]:
+    if endpoint == "/query/batch":
+        return {"queries": [{"query": rng.choice(REFERENCE_QUERIES)} for _ in range(batch_size)]}
+    return {"query": rng.choice(REFERENCE_QUERIES)}
+
+
+def run_load(url: str, endpoint: str, concurrency: int, requests_total: int, duration: float,
+             batch_size: int, timeout: float, seed: int) -> Dict[str, Any]:
+    """
+    Замкнутая нагрузка: каждый клиент отправляет следующий запрос после ответа на предыдущий
+
+    Args:
+        requests_total: Общее число запросов (0 - ограничение только по duration)
+        duration: Длительность прогона в секундах (0 - ограничение только по requests_total)
+    """
+    lock = threading.Lock()
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    sent = [0]
+    deadline = time.monotonic() + duration if duration else None
+
+    def take() -> bool:
+        with lock:
+            if requests_total and sent[0] >= requests_total:
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            sent[0] += 1
+            return True
+
+    def client(worker: int) -> None:
+        rng = random.Random(seed + worker)
+        session = requests.Session()
+        while take():
+            payload = make_payload(endpoint, batch_size, rng)
+            started = time.perf_counter()
+            try:
+                status = str(session.post(f"{url}{endpoint}", json=payload, timeout=timeout).status_code)
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == "200":
+                    latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    errors = sum(count for status, count in statuses.items() if status != "200")
+    report = summarize(latencies, wall)
+    report.update({
+        "requests": sum(statuses.values()),
+        "errors": errors,
+        "error_rate": errors / max(1, sum(statuses.values())),
+        "statuses": statuses,
+        "wall_s": wall,
+    })
+    if endpoint == "/query/batch":
+        report["queries_per_second"] = report["qps"] * batch_size
+    return report
+
+
+def fetch_stats(url: str) -> Optional[Dict[str, Any]]:
+    try:
+        return requests.get(f"{url}/stats", timeout=5).json()
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Адрес сервиса")
+    parser.add_argument("--endpoint", choices=["/query", "/query/batch"], default="/query")
+    parser.add_argument("--concurrency", type=int, default=8, help="Число конкурентных клиентов")
+    parser.add_argument("--requests", type=int, default=0, help="Общее число запросов")
+    parser.add_argument("--duration", type=float, default=20.0, help="Длительность прогона в секундах")
+    parser.add_argument("--warmup", type=int, default=20, help="Запросов на прогрев перед замером")
+    parser.add_argument("--batch-size", type=int, default=16, help="Запросов в одном /query/batch")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Таймаут одного запроса")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Файл для сохранения отчета в JSON")
+    spawn = parser.add_argument_group("Запуск сервиса с заглушками")
+    spawn.add_argument("--spawn", action="store_true", help="Поднять заглушки и сервис локально")
+    spawn.add_argument("--port", type=int, default=8765)
+    spawn.add_argument("--workers", type=int, default=1, help="Число процессов uvicorn")
+    spawn.add_argument("--pinecone-latency-ms", type=float, default=20.0)
+    spawn.add_argument("--pinecone-jitter-ms", type=float, default=5.0)
+    spawn.add_argument("--pinecone-error-rate", type=float, default=0.0)
+    spawn.add_argument("--webhook-latency-ms", type=float, default=5.0)
+    spawn.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                       help="Дополнительные переменные окружения сервиса")
+    spawn.add_argument("--startup-timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    process = None
+    stubs: Dict[str, Any] = {}
+    url = args.url
+    if args.spawn:
+        from benchmarks.stubs import start_fake_pinecone, start_webhook_sink
+
+        _, pinecone = start_fake_pinecone(
+            latency_ms=args.pinecone_latency_ms, jitter_ms=args.pinecone_jitter_ms,
+            error_rate=args.pinecone_error_rate,
+        )
+        webhook_server, webhook = start_webhook_sink(latency_ms=args.webhook_latency_ms)
+        extra_env = dict(item.split("=", 1) for item in args.env)
+        process = spawn_service(
+            args.port, args.workers, pinecone.host,
+            f"http://127.0.0.1:{webhook_server.server_port}/webhook", extra_env,
+        )
+        stubs = {"pinecone": pinecone, "webhook": webhook}
+        url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        wait_ready(url, args.startup_timeout if args.spawn else 10.0)
+        if args.warmup:
+            run_load(url, args.endpoint, min(args.concurrency, args.warmup), args.warmup, 0,
+                     args.batch_size, args.timeout, args.seed)
+        result = run_load(url, args.endpoint, args.concurrency, args.requests, args.duration,
+                          args.batch_size, args.timeout, args.seed)
+        report: Dict[str, Any] = {
+            "environment": environment(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "env")},
+            "result": result,
+            "service_stats": fetch_stats(url),
+        }
+        if stubs:
+            report["stubs"] = {
+                "pinecone_requests": stubs["pinecone"].requests,
+                "webhook_requests": stubs["webhook"].requests,
+                "webhook_events": stubs["webhook"].events,
+            }
+        write_report(report, args.output)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Микробенчмарки отдельных этапов обработки запроса: векторизация, поиск, сериализация
+
+Запуск из корня проекта:
+    python -m benchmarks.micro --size 20000 --repeat 200 --output micro.json
+
+Этап векторизации выполняется только при установленной модели (sentence-transformers
+или экспортированная ONNX модель, см. INFERENCE_BACKEND), остальные этапы используют
+синтетические данные и детерминированы при одинаковом --seed.
+"""
+
+import argparse
+import json
+import logging
+from typing import Any, Dict
+
+import numpy as np
+
+from benchmarks.ann_recall import make_corpus
+from benchmarks.common import environment, timeit, write_report
+from src.chatbot_app.cache import normalize_query, vector_digest
+from src.chatbot_app.schemas import BotResponse
+from src.chatbot_app.vector_backends import LocalBackend
+
+logger = logging.getLogger(__name__)
+
+QUERY = "Персонаж застревает в текстурах после загрузки сохранения"
+
+
+def bench_encode(repeat: int, batch_size: int) -> Dict[str, Any]:
+    """Векторизация одного запроса и пакета запросов выбранным INFERENCE_BACKEND"""
+    from src.chatbot_app.config import INFERENCE_BACKEND
+    from src.chatbot_app.inference import REFERENCE_QUERIES, load_encoder
+
+    model = load_encoder()
+    batch = (REFERENCE_QUERIES * (batch_size // len(REFERENCE_QUERIES) + 1))[:batch_size]
+    return {
+        "backend": INFERENCE_BACKEND,
+        "single": timeit(lambda: model.encode([QUERY]), repeat),
+        f"batch_{batch_size}": timeit(lambda: model.encode(batch), max(1, repeat // 10)),
+    }
+
+
+def bench_search(corpus: np.ndarray, queries: np.ndarray, top_k: int) -> Dict[str, Any]:
+    """Поиск по локальному индексу: точный, IVF и пакетный"""
+    records = [
+        {"id": str(i), "values": row, "metadata": {"bug_id": str(i), "description": "bug"}}
+        for i, row in enumerate(corpus)
+    ]
+    report: Dict[str, Any] = {}
+    for index_type in ("flat", "ivf"):
+        backend = LocalBackend(index_type=index_type, min_train_size=1)
+        backend.start(corpus.shape[1])
+        backend.upsert(records, "bench")
+        position = iter(range(10 ** 9))
+        report[index_type] = timeit(
+            lambda: backend.query(queries[next(position) % len(queries)], top_k, "bench"), len(queries)
+        )
+        if index_type == "flat":
+            report["flat_batch"] = timeit(lambda: backend.query_batch(queries, top_k, "bench"), 10)
+            report["flat_batch"]["queries_per_call"] = len(queries)
+    return report
+
+
+def bench_serialization(dimension: int, repeat: int, seed: int) -> Dict[str, Any]:
+    """Сериализация вектора и ответа, ключи кэша"""
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    values = vector.tolist()
+    response = BotResponse(
+        response="Перезапустить уровень",
+        confidence=0.87,
+        bug_title="Персонаж проваливается сквозь пол",
+        bug_description="Персонаж проваливается сквозь пол после загрузки сохранения",
+    )
+    return {
+        "vector_json_dumps": timeit(lambda: json.dumps(values), repeat),
+        "vector_json_loads": timeit(lambda: json.loads(json.dumps(values)), repeat),
+        "vector_tolist": timeit(vector.tolist, repeat),
+        "vector_tobytes": timeit(vector.tobytes, repeat),
+        "response_model_dump_json": timeit(response.model_dump_json, repeat),
+        "cache_key_query": timeit(lambda: normalize_query(QUERY), repeat),
+        "cache_key_vector": timeit(lambda: vector_digest(values), repeat),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20000, help="Размер синтетического корпуса")
+    parser.add_argument("--dimension", type=int, default=312)
+    parser.add_argument("--queries", type=int, default=200, help="Число запросов для поиска")
+    parser.add_argument("--top-k", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1000, help="Повторов для сериализации")
+    parser.add_argument("--encode-repeat", type=int, default=50, help="Повторов для векторизации")
+    parser.add_argument("--encode-batch", type=int, default=32, help="Размер пакета для векторизации")
+    parser.add_argument("--skip-encode", action="store_true", help="Не замерять векторизацию")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Файл для сохранения отчета в JSON")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.size, args.dimension, max(1, args.size // 200), args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = corpus[rng.choice(args.size, args.queries, replace=False)]
+
+    report: Dict[str, Any] = {
+        "environment": environment(),
+        "params": vars(args),
+        "search": bench_search(corpus, queries, args.top_k),
+        "serialization": bench_serialization(args.dimension, args.repeat, args.seed),
+    }
+    if not args.skip_encode:
+        try:
+            report["encode"] = bench_encode(args.encode_repeat, args.encode_batch)
+        except Exception as e:
+            logger.warning(f"Векторизация пропущена: {str(e)}")
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
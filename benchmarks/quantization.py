@@ -0,0 +1,99 @@
+"""
+Бенчмарк сжатия векторов локального индекса: экономия памяти и потеря точности
+
+Для каждого типа сжатия (float16, int8, pq) и числа переоцениваемых кандидатов
+сравнивает top-k с точным поиском по float32 на эталонном наборе запросов.
+По умолчанию корпус синтетический (как в ann_recall); реальные эмбеддинги можно
+передать файлами .npy.
+
+Запуск из корня проекта:
+    python -m benchmarks.quantization --size 100000 --quantization float16 int8 pq --rerank 0 20 50
+    python -m benchmarks.quantization --corpus corpus.npy --queries queries.npy
+"""
+
+import argparse
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+from benchmarks.ann_recall import make_corpus, measure, recall
+from benchmarks.common import write_report
+from src.chatbot_app.vector_backends import LocalBackend
+
+
+def top1_agreement(found, expected) -> float:
+    """Доля запросов, у которых лучший результат совпадает с точным поиском"""
+    return sum(bool(f) and bool(e) and f[0] == e[0] for f, e in zip(found, expected)) / max(1, len(expected))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100000, help="Размер синтетического корпуса")
+    parser.add_argument("--dimension", type=int, default=312, help="Размерность (rubert-tiny2 - 312)")
+    parser.add_argument("--clusters", type=int, default=500, help="Число кластеров в синтетических данных")
+    parser.add_argument("--num-queries", type=int, default=200, help="Число синтетических запросов")
+    parser.add_argument("--corpus", help="Матрица эмбеддингов корпуса (.npy) вместо синтетической")
+    parser.add_argument("--queries", help="Матрица эмбеддингов эталонных запросов (.npy)")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--quantization", nargs="+", default=["float16", "int8", "pq"])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 20, 50], help="Число переоцениваемых кандидатов")
+    parser.add_argument("--pq-subvectors", type=int, default=0, help="Число подвекторов PQ (0 - размерность / 4)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Файл для сохранения отчета в JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed + 1)
+    if args.corpus:
+        corpus = np.load(args.corpus).astype(np.float32)
+    else:
+        corpus = make_corpus(args.size, args.dimension, args.clusters, args.seed)
+    if args.queries:
+        queries = np.load(args.queries).astype(np.float32)
+    else:
+        queries = corpus[rng.choice(len(corpus), args.num_queries, replace=False)]
+        queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+    dimension = corpus.shape[1]
+    records = [{"id": str(i), "values": row} for i, row in enumerate(corpus)]
+
+    exact = LocalBackend(index_type="flat")
+    exact.start(dimension)
+    exact.upsert(records, "bench")
+    baseline = measure(exact, queries, args.top_k)
+    float32_bytes = exact.memory_usage("bench")["float32_bytes"]
+
+    report: Dict[str, Any] = {
+        "size": len(corpus),
+        "dimension": dimension,
+        "queries": len(queries),
+        "top_k": args.top_k,
+        "float32_bytes": float32_bytes,
+        "exact": {k: v for k, v in baseline.items() if k != "found"},
+        "quantized": [],
+    }
+    for kind in args.quantization:
+        backend = LocalBackend(index_type="flat", quantization=kind, pq_subvectors=args.pq_subvectors)
+        backend.start(dimension)
+        started = time.perf_counter()
+        backend.upsert(records, "bench")
+        build_s = time.perf_counter() - started
+        usage = backend.memory_usage("bench")
+        for rerank in args.rerank:
+            backend.rerank_candidates = rerank
+            result = measure(backend, queries, args.top_k)
+            report["quantized"].append({
+                "quantization": kind,
+                "rerank": rerank,
+                "code_bytes": usage["code_bytes"],
+                "saved_bytes": float32_bytes - usage["code_bytes"],
+                "compression": usage["compression"],
+                "build_s": build_s,
+                "recall": recall(result["found"], baseline["found"]),
+                "top1_agreement": top1_agreement(result["found"], baseline["found"]),
+                **{k: v for k, v in result.items() if k != "found"},
+            })
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
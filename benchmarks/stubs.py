@@ -0,0 +1,275 @@
+"""
+Локальные заглушки внешних сервисов для бенчмарков: Pinecone и webhook n8n
+
+Заглушка Pinecone реализует подмножество REST API, которое использует SDK:
+control plane (список и описание индексов, создание индекса) и data plane
+(query, upsert, delete, статистика) с настраиваемой задержкой и долей ошибок.
+Заглушка n8n принимает события и считает их.
+
+Запуск отдельно из корня проекта:
+    python -m benchmarks.stubs --pinecone-port 5080 --webhook-port 5678 --latency-ms 30
+и затем сервис с PINECONE_HOST=http://127.0.0.1:5080 и
+N8N_WEBHOOK_URL=http://127.0.0.1:5678/webhook.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+
+class FakePineconeState:
+    """Индексы, векторы и параметры задержки заглушки Pinecone"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.host = ""
+        self.lock = threading.Lock()
+        self.indexes: Dict[str, Dict[str, Any]] = {}
+        # namespace -> {id: (нормализованный вектор, метаданные)}
+        self.namespaces: Dict[str, Dict[str, Tuple[np.ndarray, Dict[str, Any]]]] = {}
+        self.requests = 0
+
+    def delay(self) -> None:
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def describe(self, name: str) -> Dict[str, Any]:
+        index = self.indexes[name]
+        return {
+            "name": name,
+            "dimension": index["dimension"],
+            "metric": index.get("metric", "cosine"),
+            "host": self.host,
+            "spec": {"serverless": {"cloud": "aws", "region": "us-east-1"}},
+            "status": {"ready": True, "state": "Ready"},
+            "deletion_protection": "disabled",
+            "vector_type": "dense",
+        }
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str) -> int:
+        with self.lock:
+            store = self.namespaces.setdefault(namespace, {})
+            for vector in vectors:
+                values = np.asarray(vector["values"], dtype=np.float32)
+                norm = np.linalg.norm(values)
+                store[vector["id"]] = (values / norm if norm else values, vector.get("metadata") or {})
+        return len(vectors)
+
+    def delete(self, ids: List[str], namespace: str) -> None:
+        with self.lock:
+            store = self.namespaces.get(namespace, {})
+            for bug_id in ids:
+                store.pop(bug_id, None)
+
+    def query(self, vector: List[float], top_k: int, namespace: str, include_metadata: bool) -> List[Dict[str, Any]]:
+        with self.lock:
+            items = list(self.namespaces.get(namespace, {}).items())
+        if not items:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = np.stack([values for _, (values, _) in items]) @ query
+        best = np.argsort(-scores)[:top_k]
+        matches = []
+        for i in best:
+            match = {"id": items[i][0], "score": float(scores[i]), "values": []}
+            if include_metadata:
+                match["metadata"] = items[i][1][1]
+            matches.append(match)
+        return matches
+
+
+def make_pinecone_handler(state: FakePineconeState):
+    """Обработчик HTTP запросов заглушки Pinecone"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _body(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length)) if length else {}
+
+        def _reply(self, status: int, payload: Optional[Dict[str, Any]] = None) -> None:
+            data = json.dumps(payload or {}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _data_plane(self) -> bool:
+            """Задержка и искусственные ошибки для запросов к данным"""
+            state.requests += 1
+            state.delay()
+            if state.error_rate and random.random() < state.error_rate:
+                self._reply(503, {"error": {"code": "UNAVAILABLE", "message": "injected failure"}})
+                return False
+            return True
+
+        def do_GET(self) -> None:
+            if self.path == "/indexes":
+                self._reply(200, {"indexes": [state.describe(name) for name in state.indexes]})
+            elif self.path.startswith("/indexes/"):
+                name = self.path.split("/")[2]
+                if name in state.indexes:
+                    self._reply(200, state.describe(name))
+                else:
+                    self._reply(404, {"error": {"code": "NOT_FOUND", "message": f"Index {name} not found"}})
+            elif self.path.startswith("/describe_index_stats"):
+                self._reply(200, self._stats())
+            elif self.path.startswith("/vectors/list") or self.path.startswith("/vectors/fetch"):
+                if self._data_plane():
+                    self._reply(200, self._vectors(parse_qs(urlparse(self.path).query)))
+            else:
+                self._reply(404)
+
+        def _vectors(self, params: Dict[str, List[str]]) -> Dict[str, Any]:
+            """Перечисление id (list) и чтение записей (fetch) для сверки хранилища документов"""
+            namespace = (params.get("namespace") or [""])[0]
+            with state.lock:
+                store = dict(state.namespaces.get(namespace, {}))
+            if self.path.startswith("/vectors/list"):
+                return {"vectors": [{"id": bug_id} for bug_id in store], "namespace": namespace, "usage": {"readUnits": 1}}
+            vectors = {
+                bug_id: {"id": bug_id, "values": store[bug_id][0].tolist(), "metadata": store[bug_id][1]}
+                for bug_id in params.get("ids", []) if bug_id in store
+            }
+            return {"vectors": vectors, "namespace": namespace, "usage": {"readUnits": 1}}
+
+        def do_POST(self) -> None:
+            body = self._body()
+            if self.path == "/indexes":
+                state.indexes[body["name"]] = {"dimension": body["dimension"], "metric": body.get("metric", "cosine")}
+                self._reply(201, state.describe(body["name"]))
+            elif self.path == "/query":
+                if self._data_plane():
+                    namespace = body.get("namespace", "")
+                    matches = state.query(body["vector"], body.get("topK", 10), namespace, body.get("includeMetadata", False))
+                    self._reply(200, {"matches": matches, "namespace": namespace, "usage": {"readUnits": 1}})
+            elif self.path == "/vectors/upsert":
+                if self._data_plane():
+                    count = state.upsert(body.get("vectors", []), body.get("namespace", ""))
+                    self._reply(200, {"upsertedCount": count})
+            elif self.path == "/vectors/delete":
+                if self._data_plane():
+                    state.delete(body.get("ids", []), body.get("namespace", ""))
+                    self._reply(200, {})
+            elif self.path == "/describe_index_stats":
+                self._reply(200, self._stats())
+            else:
+                self._reply(404)
+
+        def _stats(self) -> Dict[str, Any]:
+            with state.lock:
+                namespaces = {name: {"vectorCount": len(store)} for name, store in state.namespaces.items()}
+            dimension = next(iter(state.indexes.values()))["dimension"] if state.indexes else 0
+            return {
+                "namespaces": namespaces,
+                "dimension": dimension,
+                "indexFullness": 0.0,
+                "totalVectorCount": sum(ns["vectorCount"] for ns in namespaces.values()),
+            }
+
+    return Handler
+
+
+class WebhookSink:
+    """Счетчик событий, принятых заглушкой webhook n8n"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.events = 0
+
+
+def make_webhook_handler(sink: WebhookSink):
+    """Обработчик HTTP запросов заглушки webhook n8n"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else {}
+            if sink.latency_ms:
+                time.sleep(sink.latency_ms / 1000)
+            with sink.lock:
+                sink.requests += 1
+                sink.events += len(body.get("events", [])) if "events" in body else 1
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_GET(self) -> None:
+            with sink.lock:
+                data = json.dumps({"requests": sink.requests, "events": sink.events}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def _serve(server: ThreadingHTTPServer) -> ThreadingHTTPServer:
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server
+
+
+def start_fake_pinecone(port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                        error_rate: float = 0.0) -> Tuple[ThreadingHTTPServer, FakePineconeState]:
+    """Запуск заглушки Pinecone в фоновом потоке; host - адрес для PINECONE_HOST"""
+    state = FakePineconeState(latency_ms, jitter_ms, error_rate)
+    server = _serve(ThreadingHTTPServer(("127.0.0.1", port), make_pinecone_handler(state)))
+    state.host = f"http://127.0.0.1:{server.server_port}"
+    return server, state
+
+
+def start_webhook_sink(port: int = 0, latency_ms: float = 0.0) -> Tuple[ThreadingHTTPServer, WebhookSink]:
+    """Запуск заглушки webhook n8n в фоновом потоке"""
+    sink = WebhookSink(latency_ms)
+    server = _serve(ThreadingHTTPServer(("127.0.0.1", port), make_webhook_handler(sink)))
+    return server, sink
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pinecone-port", type=int, default=5080)
+    parser.add_argument("--webhook-port", type=int, default=5678)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Задержка ответа Pinecone")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Разброс задержки Pinecone")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля запросов, завершающихся 503")
+    parser.add_argument("--webhook-latency-ms", type=float, default=0.0, help="Задержка ответа webhook")
+    args = parser.parse_args()
+
+    _, state = start_fake_pinecone(args.pinecone_port, args.latency_ms, args.jitter_ms, args.error_rate)
+    start_webhook_sink(args.webhook_port, args.webhook_latency_ms)
+    print(f"Pinecone: {state.host}, webhook: http://127.0.0.1:{args.webhook_port}/webhook")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
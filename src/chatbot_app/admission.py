@@ -0,0 +1,235 @@
+"""
+Контроль допуска запросов (admission control) при перегрузке
+
+Одновременно обрабатывается не больше max_in_flight запросов, остальные ждут в
+ограниченной очереди. Запрос сразу получает отказ (503 с Retry-After), если очередь
+заполнена или ожидаемое время ожидания (по скользящему среднему длительности
+обработки) превышает дедлайн очереди, и получает отказ по истечении дедлайна, если
+место так и не освободилось. Поэтому при всплеске трафика задержка принятых
+запросов остается ограниченной, а клиенты сразу узнают, когда повторить запрос,
+вместо того чтобы ждать до своего таймаута.
+
+Запросы делятся на полосы: interactive (пользователи интерфейса) и batch (пакетные
+запросы, прогоны QA). С включенными приоритетами освободившееся место получает
+сначала ожидающий interactive запрос, а при заполненной очереди interactive запрос
+вытесняет из нее последний ожидающий batch запрос.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .config import (
+    ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT_MS, ADMISSION_PRIORITY_LANES
+)
+from .metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_QUEUE_WAIT_SECONDS, ADMISSION_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, которым клиент указывает полосу запроса (interactive или batch)
+PRIORITY_HEADER = "X-Request-Priority"
+
+LANES = ("interactive", "batch")
+
+# Вес нового замера в скользящем среднем длительности обработки
+_SERVICE_TIME_ALPHA = 0.1
+
+
+class OverloadedError(Exception):
+    """Запрос не допущен к обработке: сервис перегружен"""
+
+    def __init__(self, message: str, reason: str, retry_after: float):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionSlot:
+    """Место для обработки одного запроса; release можно вызывать повторно"""
+
+    def __init__(self, controller: Optional["AdmissionController"], lane: str):
+        self._controller = controller
+        self.lane = lane
+        self.started = time.monotonic()
+
+    def release(self) -> None:
+        controller, self._controller = self._controller, None
+        if controller is not None:
+            controller._release(time.monotonic() - self.started)
+
+
+class AdmissionController:
+    """
+    Ограничение числа одновременно обрабатываемых запросов с очередью по полосам
+
+    Все методы вызываются из event loop сервера (по одному контроллеру на воркер).
+    """
+
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout_ms: float = ADMISSION_QUEUE_TIMEOUT_MS, priority_lanes: bool = ADMISSION_PRIORITY_LANES):
+        """
+        Args:
+            max_in_flight: Максимум одновременно обрабатываемых запросов (0 - без ограничения)
+            max_queue: Максимум ожидающих запросов во всех полосах
+            queue_timeout_ms: Дедлайн ожидания в очереди (мс)
+            priority_lanes: Обслуживать interactive запросы раньше batch
+        """
+        self.max_in_flight = max(0, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = max(0.0, queue_timeout_ms) / 1000
+        self.priority_lanes = priority_lanes
+        self._in_flight = 0
+        self._sequence = 0
+        # полоса -> очередь (порядковый номер, future ожидающего запроса)
+        self._waiters: Dict[str, Deque[Tuple[int, asyncio.Future]]] = {lane: deque() for lane in LANES}
+        self._service_time: Optional[float] = None
+        self._counters = {"admitted": 0, "queued": 0, "rejected": 0}
+        ADMISSION_IN_FLIGHT.set(0)
+        for lane in LANES:
+            ADMISSION_QUEUE_DEPTH.labels(lane).set(0)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0
+
+    @staticmethod
+    def lane(value: Optional[str], default: str = "interactive") -> str:
+        """Полоса по значению заголовка X-Request-Priority (неизвестные значения - default)"""
+        value = (value or "").strip().lower()
+        return value if value in LANES else default
+
+    def queue_depth(self, lane: Optional[str] = None) -> int:
+        if lane is not None:
+            return len(self._waiters[lane])
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def expected_wait(self, lane: str) -> float:
+        """
+        Оценка ожидания нового запроса полосы lane (секунды)
+
+        Места освобождаются в среднем раз в service_time / max_in_flight, запрос ждет
+        освобождения мест для всех, кто стоит в очереди перед ним, и для себя.
+        """
+        if not self.enabled or self._service_time is None:
+            return 0.0
+        ahead = self.queue_depth("interactive") if self.priority_lanes and lane == "interactive" else self.queue_depth()
+        if ahead == 0 and self._in_flight < self.max_in_flight:
+            return 0.0
+        return (ahead + 1) * self._service_time / self.max_in_flight
+
+    async def acquire(self, lane: str = "interactive") -> AdmissionSlot:
+        """
+        Место для обработки запроса: сразу или после ожидания в очереди
+
+        Raises:
+            OverloadedError: Очередь заполнена, ожидание превысит дедлайн или дедлайн истек
+        """
+        if not self.enabled:
+            return AdmissionSlot(None, lane)
+        if self._in_flight < self.max_in_flight and self.queue_depth() == 0:
+            return self._grant(lane, 0.0)
+
+        if self.queue_depth() >= self.max_queue and not self._shed_batch(lane):
+            self._reject(lane, "queue_full", "очередь запросов заполнена")
+        expected = self.expected_wait(lane)
+        if expected > self.queue_timeout:
+            self._reject(lane, "expected_wait", f"ожидаемое время ожидания {expected:.1f} с")
+
+        self._sequence += 1
+        entry = (self._sequence, asyncio.get_running_loop().create_future())
+        self._waiters[lane].append(entry)
+        self._counters["queued"] += 1
+        ADMISSION_QUEUE_DEPTH.labels(lane).set(len(self._waiters[lane]))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(entry[1], self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if entry[1].done() and not entry[1].cancelled() and entry[1].exception() is None:
+                # Место передано одновременно с таймаутом или отменой клиента
+                slot = AdmissionSlot(self, lane)
+                if isinstance(e, asyncio.CancelledError):
+                    slot.release()
+                    raise
+                return slot
+            self._remove(lane, entry)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject(lane, "queue_timeout", f"место не освободилось за {self.queue_timeout:.1f} с")
+        ADMISSION_QUEUE_WAIT_SECONDS.labels(lane).observe(time.monotonic() - started)
+        return AdmissionSlot(self, lane)
+
+    def _grant(self, lane: str, waited: float) -> AdmissionSlot:
+        self._in_flight += 1
+        self._counters["admitted"] += 1
+        ADMISSION_IN_FLIGHT.set(self._in_flight)
+        ADMISSION_QUEUE_WAIT_SECONDS.labels(lane).observe(waited)
+        return AdmissionSlot(self, lane)
+
+    def _reject(self, lane: str, reason: str, detail: str) -> None:
+        self._counters["rejected"] += 1
+        ADMISSION_REJECTIONS.labels(lane, reason).inc()
+        # Клиенту предлагается повторить, когда очередь, по оценке, рассосется
+        retry_after = max(1.0, math.ceil(self.expected_wait(lane) or self.queue_timeout))
+        logger.warning(f"Запрос {lane} отклонен ({reason}): {detail}, в обработке {self._in_flight}, в очереди {self.queue_depth()}")
+        raise OverloadedError(f"Сервис перегружен: {detail}", reason, retry_after)
+
+    def _shed_batch(self, lane: str) -> bool:
+        """При заполненной очереди interactive запрос вытесняет последний ожидающий batch запрос"""
+        if not self.priority_lanes or lane != "interactive" or not self._waiters["batch"]:
+            return False
+        _, future = self._waiters["batch"].pop()
+        ADMISSION_QUEUE_DEPTH.labels("batch").set(len(self._waiters["batch"]))
+        self._counters["rejected"] += 1
+        ADMISSION_REJECTIONS.labels("batch", "shed").inc()
+        future.set_exception(OverloadedError("Сервис перегружен: пакетный запрос вытеснен из очереди", "shed",
+                                             max(1.0, math.ceil(self.queue_timeout))))
+        return True
+
+    def _remove(self, lane: str, entry: Tuple[int, asyncio.Future]) -> None:
+        try:
+            self._waiters[lane].remove(entry)
+        except ValueError:
+            pass
+        ADMISSION_QUEUE_DEPTH.labels(lane).set(len(self._waiters[lane]))
+
+    def _next_waiter(self) -> Optional[Tuple[str, Tuple[int, asyncio.Future]]]:
+        """Следующий ожидающий: по приоритету полос или в порядке поступления"""
+        heads = [(lane, self._waiters[lane][0]) for lane in LANES if self._waiters[lane]]
+        if not heads:
+            return None
+        if self.priority_lanes:
+            return heads[0]
+        return min(heads, key=lambda head: head[1][0])
+
+    def _release(self, service_time: float) -> None:
+        self._service_time = service_time if self._service_time is None else (
+            (1 - _SERVICE_TIME_ALPHA) * self._service_time + _SERVICE_TIME_ALPHA * service_time
+        )
+        # Место передается ожидающему напрямую, минуя счетчик, чтобы его не занял новый запрос
+        while True:
+            head = self._next_waiter()
+            if head is None:
+                break
+            lane, entry = head
+            self._waiters[lane].popleft()
+            ADMISSION_QUEUE_DEPTH.labels(lane).set(len(self._waiters[lane]))
+            if not entry[1].done():
+                entry[1].set_result(None)
+                self._counters["admitted"] += 1
+                return
+        self._in_flight -= 1
+        ADMISSION_IN_FLIGHT.set(self._in_flight)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "enabled": self.enabled,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "queue_depth": {lane: len(waiters) for lane, waiters in self._waiters.items()},
+            "service_time_ms": self._service_time * 1000 if self._service_time is not None else None,
+            "expected_wait_ms": {lane: self.expected_wait(lane) * 1000 for lane in LANES},
+        }
@@ -0,0 +1,304 @@
+"""
+Модуль кэширования векторизации запросов и результатов поиска
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .config import (
+    CACHE_BACKEND, CACHE_REDIS_URL, CACHE_EMBEDDING_MAX_SIZE, CACHE_EMBEDDING_TTL_SECONDS,
+    CACHE_RESULT_MAX_SIZE, CACHE_RESULT_TTL_SECONDS, CACHE_EMBEDDING_DTYPE, CACHE_GENERATION_PATH,
+    CACHE_GENERATION_CHECK_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """Базовый интерфейс хранилища кэша"""
+
+    # Локальный бэкенд не делает сетевых вызовов и может использоваться прямо из event loop
+    is_local = True
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def clear_prefix(self, prefix: str) -> None:
+        """Удаление записей, ключи которых начинаются с prefix"""
+        raise NotImplementedError
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+
+class InMemoryCache(CacheBackend):
+    """Кэш в памяти процесса с вытеснением LRU и ограничением времени жизни записей"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._max_size = max(1, max_size)
+        self._ttl = ttl_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.monotonic() + self._ttl if self._ttl > 0 else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def clear_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class RedisCache(CacheBackend):
+    """Общий для нескольких воркеров кэш в Redis (требует пакет redis)"""
+
+    is_local = False
+
+    def __init__(self, url: str, prefix: str, ttl_seconds: float):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("Для CACHE_BACKEND=redis необходимо установить пакет redis") from e
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._ttl = int(ttl_seconds) if ttl_seconds > 0 else None
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._client.get(self._prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        self._client.set(self._prefix + key, json.dumps(value, ensure_ascii=False), ex=self._ttl)
+
+    def clear(self) -> None:
+        self.clear_prefix("")
+
+    def clear_prefix(self, prefix: str) -> None:
+        keys = list(self._client.scan_iter(match=self._prefix + prefix + "*"))
+        if keys:
+            self._client.delete(*keys)
+
+    def size(self) -> int:
+        return sum(1 for _ in self._client.scan_iter(match=self._prefix + "*"))
+
+
+def create_backend(name: str, max_size: int, ttl_seconds: float) -> CacheBackend:
+    """Создание бэкенда кэша по настройке CACHE_BACKEND"""
+    if CACHE_BACKEND == "redis":
+        return RedisCache(CACHE_REDIS_URL, prefix=f"game-bugs:{name}:", ttl_seconds=ttl_seconds)
+    if CACHE_BACKEND != "memory":
+        logger.warning(f"Unknown CACHE_BACKEND '{CACHE_BACKEND}', using in-memory cache")
+    return InMemoryCache(max_size, ttl_seconds)
+
+
+class IndexGeneration:
+    """
+    Поколения индекса по пространствам имен в общем файле
+
+    Загрузка данных в любом процессе увеличивает поколение игры, а поколение входит
+    в ключ кэша результатов: воркер со своим кэшем в памяти перестает отдавать
+    результаты, найденные до загрузки в другом воркере или CLI, не позже чем через
+    check_interval секунд. Файл перечитывается только при изменении mtime;
+    увеличение выполняется под межпроцессной блокировкой загрузки (ingest_lock).
+    """
+
+    def __init__(self, path: str = CACHE_GENERATION_PATH, check_interval: float = CACHE_GENERATION_CHECK_SECONDS):
+        self._path = path
+        self._check_interval = max(0.0, check_interval)
+        self._lock = threading.Lock()
+        self._data: Dict[str, int] = {}
+        self._mtime: Optional[int] = None
+        self._checked: Optional[float] = None
+
+    def get(self, namespace: str) -> int:
+        """Текущее поколение игры (файл проверяется не чаще раза в check_interval секунд)"""
+        now = time.monotonic()
+        if self._path and (self._checked is None or now - self._checked >= self._check_interval):
+            self._checked = now
+            with self._lock:
+                self._reload()
+        return self._data.get(namespace, 0)
+
+    def bump(self, namespace: str) -> int:
+        """Новое поколение игры после изменения ее индекса"""
+        with self._lock:
+            self._reload()
+            data = dict(self._data)
+            data[namespace] = data.get(namespace, 0) + 1
+            if self._path:
+                try:
+                    with open(self._path + ".tmp", "w", encoding="utf-8") as f:
+                        json.dump(data, f)
+                    os.replace(self._path + ".tmp", self._path)
+                except OSError as e:
+                    logger.warning(f"Не удалось сохранить поколение индекса в {self._path}: {str(e)}")
+            self._data = data
+            return data[namespace]
+
+    def _reload(self) -> None:
+        try:
+            mtime = os.stat(self._path).st_mtime_ns if self._path else None
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning(f"Не удалось проверить файл поколений индекса {self._path}: {str(e)}")
+            return
+        if mtime is None or mtime == self._mtime:
+            return
+        try:
+            with open(self._path, encoding="utf-8") as f:
+                data = {str(key): int(value) for key, value in json.load(f).items()}
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"Не удалось прочитать файл поколений индекса {self._path}: {str(e)}")
+            return
+        # Поколения только растут: локально увеличенное, но не сохраненное не откатывается
+        self._data = {key: max(value, self._data.get(key, 0)) for key, value in {**self._data, **data}.items()}
+        self._mtime = mtime
+
+
+def normalize_query(text: str) -> str:
+    """Нормализация текста запроса для ключа кэша (регистр и пробелы)"""
+    return " ".join(text.split()).casefold()
+
+
+def vector_digest(vector: Any) -> str:
+    """
+    Короткий хэш вектора для ключа кэша результатов
+
+    Хэшируется вектор, округленный до float16: свежий эмбеддинг и тот же эмбеддинг,
+    прочитанный из сжатого кэша, дают один ключ.
+    """
+    data = np.asarray(vector, dtype=np.float32).astype(np.float16).tobytes()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def pack_embedding(vector: Any, shared: bool) -> Any:
+    """
+    Компактное представление эмбеддинга для кэша (CACHE_EMBEDDING_DTYPE)
+
+    Args:
+        shared: Значение сериализуется в JSON для общего кэша (base64 вместо массива)
+    """
+    array = np.asarray(vector, dtype=np.float16 if CACHE_EMBEDDING_DTYPE == "float16" else np.float32)
+    if shared:
+        return {"dtype": array.dtype.name, "data": base64.b64encode(array.tobytes()).decode("ascii")}
+    return array
+
+
+def unpack_embedding(value: Any) -> np.ndarray:
+    """Эмбеддинг из кэша в виде float32 массива (поддерживаются и старые записи-списки)"""
+    if isinstance(value, dict):
+        value = np.frombuffer(base64.b64decode(value["data"]), dtype=value["dtype"])
+    return np.asarray(value, dtype=np.float32)
+
+
+class QueryCache:
+    """
+    Двухуровневый кэш поиска
+
+    Первый уровень: нормализованный текст запроса -> эмбеддинг.
+    Второй уровень: (эмбеддинг, top_k, namespace, поколение индекса) -> список найденных багов.
+    Результаты поиска сбрасываются при изменении индекса в этом процессе, а после
+    загрузки в другом процессе перестают находиться по новому поколению (см. IndexGeneration).
+    """
+
+    def __init__(self, embeddings: Optional[CacheBackend] = None, results: Optional[CacheBackend] = None,
+                 generation: Optional[IndexGeneration] = None):
+        self.embeddings = embeddings or create_backend("embeddings", CACHE_EMBEDDING_MAX_SIZE, CACHE_EMBEDDING_TTL_SECONDS)
+        self.results = results or create_backend("results", CACHE_RESULT_MAX_SIZE, CACHE_RESULT_TTL_SECONDS)
+        self.generation = generation or IndexGeneration()
+        self.is_local = self.embeddings.is_local and self.results.is_local
+        self._lock = threading.Lock()
+        self._counters = {
+            "embedding_hits": 0,
+            "embedding_misses": 0,
+            "result_hits": 0,
+            "result_misses": 0,
+            "invalidations": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def get_embedding(self, text: str) -> Optional[np.ndarray]:
+        """Поиск эмбеддинга запроса в кэше"""
+        value = self.embeddings.get(normalize_query(text))
+        self._count("embedding_hits" if value is not None else "embedding_misses")
+        return unpack_embedding(value) if value is not None else None
+
+    def set_embedding(self, text: str, vector: Any) -> None:
+        """Сохранение эмбеддинга запроса в сжатом виде (float16 по умолчанию)"""
+        self.embeddings.set(normalize_query(text), pack_embedding(vector, shared=not self.embeddings.is_local))
+
+    def _results_key(self, vector: Any, top_k: int, namespace: str) -> str:
+        return f"{namespace}:{self.generation.get(namespace)}:{top_k}:{vector_digest(vector)}"
+
+    def get_results(self, vector: Any, top_k: int, namespace: str) -> Optional[List[Dict[str, Any]]]:
+        """Поиск результатов запроса к индексу в кэше"""
+        results = self.results.get(self._results_key(vector, top_k, namespace))
+        self._count("result_hits" if results is not None else "result_misses")
+        return results
+
+    def set_results(self, vector: Any, top_k: int, namespace: str, results: List[Dict[str, Any]]) -> None:
+        """Сохранение результатов запроса к индексу"""
+        self.results.set(self._results_key(vector, top_k, namespace), results)
+
+    def invalidate_results(self, namespace: Optional[str] = None) -> None:
+        """Сброс кэша результатов после изменения индекса (только для измененного пространства имен)"""
+        if namespace is None:
+            self.results.clear()
+        else:
+            self.results.clear_prefix(f"{namespace}:")
+        self._count("invalidations")
+        logger.info(f"Кэш результатов поиска сброшен{f' для {namespace}' if namespace else ''}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий и промахов кэша"""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+        stats["backend"] = CACHE_BACKEND
+        if self.is_local:
+            stats["embedding_size"] = self.embeddings.size()
+            stats["result_size"] = self.results.size()
+        return stats
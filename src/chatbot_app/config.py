@@ -1,5 +1,6 @@
 import os
 import logging
+import tempfile
 
 logger = logging.getLogger(__name__)
 
@@ -10,6 +11,8 @@ PINECONE_REGION = os.getenv("PINECONE_REGION", "us-east-1")
 PINECONE_CLOUD = os.getenv("PINECONE_CLOUD", "aws")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "game-bugs-index") 
 PINECONE_NAMESPACE = os.getenv("PINECONE_NAMESPACE", "game-bugs")
+# Адрес control plane Pinecone (пусто - облако Pinecone; для локальных заглушек в бенчмарках)
+PINECONE_HOST = os.getenv("PINECONE_HOST", "")
 N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL", "http://n8n:5678/webhook/game-bugs-chatbot/query-log")
 
 # Порог уверенности для ответа
@@ -20,3 +23,251 @@ except ValueError:
     CONFIDENCE_THRESHOLD = 0.65
 
 
+def _get_int_env(name: str, default: int) -> int:
+    """Чтение целочисленной переменной окружения со значением по умолчанию"""
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value in .env, using default {default}")
+        return default
+
+
+def _get_float_env(name: str, default: float) -> float:
+    """Чтение вещественной переменной окружения со значением по умолчанию"""
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value in .env, using default {default}")
+        return default
+
+
+def _get_bool_env(name: str, default: bool) -> bool:
+    """Чтение логической переменной окружения (true/false, 1/0, yes/no)"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _get_list_env(name: str) -> list:
+    """Чтение списка значений через запятую"""
+    return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+
+
+def _get_thresholds_env(name: str) -> dict:
+    """Чтение порогов по пространствам имен вида "game-a:0.7,game-b:0.6" """
+    thresholds = {}
+    for item in _get_list_env(name):
+        namespace, _, value = item.rpartition(":")
+        try:
+            thresholds[namespace.strip()] = float(value)
+        except ValueError:
+            logger.warning(f"Invalid {name} item '{item}' in .env, skipping")
+    return thresholds
+
+
+# Несколько игр в одном развертывании: пространство имен индекса на игру.
+# Пустой список - разрешены любые корректные имена (PINECONE_NAMESPACE - игра по умолчанию)
+GAME_NAMESPACES = _get_list_env("GAME_NAMESPACES")
+# Пороги уверенности по играм; для остальных используется CONFIDENCE_THRESHOLD
+NAMESPACE_CONFIDENCE_THRESHOLDS = _get_thresholds_env("NAMESPACE_CONFIDENCE_THRESHOLDS")
+
+
+# Ограничения параллелизма асинхронного пути обработки запросов
+# Число потоков для CPU-bound векторизации текста
+ENCODE_MAX_WORKERS = _get_int_env("ENCODE_MAX_WORKERS", 2)
+# Число потоков для блокирующих сетевых вызовов (синхронный Pinecone, общий кэш)
+IO_MAX_WORKERS = _get_int_env("IO_MAX_WORKERS", 8)
+# Максимальное число одновременно обрабатываемых запросов /query
+QUERY_MAX_CONCURRENCY = _get_int_env("QUERY_MAX_CONCURRENCY", 32)
+
+# Контроль допуска при перегрузке: максимум запросов в обработке (0 - без ограничения),
+# размер очереди ожидания и дедлайн ожидания в ней (мс); при превышении - 503 с Retry-After
+ADMISSION_MAX_IN_FLIGHT = _get_int_env("ADMISSION_MAX_IN_FLIGHT", QUERY_MAX_CONCURRENCY)
+ADMISSION_MAX_QUEUE = _get_int_env("ADMISSION_MAX_QUEUE", 256)
+ADMISSION_QUEUE_TIMEOUT_MS = _get_float_env("ADMISSION_QUEUE_TIMEOUT_MS", 2000)
+# Ожидающие запросы интерфейса (interactive) обслуживаются раньше пакетных (batch)
+ADMISSION_PRIORITY_LANES = _get_bool_env("ADMISSION_PRIORITY_LANES", True)
+
+# Микробатчинг векторизации: максимальный размер батча и окно ожидания (мс)
+ENCODE_BATCH_MAX_SIZE = _get_int_env("ENCODE_BATCH_MAX_SIZE", 32)
+ENCODE_BATCH_WAIT_MS = _get_float_env("ENCODE_BATCH_WAIT_MS", 5.0)
+
+# Кэш эмбеддингов запросов и результатов поиска
+CACHE_ENABLED = _get_bool_env("CACHE_ENABLED", True)
+# Бэкенд кэша: memory (в процессе) или redis (общий для воркеров)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://redis:6379/0")
+CACHE_EMBEDDING_MAX_SIZE = _get_int_env("CACHE_EMBEDDING_MAX_SIZE", 10000)
+CACHE_EMBEDDING_TTL_SECONDS = _get_float_env("CACHE_EMBEDDING_TTL_SECONDS", 86400)
+CACHE_RESULT_MAX_SIZE = _get_int_env("CACHE_RESULT_MAX_SIZE", 10000)
+CACHE_RESULT_TTL_SECONDS = _get_float_env("CACHE_RESULT_TTL_SECONDS", 300)
+# Файл поколений индекса по играм: загрузка данных в любом процессе (воркер, CLI) увеличивает
+# поколение игры, которое входит в ключ кэша результатов (пусто - только в памяти процесса)
+CACHE_GENERATION_PATH = os.getenv(
+    "CACHE_GENERATION_PATH", os.path.join(tempfile.gettempdir(), "game-bugs-index-generation.json")
+)
+# Период проверки файла поколений (с): столько кэш результатов может отставать от загрузки в другом процессе
+CACHE_GENERATION_CHECK_SECONDS = _get_float_env("CACHE_GENERATION_CHECK_SECONDS", 1.0)
+
+# Бэкенд векторного индекса: pinecone или local (в памяти процесса)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+# Каталог для сохранения локального индекса (пусто - только в памяти)
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "")
+# Резервный локальный индекс на случай недоступности или медленного ответа Pinecone
+VECTOR_FALLBACK_LOCAL = _get_bool_env("VECTOR_FALLBACK_LOCAL", False)
+# Дедлайн запроса к основному бэкенду, после которого используется резервный индекс (мс)
+VECTOR_QUERY_TIMEOUT_MS = _get_float_env("VECTOR_QUERY_TIMEOUT_MS", 1000)
+# Повторный (hedged) запрос к Pinecone, если первый не ответил за p95 последних запросов или завершился ошибкой
+VECTOR_HEDGE_ENABLED = _get_bool_env("VECTOR_HEDGE_ENABLED", True)
+VECTOR_HEDGE_QUANTILE = _get_float_env("VECTOR_HEDGE_QUANTILE", 0.95)
+# Задержка повторного запроса (мс), пока не накоплено VECTOR_HEDGE_MIN_SAMPLES замеров
+VECTOR_HEDGE_DELAY_MS = _get_float_env("VECTOR_HEDGE_DELAY_MS", 300)
+VECTOR_HEDGE_MIN_SAMPLES = _get_int_env("VECTOR_HEDGE_MIN_SAMPLES", 20)
+# Автомат отключения: число ошибок подряд до открытия и время до пробного запроса (с)
+CIRCUIT_BREAKER_FAILURES = _get_int_env("CIRCUIT_BREAKER_FAILURES", 5)
+CIRCUIT_BREAKER_RESET_SECONDS = _get_float_env("CIRCUIT_BREAKER_RESET_SECONDS", 30)
+# Размер пула HTTP соединений клиента Pinecone
+PINECONE_POOL_MAXSIZE = _get_int_env("PINECONE_POOL_MAXSIZE", IO_MAX_WORKERS * 2)
+
+# Тип локального индекса: flat (точный поиск) или ivf (приближенный поиск для больших корпусов)
+LOCAL_INDEX_TYPE = os.getenv("LOCAL_INDEX_TYPE", "flat")
+# Число кластеров IVF (0 - автоматически, 4 * sqrt(n)) и число просматриваемых кластеров
+IVF_NLIST = _get_int_env("IVF_NLIST", 0)
+IVF_NPROBE = _get_int_env("IVF_NPROBE", 8)
+# Минимальный размер корпуса для обучения IVF, меньшие корпуса ищутся точно
+IVF_MIN_TRAIN_SIZE = _get_int_env("IVF_MIN_TRAIN_SIZE", 10000)
+# Сжатие векторов локального индекса: none, float16, int8 или pq (product quantization)
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION", "none")
+# Число лучших по сжатым кодам кандидатов, переоцениваемых точно по float32 (0 - без переоценки)
+QUANTIZATION_RERANK_CANDIDATES = _get_int_env("QUANTIZATION_RERANK_CANDIDATES", 50)
+# Число подвекторов PQ (1 байт на подвектор; 0 - размерность / 4)
+PQ_SUBVECTORS = _get_int_env("PQ_SUBVECTORS", 0)
+
+# Тип эмбеддингов в кэше запросов: float16 (в 2 раза компактнее) или float32
+CACHE_EMBEDDING_DTYPE = os.getenv("CACHE_EMBEDDING_DTYPE", "float16")
+
+# Поиск дубликатов багов: порог косинусной близости, размер блока матрицы близости
+# и размер корпуса, начиная с которого пары-кандидаты отбираются кластерами IVF
+DUPLICATES_THRESHOLD = _get_float_env("DUPLICATES_THRESHOLD", 0.9)
+# Наименьший порог, принимаемый /bugs/duplicates
+DUPLICATES_MIN_THRESHOLD = _get_float_env("DUPLICATES_MIN_THRESHOLD", 0.5)
+DUPLICATES_BLOCK_SIZE = _get_int_env("DUPLICATES_BLOCK_SIZE", 1024)
+DUPLICATES_ANN_MIN_SIZE = _get_int_env("DUPLICATES_ANN_MIN_SIZE", 20000)
+# Проверка новых и измененных багов на близость к уже загруженным при каждой загрузке
+# (по локальному индексу - основному или резервному; полная перезагрузка не проверяется)
+DUPLICATES_CHECK_ON_UPSERT = _get_bool_env("DUPLICATES_CHECK_ON_UPSERT", True)
+DUPLICATES_CHECK_TOP_K = _get_int_env("DUPLICATES_CHECK_TOP_K", 3)
+# Сколько последних багов той же загрузки (в индексе их может еще не быть) сравнивается с каждой пачкой
+DUPLICATES_CHECK_RUN_BUFFER = _get_int_env("DUPLICATES_CHECK_RUN_BUFFER", 10000)
+# Проверка по удаленному индексу (Pinecone) без локального: один сетевой запрос на каждый баг
+DUPLICATES_CHECK_REMOTE = _get_bool_env("DUPLICATES_CHECK_REMOTE", False)
+
+# Пакетная отправка телеметрии в n8n
+TELEMETRY_QUEUE_SIZE = _get_int_env("TELEMETRY_QUEUE_SIZE", 10000)
+TELEMETRY_BATCH_SIZE = _get_int_env("TELEMETRY_BATCH_SIZE", 200)
+TELEMETRY_FLUSH_INTERVAL_SECONDS = _get_float_env("TELEMETRY_FLUSH_INTERVAL_SECONDS", 2.0)
+TELEMETRY_TIMEOUT_SECONDS = _get_float_env("TELEMETRY_TIMEOUT_SECONDS", 3.0)
+TELEMETRY_MAX_RETRIES = _get_int_env("TELEMETRY_MAX_RETRIES", 3)
+TELEMETRY_RETRY_BACKOFF_SECONDS = _get_float_env("TELEMETRY_RETRY_BACKOFF_SECONDS", 0.5)
+# Политика при переполнении очереди или недоступности n8n: drop (отбросить) или spill (сохранить на диск)
+TELEMETRY_OVERFLOW_POLICY = os.getenv("TELEMETRY_OVERFLOW_POLICY", "drop")
+# Каждый процесс пишет в свой файл: к имени добавляется pid (telemetry_spill-<pid>.jsonl)
+TELEMETRY_SPILL_PATH = os.getenv("TELEMETRY_SPILL_PATH", "telemetry_spill.jsonl")
+
+# Каталог локального журнала запросов для офлайн-анализа (пусто - журнал отключен; по умолчанию отключен)
+QUERY_LOG_DIR = os.getenv("QUERY_LOG_DIR", "")
+QUERY_LOG_QUEUE_SIZE = _get_int_env("QUERY_LOG_QUEUE_SIZE", 50000)
+QUERY_LOG_FLUSH_INTERVAL_SECONDS = _get_float_env("QUERY_LOG_FLUSH_INTERVAL_SECONDS", 1.0)
+# Ротация сегмента журнала по размеру (МБ) или возрасту; закрытые сегменты сжимаются gzip
+QUERY_LOG_MAX_SEGMENT_MB = _get_float_env("QUERY_LOG_MAX_SEGMENT_MB", 64.0)
+QUERY_LOG_ROTATE_SECONDS = _get_float_env("QUERY_LOG_ROTATE_SECONDS", 3600.0)
+# Число хранимых сжатых сегментов (старые удаляются; 0 - без ограничения)
+QUERY_LOG_MAX_FILES = _get_int_env("QUERY_LOG_MAX_FILES", 720)
+# Набор запросов для прогрева кэшей при запуске (python -m src.chatbot_app.query_analysis --warmup-output)
+WARMUP_QUERIES_PATH = os.getenv("WARMUP_QUERIES_PATH", "")
+WARMUP_QUERIES_LIMIT = _get_int_env("WARMUP_QUERIES_LIMIT", 1000)
+
+# Ограничения пакетного поиска POST /query/batch
+BATCH_MAX_QUERIES = _get_int_env("BATCH_MAX_QUERIES", 256)
+BATCH_MAX_TOP_K = _get_int_env("BATCH_MAX_TOP_K", 10)
+
+# Потоковая загрузка данных о багах
+# Размер пачки векторизации и размер пачки upsert в Pinecone
+INGEST_ENCODE_BATCH_SIZE = _get_int_env("INGEST_ENCODE_BATCH_SIZE", 64)
+INGEST_UPSERT_BATCH_SIZE = _get_int_env("INGEST_UPSERT_BATCH_SIZE", 100)
+# Число параллельных upsert-запросов
+INGEST_UPSERT_PARALLELISM = _get_int_env("INGEST_UPSERT_PARALLELISM", 4)
+# Файл манифеста с хэшами содержимого загруженных багов (пусто - только в памяти процесса;
+# в новом процессе хэши берутся из метаданных индекса)
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "")
+# Интервал логирования прогресса загрузки (число записей)
+INGEST_PROGRESS_EVERY = _get_int_env("INGEST_PROGRESS_EVERY", 1000)
+# Файл межпроцессной блокировки загрузки (индекс обновляет один воркер за раз; пусто - без блокировки)
+INGEST_LOCK_PATH = os.getenv("INGEST_LOCK_PATH", os.path.join(tempfile.gettempdir(), "game-bugs-ingest.lock"))
+
+# Запуск сервиса
+# Каталог с локальным снимком модели (загружается без обращения к Hugging Face Hub)
+MODEL_LOCAL_PATH = os.getenv("MODEL_LOCAL_PATH", "")
+# Прогрев модели пробной векторизацией перед переходом в состояние ready
+STARTUP_WARMUP = _get_bool_env("STARTUP_WARMUP", True)
+
+# Движок инференса модели векторизации: torch, torch-int8, onnx или onnx-int8
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+# Каталог с экспортированной ONNX моделью (python -m src.chatbot_app.inference export)
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "models/onnx")
+# Число потоков ONNX Runtime (0 - по умолчанию)
+ONNX_THREADS = _get_int_env("ONNX_THREADS", 0)
+
+# Выборочное профилирование запросов (заголовок X-Profile: 1 или доля PROFILER_SAMPLE_RATE)
+PROFILER_ENABLED = _get_bool_env("PROFILER_ENABLED", False)
+# Доля автоматически профилируемых запросов (0 - только по заголовку)
+PROFILER_SAMPLE_RATE = _get_float_env("PROFILER_SAMPLE_RATE", 0.0)
+# Интервал снятия стеков в миллисекундах
+PROFILER_INTERVAL_MS = _get_float_env("PROFILER_INTERVAL_MS", 5.0)
+# Каталог для сохранения профилей в свернутом формате (collapsed stacks)
+PROFILER_OUTPUT_DIR = os.getenv("PROFILER_OUTPUT_DIR", "profiles")
+
+# Запуск HTTP сервера: python -m src.chatbot_app.main
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = _get_int_env("SERVER_PORT", 8000)
+# Число процессов-воркеров; при > 1 модель и индекс загружаются один раз до fork и разделяются воркерами
+SERVER_WORKERS = _get_int_env("SERVER_WORKERS", 1)
+# Потоков инференса (torch/ONNX Runtime) на воркер (0 - число ядер, деленное на число воркеров)
+WORKER_THREADS = _get_int_env("WORKER_THREADS", 0)
+# Каталог метрик воркеров задается переменной PROMETHEUS_MULTIPROC_DIR, которую читает
+# prometheus_client (пусто - временный каталог, см. metrics.py)
+# Период проверки файлов локального индекса на изменения другими воркерами в секундах (0 - не проверять)
+LOCAL_INDEX_RELOAD_SECONDS = _get_float_env("LOCAL_INDEX_RELOAD_SECONDS", 1.0)
+# Бюджет памяти локального индекса (МБ): пространства имен загружаются с диска при первом
+# обращении и вытесняются по LRU при превышении (0 - без ограничения)
+LOCAL_INDEX_MEMORY_BUDGET_MB = _get_float_env("LOCAL_INDEX_MEMORY_BUDGET_MB", 0)
+
+# Гибридный поиск: лексический индекс BM25 по названию и описанию вместе с векторным поиском
+HYBRID_ENABLED = _get_bool_env("HYBRID_ENABLED", True)
+# Вес лексической оценки при объединении с косинусной близостью (0 - только векторный поиск)
+HYBRID_LEXICAL_WEIGHT = _get_float_env("HYBRID_LEXICAL_WEIGHT", 0.3)
+# Число кандидатов векторного и лексического поиска для объединения
+HYBRID_CANDIDATES = _get_int_env("HYBRID_CANDIDATES", 10)
+# Вес вхождений в название бага относительно описания
+LEXICAL_TITLE_BOOST = _get_float_env("LEXICAL_TITLE_BOOST", 2.0)
+# Быстрый ответ без векторизации, если все слова короткого запроса встречаются ровно в одном баге
+LEXICAL_FAST_PATH = _get_bool_env("LEXICAL_FAST_PATH", True)
+LEXICAL_FAST_PATH_MAX_TOKENS = _get_int_env("LEXICAL_FAST_PATH_MAX_TOKENS", 3)
+# Уверенность ответа, найденного по точному совпадению ключевых слов
+LEXICAL_FAST_PATH_CONFIDENCE = _get_float_env("LEXICAL_FAST_PATH_CONFIDENCE", 0.9)
+# Число пространств имен (игр), лексические индексы которых держатся в памяти; остальные
+# вытесняются по LRU и строятся заново из хранилища документов при обращении
+LEXICAL_MAX_NAMESPACES = _get_int_env("LEXICAL_MAX_NAMESPACES", 8)
+# Период проверки версии хранилища документов (с): после загрузки другим процессом
+# лексические индексы игр строятся заново
+LEXICAL_VERSION_CHECK_SECONDS = _get_float_env("LEXICAL_VERSION_CHECK_SECONDS", 1.0)
+
+# Локальное хранилище документов багов (SQLite): векторный индекс хранит только эмбеддинги,
+# поиск возвращает идентификаторы, а названия и описания подставляются из хранилища
+DOCSTORE_ENABLED = _get_bool_env("DOCSTORE_ENABLED", True)
+DOCSTORE_PATH = os.getenv("DOCSTORE_PATH", "bugs_docstore.sqlite3")
+# Размер LRU-кэша документов в памяти процесса
+DOCSTORE_CACHE_SIZE = _get_int_env("DOCSTORE_CACHE_SIZE", 10000)
+# Сверка хранилища с индексом при запуске (недостающие документы восстанавливаются, лишние удаляются)
+DOCSTORE_CHECK_ON_START = _get_bool_env("DOCSTORE_CHECK_ON_START", True)
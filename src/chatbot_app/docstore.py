@@ -0,0 +1,264 @@
+"""
+Локальное хранилище документов (название и описание багов) в SQLite
+
+Векторный индекс хранит только эмбеддинги и хэш содержимого, поиск возвращает
+идентификаторы и оценки, а тексты багов подставляются из этого хранилища с
+LRU-кэшем в памяти. Хранилище обновляется вместе с индексом при загрузке
+(совместимо с целями IngestionPipeline) и сверяется с индексом при запуске.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Set
+
+from .config import DOCSTORE_PATH, DOCSTORE_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bugs (
+    namespace TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT,
+    description TEXT,
+    content_hash TEXT,
+    PRIMARY KEY (namespace, id)
+) WITHOUT ROWID
+"""
+
+# Ограничение SQLite на число параметров запроса (SQLITE_MAX_VARIABLE_NUMBER в старых сборках)
+_MAX_PARAMS = 900
+
+
+class DocumentStore:
+    """
+    Документы багов по пространствам имен с LRU-кэшем чтения
+
+    Соединение SQLite открывается лениво в каждом потоке (и заново в воркере
+    после fork). Изменения, сделанные другими процессами, обнаруживаются через
+    PRAGMA data_version и сбрасывают кэш.
+    """
+
+    name = "docstore"
+    upsert_batch_size = 1000
+
+    def __init__(self, path: str = DOCSTORE_PATH, cache_size: int = DOCSTORE_CACHE_SIZE):
+        self._path = path
+        self._cache_size = max(0, cache_size)
+        self._cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        # Отдельное соединение только для PRAGMA data_version: значения разных соединений несравнимы
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30)
+            # WAL: чтение воркерами не блокируется записью при загрузке
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.data_version = None
+        return conn
+
+    def after_fork(self) -> None:
+        """Соединения родителя нельзя использовать в дочернем процессе"""
+        self._local = threading.local()
+        self._version_conn = None
+        self.clear_cache()
+
+    def refresh(self) -> None:
+        """Изменения других процессов видны через SQLite, кэш сбрасывается по data_version"""
+
+    def data_version(self) -> int:
+        """
+        Версия данных хранилища для кэшей, построенных из его документов
+
+        Значение меняется после каждой записи через любое другое соединение - другого
+        потока, воркера или процесса загрузки - и сравнимо только с предыдущими
+        значениями этого же процесса (после fork отсчет начинается заново).
+        """
+        with self._version_lock:
+            if self._version_conn is None:
+                self._version_conn = sqlite3.connect(self._path, timeout=30, check_same_thread=False)
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_version(self, conn: sqlite3.Connection) -> None:
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._local.data_version is not None and version != self._local.data_version:
+            self.clear_cache()
+        self._local.data_version = version
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+    def upsert(self, records: List[Dict[str, Any]], namespace: str) -> None:
+        """Добавление или обновление документов из записей вида {"id", "metadata": {"title", "description"}}"""
+        rows = []
+        for record in records:
+            metadata = record.get("metadata") or {}
+            rows.append((
+                namespace, str(record["id"]), metadata.get("title"), metadata.get("description"),
+                metadata.get("content_hash")
+            ))
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO bugs (namespace, id, title, description, content_hash) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        self._evict(namespace, [row[1] for row in rows])
+
+    def delete(self, ids: List[str], namespace: str) -> None:
+        conn = self._connection()
+        with conn:
+            for chunk in _chunks([str(bug_id) for bug_id in ids], _MAX_PARAMS):
+                conn.execute(
+                    f"DELETE FROM bugs WHERE namespace = ? AND id IN ({','.join('?' * len(chunk))})",
+                    [namespace, *chunk]
+                )
+        self._evict(namespace, ids)
+
+    def _evict(self, namespace: str, ids: Iterable[str]) -> None:
+        with self._cache_lock:
+            for bug_id in ids:
+                self._cache.pop((namespace, str(bug_id)), None)
+
+    def count(self, namespace: str) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM bugs WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+    def ids(self, namespace: str) -> Set[str]:
+        return {row[0] for row in self._connection().execute("SELECT id FROM bugs WHERE namespace = ?", (namespace,))}
+
+    def iter_documents(self, namespace: str) -> Iterator[Dict[str, Any]]:
+        """Все документы пространства имен (для построения лексического индекса игры)"""
+        rows = self._connection().execute(
+            "SELECT id, title, description FROM bugs WHERE namespace = ?", (namespace,)
+        )
+        for bug_id, title, description in rows:
+            yield {"id": bug_id, "title": title, "description": description}
+
+    def namespaces(self) -> List[str]:
+        return [row[0] for row in self._connection().execute("SELECT DISTINCT namespace FROM bugs")]
+
+    def get_many(self, ids: List[str], namespace: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Документы по идентификаторам (сначала из LRU-кэша)
+
+        Returns:
+            Словарь id -> {"title", "description"}; отсутствующие в хранилище id пропускаются
+        """
+        conn = self._connection()
+        self._check_version(conn)
+        found: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        with self._cache_lock:
+            for bug_id in ids:
+                document = self._cache.get((namespace, bug_id))
+                if document is not None:
+                    self._cache.move_to_end((namespace, bug_id))
+                    found[bug_id] = document
+                else:
+                    missing.append(bug_id)
+            self._hits += len(found)
+            self._misses += len(missing)
+        if missing:
+            for chunk in _chunks(missing, _MAX_PARAMS):
+                rows = conn.execute(
+                    f"SELECT id, title, description FROM bugs WHERE namespace = ? AND id IN ({','.join('?' * len(chunk))})",
+                    [namespace, *chunk]
+                ).fetchall()
+                for bug_id, title, description in rows:
+                    found[bug_id] = {"title": title, "description": description}
+            if self._cache_size:
+                with self._cache_lock:
+                    for bug_id in missing:
+                        if bug_id in found:
+                            self._cache[(namespace, bug_id)] = found[bug_id]
+                    while len(self._cache) > self._cache_size:
+                        self._cache.popitem(last=False)
+        return found
+
+    def hydrate(self, results: List[Dict[str, Any]], namespace: str) -> List[Dict[str, Any]]:
+        """Подстановка названия и описания в результаты поиска, в которых их нет"""
+        ids = [result["id"] for result in results if result.get("title") is None]
+        if not ids:
+            return results
+        documents = self.get_many(ids, namespace)
+        hydrated = []
+        for result in results:
+            document = documents.get(result["id"]) if result.get("title") is None else None
+            if document is not None:
+                result = dict(result, **document)
+            elif result.get("title") is None:
+                logger.warning(f"Документ бага {result['id']} отсутствует в хранилище документов")
+            hydrated.append(result)
+        return hydrated
+
+    def check_consistency(self, index_ids: Iterable[str], namespace: str) -> Dict[str, Any]:
+        """
+        Сверка хранилища с векторным индексом
+
+        Args:
+            index_ids: Идентификаторы векторов в индексе
+
+        Returns:
+            Отчет: число документов и векторов, id без документа (missing) и документы без вектора (orphaned)
+        """
+        index_ids = {str(bug_id) for bug_id in index_ids}
+        stored = self.ids(namespace)
+        return {
+            "namespace": namespace,
+            "documents": len(stored),
+            "vectors": len(index_ids),
+            "missing": sorted(index_ids - stored),
+            "orphaned": sorted(stored - index_ids),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            return {
+                "path": self._path,
+                "cache_size": len(self._cache),
+                "cache_hits": self._hits,
+                "cache_misses": self._misses,
+            }
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def main() -> None:
+    """Сверка хранилища документов с векторным индексом и восстановление расхождений"""
+    parser = argparse.ArgumentParser(description="Проверка согласованности хранилища документов и векторного индекса")
+    parser.add_argument("--repair", action="store_true", help="Восстановить недостающие документы и удалить лишние")
+    parser.add_argument("--namespace", help="Игра (пространство имен); по умолчанию PINECONE_NAMESPACE")
+    args = parser.parse_args()
+
+    from .vector_db import VectorDatabase
+
+    vector_db = VectorDatabase()
+    namespace = vector_db.resolve_namespace(args.namespace)
+    vector_db.start_db(load_initial_data=False, check_docstore=False)
+    report = vector_db.check_docstore(repair=args.repair, namespace=namespace)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Поиск дубликатов багов по косинусной близости эмбеддингов
+
+Полный поиск сравнивает все пары векторов блоками строк, поэтому в памяти
+одновременно находится не больше block_size x n оценок. Для больших корпусов
+(от DUPLICATES_ANN_MIN_SIZE) кандидаты отбираются кластерами IVF: векторы кластера
+сравниваются только с векторами nprobe ближайших кластеров, что дает примерно
+O(n * sqrt(n)) вместо O(n^2) сравнений ценой пропуска части пар на границах кластеров.
+
+При загрузке данных новые и измененные баги проверяются запросом к индексу
+(DuplicateChecker): стоимость проверки пропорциональна числу загружаемых багов,
+а не квадрату размера базы. Еще не попавшие в индекс баги той же загрузки
+сравниваются точно только с последними DUPLICATES_CHECK_RUN_BUFFER багами, поэтому
+первичные и полные загрузки (force) не проверяются, а проверяются этим полным поиском.
+
+Запуск полного поиска из корня проекта:
+    python -m src.chatbot_app.duplicates [--namespace game] [--threshold 0.9] [--output report.json]
+"""
+
+import argparse
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    DUPLICATES_THRESHOLD, DUPLICATES_BLOCK_SIZE, DUPLICATES_ANN_MIN_SIZE, DUPLICATES_CHECK_TOP_K,
+    DUPLICATES_CHECK_RUN_BUFFER, IVF_NPROBE
+)
+from .metrics import DUPLICATES_FLAGGED
+from .vector_backends import IVFIndex, LocalBackend, VectorIndexBackend, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+
+def find_duplicate_pairs(matrix: np.ndarray, ids: List[str], threshold: float = DUPLICATES_THRESHOLD,
+                         method: str = "auto", block_size: int = DUPLICATES_BLOCK_SIZE,
+                         nprobe: int = IVF_NPROBE, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Пары багов с косинусной близостью не ниже threshold
+
+    Args:
+        matrix: Эмбеддинги багов (n, d)
+        ids: Идентификаторы багов в порядке строк
+        threshold: Порог близости
+        method: exact (все пары), ann (кандидаты IVF) или auto (ann от DUPLICATES_ANN_MIN_SIZE)
+        block_size: Число строк в блоке матрицы близости
+        nprobe: Число соседних кластеров IVF, с которыми сравнивается кластер
+        limit: Сколько самых близких пар вернуть (None - все)
+
+    Returns:
+        Пары {"id_a", "id_b", "score"} по убыванию близости
+    """
+    return find_duplicates(matrix, ids, threshold, method, block_size, nprobe, limit)["pairs"]
+
+
+def find_duplicates(matrix: np.ndarray, ids: List[str], threshold: float = DUPLICATES_THRESHOLD,
+                    method: str = "auto", block_size: int = DUPLICATES_BLOCK_SIZE,
+                    nprobe: int = IVF_NPROBE, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Пары и группы дубликатов (аргументы - как у find_duplicate_pairs)
+
+    Пары не накапливаются целиком: по мере обхода блоков хранятся только limit самых
+    близких, число пар и группы (объединение множеств по номерам строк), поэтому память
+    не зависит от числа найденных пар даже при низком пороге.
+
+    Returns:
+        {"pairs", "pair_count", "groups", "group_count"}: не больше limit пар по убыванию
+        близости и групп {"ids", "max_score"} по убыванию размера и близости
+    """
+    collector = _PairCollector(len(ids), limit)
+    if len(ids) >= 2:
+        matrix = normalize_rows(np.asarray(matrix, dtype=np.float32))
+        if method == "auto":
+            method = "ann" if len(ids) >= DUPLICATES_ANN_MIN_SIZE else "exact"
+        if method == "ann":
+            _ann_pairs(matrix, threshold, max(1, block_size), nprobe, collector)
+        elif method == "exact":
+            _blocked_pairs(matrix, threshold, max(1, block_size), collector)
+        else:
+            raise ValueError(f"Unknown duplicate search method '{method}', expected exact, ann or auto")
+    groups, group_count = collector.groups(ids)
+    return {"pairs": collector.pairs(ids), "pair_count": collector.count, "groups": groups, "group_count": group_count}
+
+
+def _blocked_pairs(matrix: np.ndarray, threshold: float, block_size: int, collector: "_PairCollector") -> None:
+    """Все пары i < j: блок строк сравнивается со своими и последующими строками"""
+    for start in range(0, len(matrix), block_size):
+        block = matrix[start:start + block_size]
+        block_scores = block @ matrix[start:].T
+        # Отбрасываем диагональ и нижний треугольник (пары уже учтены предыдущими блоками)
+        block_scores[np.tril_indices(len(block), 0, block_scores.shape[1])] = -np.inf
+        i, j = np.nonzero(block_scores >= threshold)
+        collector.add(i + start, j + start, block_scores[i, j])
+
+
+def _ann_pairs(matrix: np.ndarray, threshold: float, block_size: int, nprobe: int,
+               collector: "_PairCollector") -> None:
+    """Пары-кандидаты из соседних кластеров IVF, проверенные точно"""
+    ivf = IVFIndex.train(matrix, 0)
+    nlist = len(ivf.centroids)
+    neighbours = np.argsort(-(ivf.centroids @ ivf.centroids.T), axis=1)[:, :max(1, nprobe)]
+    probed = np.zeros((nlist, nlist), dtype=bool)
+    probed[np.repeat(np.arange(nlist), neighbours.shape[1]), neighbours.ravel()] = True
+    for cluster, probes in enumerate(neighbours):
+        members = ivf.order[ivf.offsets[cluster]:ivf.offsets[cluster + 1]]
+        if not len(members):
+            continue
+        candidates = np.concatenate([ivf.order[ivf.offsets[c]:ivf.offsets[c + 1]] for c in probes])
+        for start in range(0, len(members), block_size):
+            block = members[start:start + block_size]
+            block_scores = matrix[block] @ matrix[candidates].T
+            i, j = np.nonzero(block_scores >= threshold)
+            a, b = block[i], candidates[j]
+            # Списки соседних кластеров несимметричны: пара может найтись только со стороны
+            # большего id. Найденная с обеих сторон пара учитывается со стороны меньшего id,
+            # найденная с одной стороны - с нее, поэтому каждая пара попадает в отчет один раз
+            keep = (a != b) & ((a < b) | ~probed[ivf.assignments[b], cluster])
+            collector.add(np.minimum(a, b)[keep], np.maximum(a, b)[keep], block_scores[i, j][keep])
+
+
+class _PairCollector:
+    """Ограниченное накопление пар: limit самых близких, их число и группы по номерам строк"""
+
+    def __init__(self, size: int, limit: Optional[int]):
+        self._limit = limit
+        self._rows = np.empty(0, dtype=np.int64)
+        self._cols = np.empty(0, dtype=np.int64)
+        self._scores = np.empty(0, dtype=np.float32)
+        self.count = 0
+        self._parent = np.arange(size, dtype=np.int64)
+        # Наибольшая близость пары с участием бага (-inf - бага нет ни в одной паре)
+        self._best = np.full(size, -np.inf, dtype=np.float32)
+
+    def add(self, rows: np.ndarray, cols: np.ndarray, scores: np.ndarray) -> None:
+        if not len(rows):
+            return
+        self.count += len(rows)
+        self._rows = np.concatenate([self._rows, rows.astype(np.int64)])
+        self._cols = np.concatenate([self._cols, cols.astype(np.int64)])
+        self._scores = np.concatenate([self._scores, scores.astype(np.float32)])
+        if self._limit is not None and len(self._scores) > self._limit:
+            top = np.argpartition(-self._scores, self._limit - 1)[:self._limit] if self._limit else []
+            self._rows, self._cols, self._scores = self._rows[top], self._cols[top], self._scores[top]
+        np.maximum.at(self._best, rows, scores)
+        np.maximum.at(self._best, cols, scores)
+        self._union(rows.astype(np.int64), cols.astype(np.int64))
+
+    def _union(self, rows: np.ndarray, cols: np.ndarray) -> None:
+        """
+        Объединение множеств пачкой пар: корень с большим номером подвешивается к меньшему,
+        после каждого шага деревья сжимаются, поэтому корень узла - один просмотр _parent
+        """
+        while len(rows):
+            root_a, root_b = self._parent[rows], self._parent[cols]
+            differ = root_a != root_b
+            if not differ.any():
+                break
+            rows, cols, root_a, root_b = rows[differ], cols[differ], root_a[differ], root_b[differ]
+            # При нескольких присваиваниях одному корню побеждает одно - остальные пары на следующем шаге
+            self._parent[np.maximum(root_a, root_b)] = np.minimum(root_a, root_b)
+            while True:
+                grandparents = self._parent[self._parent]
+                if np.array_equal(grandparents, self._parent):
+                    break
+                self._parent = grandparents
+
+    def pairs(self, ids: List[str]) -> List[Dict[str, Any]]:
+        order = np.lexsort((self._cols, self._rows, -self._scores))
+        return [
+            {"id_a": ids[self._rows[i]], "id_b": ids[self._cols[i]], "score": float(self._scores[i])}
+            for i in order
+        ]
+
+    def groups(self, ids: List[str]) -> Tuple[List[Dict[str, Any]], int]:
+        """limit групп по убыванию размера и близости и общее число групп"""
+        members = np.nonzero(self._best > -np.inf)[0]
+        if not len(members):
+            return [], 0
+        roots = self._parent[members]
+        order = np.argsort(roots, kind="stable")
+        members, roots = members[order], roots[order]
+        _, starts, sizes = np.unique(roots, return_index=True, return_counts=True)
+        max_scores = np.maximum.reduceat(self._best[members], starts)
+        # Списки id строятся только для отдаваемых групп
+        ranked = np.lexsort((-max_scores, -sizes))[:self._limit]
+        groups = [
+            {"ids": sorted(ids[i] for i in members[starts[g]:starts[g] + sizes[g]]), "max_score": float(max_scores[g])}
+            for g in ranked
+        ]
+        return groups, len(starts)
+
+
+def group_duplicates(pairs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Группы дубликатов: связные компоненты графа пар (объединение множеств)
+
+    Returns:
+        Группы {"ids", "max_score"} по убыванию размера и близости
+    """
+    parent: Dict[str, str] = {}
+
+    def find(bug_id: str) -> str:
+        parent.setdefault(bug_id, bug_id)
+        while parent[bug_id] != bug_id:
+            parent[bug_id] = parent[parent[bug_id]]
+            bug_id = parent[bug_id]
+        return bug_id
+
+    for pair in pairs:
+        root_a, root_b = find(pair["id_a"]), find(pair["id_b"])
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    groups: Dict[str, Dict[str, Any]] = {}
+    for pair in pairs:
+        group = groups.setdefault(find(pair["id_a"]), {"ids": set(), "max_score": 0.0})
+        group["ids"].update((pair["id_a"], pair["id_b"]))
+        group["max_score"] = max(group["max_score"], pair["score"])
+    result = [{"ids": sorted(group["ids"]), "max_score": group["max_score"]} for group in groups.values()]
+    result.sort(key=lambda group: (-len(group["ids"]), -group["max_score"]))
+    return result
+
+
+class DuplicateChecker:
+    """
+    Проверка загружаемых багов на близость к уже проиндексированным
+
+    Каждая пачка векторизованных записей ищется в индексе (query_batch) и сравнивается
+    с последними run_buffer проверенными записями этой загрузки, включая саму пачку:
+    бэкенд копит записи перед upsert (локальный индекс - до 50 000), поэтому предыдущих
+    пачек загрузки в индексе может еще не быть. Буфер ограничен, чтобы проверка пачки
+    стоила не больше batch x run_buffer сравнений и загрузка оставалась линейной; пары
+    с более ранними, еще не загруженными багами находит полный поиск (find_duplicate_pairs).
+    Совпадение с тем же id (старая версия бага) не считается дубликатом. Экземпляр
+    создается на одну загрузку.
+    """
+
+    def __init__(self, backend: VectorIndexBackend, namespace: str, threshold: float = DUPLICATES_THRESHOLD,
+                 top_k: int = DUPLICATES_CHECK_TOP_K, block_size: int = DUPLICATES_BLOCK_SIZE,
+                 run_buffer: int = DUPLICATES_CHECK_RUN_BUFFER):
+        self._backend = backend
+        self._namespace = namespace
+        self._threshold = threshold
+        self._top_k = max(1, top_k)
+        self._block_size = max(1, block_size)
+        self._run_buffer = max(0, run_buffer)
+        # Нормализованные векторы и id последних проверенных пачек загрузки (не больше run_buffer записей)
+        self._checked: List[np.ndarray] = []
+        self._checked_ids: List[List[str]] = []
+        self._buffered = 0
+        self._overflow_logged = False
+
+    def __call__(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Args:
+            records: Записи пачки с полями id и values
+
+        Returns:
+            Найденные совпадения {"id", "duplicate_of", "score"}
+        """
+        if not records:
+            return []
+        vectors = np.asarray([record["values"] for record in records], dtype=np.float32)
+        ids = [str(record["id"]) for record in records]
+        # Пара, найденная и в индексе, и среди пачек загрузки (в любом порядке), учитывается один раз
+        flagged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        matches: List[List[Dict[str, Any]]] = [[] for _ in records]
+        # Пустой локальный индекс (первая загрузка игры) не опрашиваем
+        if not isinstance(self._backend, LocalBackend) or self._backend.vectors(self._namespace) is not None:
+            try:
+                # +1 кандидат: старая версия самого бага
+                matches = self._backend.query_batch(vectors, self._top_k + 1, self._namespace)
+            except Exception as e:
+                logger.warning(f"Не удалось проверить пачку на дубликаты в {self._backend.name}: {str(e)}")
+        for bug_id, found in zip(ids, matches):
+            for match in found:
+                if str(match["id"]) != bug_id and float(match["score"]) >= self._threshold:
+                    self._flag(flagged, bug_id, str(match["id"]), float(match["score"]))
+
+        # Дубликаты среди предыдущих пачек загрузки и внутри пачки (в индексе их может еще не быть)
+        normalized = normalize_rows(vectors)
+        for checked, checked_ids in zip(self._checked, self._checked_ids):
+            for start in range(0, len(checked), self._block_size):
+                block_scores = normalized @ checked[start:start + self._block_size].T
+                for i, j in zip(*np.nonzero(block_scores >= self._threshold)):
+                    if ids[i] != checked_ids[start + j]:
+                        self._flag(flagged, ids[i], checked_ids[start + j], float(block_scores[i, j]))
+        for pair in find_duplicate_pairs(normalized, ids, self._threshold, method="exact"):
+            if pair["id_a"] != pair["id_b"]:
+                self._flag(flagged, pair["id_b"], pair["id_a"], pair["score"])
+        self._remember(normalized, ids)
+
+        result = list(flagged.values())
+        for item in result:
+            logger.warning(f"Баг {item['id']} похож на {item['duplicate_of']} (близость {item['score']:.3f})")
+        if result:
+            DUPLICATES_FLAGGED.inc(len(result))
+        return result
+
+    def _remember(self, normalized: np.ndarray, ids: List[str]) -> None:
+        """Пачка в буфер загрузки; самые старые пачки вытесняются сверх run_buffer записей"""
+        if not self._run_buffer:
+            return
+        self._checked.append(normalized[-self._run_buffer:])
+        self._checked_ids.append(ids[-self._run_buffer:])
+        self._buffered += len(self._checked_ids[-1])
+        while self._buffered > self._run_buffer:
+            self._buffered -= len(self._checked_ids.pop(0))
+            self._checked.pop(0)
+            if not self._overflow_logged:
+                self._overflow_logged = True
+                logger.info(
+                    f"Загрузка больше {self._run_buffer} багов: пары с ранними багами этой загрузки "
+                    f"проверяются полным поиском (python -m src.chatbot_app.duplicates)"
+                )
+
+    @staticmethod
+    def _flag(flagged: Dict[Tuple[str, str], Dict[str, Any]], bug_id: str, duplicate_of: str, score: float) -> None:
+        key = (min(bug_id, duplicate_of), max(bug_id, duplicate_of))
+        if key not in flagged:
+            flagged[key] = {"id": bug_id, "duplicate_of": duplicate_of, "score": score}
+        else:
+            flagged[key]["score"] = max(flagged[key]["score"], score)
+
+
+def main() -> None:
+    """Полный поиск дубликатов по эмбеддингам пространства имен"""
+    parser = argparse.ArgumentParser(description="Поиск дубликатов багов по близости эмбеддингов")
+    parser.add_argument("--namespace", help="Игра (пространство имен); по умолчанию PINECONE_NAMESPACE")
+    parser.add_argument("--threshold", type=float, default=DUPLICATES_THRESHOLD, help="Порог косинусной близости")
+    parser.add_argument("--method", default="auto", choices=["auto", "exact", "ann"])
+    parser.add_argument("--output", help="Файл для сохранения отчета в JSON")
+    args = parser.parse_args()
+
+    from .vector_db import VectorDatabase
+
+    vector_db = VectorDatabase()
+    namespace = vector_db.resolve_namespace(args.namespace)
+    vector_db.start_db(load_initial_data=False, check_docstore=False)
+    started = time.perf_counter()
+    report = vector_db.find_duplicates(namespace, threshold=args.threshold, method=args.method)
+    logger.info(f"Поиск дубликатов занял {time.perf_counter() - started:.2f} с")
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Движки инференса модели векторизации: PyTorch, int8 и ONNX Runtime
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from .config import MODEL_VECTORIZER, MODEL_LOCAL_PATH, INFERENCE_BACKEND, ONNX_MODEL_DIR, ONNX_THREADS
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+# Эталонные запросы для проверки точности ускоренных движков
+REFERENCE_QUERIES = [
+    "игра зависает при загрузке уровня",
+    "клиент зависает в мультиплеере после загрузки",
+    "текст в диалогах обрезается на моем разрешении",
+    "надписи в окнах накладываются друг на друга",
+    "пропадает модель автомата при стрельбе",
+    "исчезают текстуры оружия Автоган",
+    "настройки профиля не сохраняются",
+    "нажимаю сохранить, а после перезагрузки все сбрасывается",
+    "не могу загрузить аватарку в профиль",
+    "изображение профиля не загружается",
+]
+
+
+def load_torch_model() -> Any:
+    """
+    Загрузка модели SentenceTransformer
+
+    Если задан MODEL_LOCAL_PATH и там уже есть снимок модели, он загружается с
+    локального диска без обращения к Hugging Face Hub; иначе модель скачивается
+    и сохраняется в MODEL_LOCAL_PATH для следующих запусков.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if MODEL_LOCAL_PATH and os.path.isdir(MODEL_LOCAL_PATH):
+        logger.info(f"Загрузка модели из локального снимка: {MODEL_LOCAL_PATH}")
+        return SentenceTransformer(MODEL_LOCAL_PATH)
+    model = SentenceTransformer(MODEL_VECTORIZER)
+    if MODEL_LOCAL_PATH:
+        try:
+            model.save(MODEL_LOCAL_PATH)
+            logger.info(f"Снимок модели сохранен в {MODEL_LOCAL_PATH}")
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить снимок модели в {MODEL_LOCAL_PATH}: {str(e)}")
+    return model
+
+
+def quantize_torch_model(model: Any) -> Any:
+    """Динамическая int8-квантизация линейных слоев модели PyTorch"""
+    import torch
+
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxEncoder:
+    """
+    Векторизатор на ONNX Runtime с интерфейсом SentenceTransformer (encode, размерность)
+
+    Использует модель, экспортированную командой
+    python -m src.chatbot_app.inference export; пулинг и нормализация
+    воспроизводятся по конфигурации исходной модели.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = False):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("Для INFERENCE_BACKEND=onnx необходимо установить пакет onnxruntime") from e
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, "encoder.json"), encoding="utf-8") as f:
+            self._config = json.load(f)
+        self._model_file = os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+        self._session = self._create_session(ONNX_THREADS)
+        self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self._inputs = self._config["inputs"]
+        logger.info(f"Загружена ONNX модель: {self._model_file}")
+
+    def _create_session(self, threads: int) -> Any:
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        return ort.InferenceSession(self._model_file, options, providers=["CPUExecutionProvider"])
+
+    def set_num_threads(self, threads: int) -> None:
+        """
+        Пересоздание сессии с новым числом потоков
+
+        Вызывается в воркере после fork: пул потоков сессии родителя в дочернем
+        процессе не существует.
+        """
+        self._session = self._create_session(ONNX_THREADS or threads)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._config["dimension"]
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Векторизация строки (вектор) или списка строк (матрица)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self._tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=self._config["max_seq_length"], return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self._inputs}
+            hidden = self._session.run(None, feeds)[0]
+            chunks.append(self._pool(hidden, encoded["attention_mask"]))
+        embeddings = np.concatenate(chunks) if chunks else np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Пулинг токенов в том же порядке, что и в sentence_transformers.models.Pooling"""
+        pooling = self._config["pooling"]
+        mask = attention_mask[..., None].astype(np.float32)
+        parts = []
+        if pooling.get("pooling_mode_cls_token"):
+            parts.append(hidden[:, 0])
+        if pooling.get("pooling_mode_max_tokens"):
+            parts.append(np.where(mask > 0, hidden, -1e9).max(axis=1))
+        if pooling.get("pooling_mode_mean_tokens") or pooling.get("pooling_mode_mean_sqrt_len_tokens"):
+            summed = (hidden * mask).sum(axis=1)
+            counts = np.clip(mask.sum(axis=1), 1e-9, None)
+            if pooling.get("pooling_mode_mean_tokens"):
+                parts.append(summed / counts)
+            if pooling.get("pooling_mode_mean_sqrt_len_tokens"):
+                parts.append(summed / np.sqrt(counts))
+        embeddings = np.concatenate(parts, axis=1).astype(np.float32)
+        if self._config.get("normalize"):
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+
+def worker_threads(workers: int, configured: int = 0) -> int:
+    """Число потоков инференса на воркер: ядра делятся между воркерами без переподписки"""
+    if configured > 0:
+        return configured
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def configure_threads(model: Any, threads: int) -> None:
+    """Ограничение числа потоков инференса модели в текущем процессе"""
+    if hasattr(model, "set_num_threads"):
+        model.set_num_threads(threads)
+    elif "torch" in sys.modules:
+        import torch
+
+        torch.set_num_threads(threads)
+    logger.info(f"Потоков инференса в процессе {os.getpid()}: {threads}")
+
+
+def load_encoder(backend: str = INFERENCE_BACKEND) -> Any:
+    """Создание векторизатора по настройке INFERENCE_BACKEND"""
+    if backend == "torch":
+        return load_torch_model()
+    if backend == "torch-int8":
+        return quantize_torch_model(load_torch_model())
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEncoder(ONNX_MODEL_DIR, quantized=backend == "onnx-int8")
+    raise ValueError(f"Unknown INFERENCE_BACKEND '{backend}', expected one of {', '.join(INFERENCE_BACKENDS)}")
+
+
+def export_onnx(output_dir: str = ONNX_MODEL_DIR, quantize: bool = True, opset: int = 14) -> Dict[str, Any]:
+    """
+    Экспорт трансформера модели в ONNX (и int8-версии) вместе с токенизатором
+
+    Args:
+        output_dir: Каталог для model.onnx, model.int8.onnx, токенизатора и encoder.json
+        quantize: Дополнительно сохранить динамически квантизованную int8-модель
+        opset: Версия ONNX opset
+
+    Returns:
+        Сведения об экспортированных файлах
+    """
+    import torch
+
+    model = load_torch_model()
+    transformer, pooling = model[0], model[1]
+    tokenizer = transformer.tokenizer
+    sample = tokenizer(["пример запроса для экспорта"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class _Wrapper(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    os.makedirs(output_dir, exist_ok=True)
+    model_file = os.path.join(output_dir, "model.onnx")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    torch.onnx.export(
+        _Wrapper(transformer.auto_model).eval(),
+        tuple(sample[name] for name in input_names),
+        model_file,
+        input_names=input_names,
+        output_names=["last_hidden_state"],
+        dynamic_axes=dynamic_axes,
+        opset_version=opset,
+    )
+    tokenizer.save_pretrained(output_dir)
+    config = {
+        "source_model": MODEL_LOCAL_PATH or MODEL_VECTORIZER,
+        "inputs": input_names,
+        "max_seq_length": transformer.max_seq_length,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "pooling": pooling.get_config_dict(),
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+    }
+    with open(os.path.join(output_dir, "encoder.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+    files = {"onnx": model_file}
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_file = os.path.join(output_dir, "model.int8.onnx")
+        quantize_dynamic(model_file, quantized_file, weight_type=QuantType.QInt8)
+        files["onnx-int8"] = quantized_file
+    logger.info(f"Модель экспортирована в {output_dir}")
+    return {name: {"path": path, "size_mb": os.path.getsize(path) / 2 ** 20} for name, path in files.items()}
+
+
+def _normalized(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.clip(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12, None)
+
+
+def check_accuracy(backend: str, tolerance: float = 0.02, queries: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Сравнение top-1 бага и уверенности ускоренного движка с эталоном PyTorch
+
+    Проверяются два сценария: индекс переиндексирован тем же движком
+    (reindexed) и индекс построен PyTorch, а запросы векторизует новый движок
+    (mixed, например существующий индекс в Pinecone).
+
+    Returns:
+        Отчет с расхождениями, задержками векторизации и итоговым признаком passed
+    """
+    from .bug_data import BUGS_DATA
+    from .ingestion import bug_content
+
+    queries = queries or REFERENCE_QUERIES
+    corpus = [bug_content(bug) for bug in BUGS_DATA]
+    ids = [bug["id"] for bug in BUGS_DATA]
+    baseline, candidate = load_encoder("torch"), load_encoder(backend)
+
+    def timed_encode(encoder: Any) -> Any:
+        started = time.perf_counter()
+        vectors = [encoder.encode(query) for query in queries]
+        return _normalized(np.stack(vectors)), (time.perf_counter() - started) / len(queries) * 1000
+
+    base_corpus, cand_corpus = _normalized(baseline.encode(corpus)), _normalized(candidate.encode(corpus))
+    base_queries, base_ms = timed_encode(baseline)
+    cand_queries, cand_ms = timed_encode(candidate)
+    base_scores = base_queries @ base_corpus.T
+
+    report: Dict[str, Any] = {"backend": backend, "tolerance": tolerance, "queries": len(queries),
+                              "torch_encode_ms": base_ms, "candidate_encode_ms": cand_ms, "scenarios": {}}
+    passed = True
+    for scenario, corpus_vectors in (("reindexed", cand_corpus), ("mixed", base_corpus)):
+        cand_scores = cand_queries @ corpus_vectors.T
+        mismatches = []
+        max_delta = 0.0
+        for i, query in enumerate(queries):
+            base_top, cand_top = int(np.argmax(base_scores[i])), int(np.argmax(cand_scores[i]))
+            delta = abs(float(base_scores[i, base_top]) - float(cand_scores[i, cand_top]))
+            max_delta = max(max_delta, delta)
+            if base_top != cand_top or delta > tolerance:
+                mismatches.append({"query": query, "torch": ids[base_top], "candidate": ids[cand_top], "delta": delta})
+        passed = passed and not mismatches
+        report["scenarios"][scenario] = {"max_confidence_delta": max_delta, "mismatches": mismatches}
+    report["passed"] = passed
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Экспорт и проверка ускоренных движков векторизации")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Экспорт модели в ONNX и int8")
+    export_parser.add_argument("--output", default=ONNX_MODEL_DIR, help="Каталог для экспортированной модели")
+    export_parser.add_argument("--no-quantize", action="store_true", help="Не сохранять int8-версию")
+    export_parser.add_argument("--opset", type=int, default=14)
+
+    check_parser = commands.add_parser("check", help="Сравнение точности движка с PyTorch")
+    check_parser.add_argument("--backend", default=INFERENCE_BACKEND, choices=INFERENCE_BACKENDS)
+    check_parser.add_argument("--tolerance", type=float, default=0.02, help="Допустимое отклонение уверенности")
+    check_parser.add_argument("--queries", help="Файл с эталонными запросами (по одному в строке)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == "export":
+        result = export_onnx(args.output, quantize=not args.no_quantize, opset=args.opset)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    queries = None
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    report = check_accuracy(args.backend, args.tolerance, queries)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
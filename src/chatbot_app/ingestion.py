@@ -0,0 +1,305 @@
+"""
+Потоковая пакетная загрузка данных о багах в векторный индекс
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка недоступна
+    fcntl = None
+
+from .config import (
+    INGEST_ENCODE_BATCH_SIZE, INGEST_UPSERT_PARALLELISM, INGEST_MANIFEST_PATH, INGEST_PROGRESS_EVERY, INGEST_LOCK_PATH
+)
+from .vector_backends import VectorIndexBackend
+
+logger = logging.getLogger(__name__)
+
+
+def iter_bugs_from_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Чтение багов из JSONL файла (по одному объекту с id, title, description в строке)"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_bugs_from_csv(path: str) -> Iterator[Dict[str, Any]]:
+    """Чтение багов из CSV файла со столбцами id, title, description"""
+    with open(path, encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def iter_bugs_from_file(path: str) -> Iterator[Dict[str, Any]]:
+    """Чтение багов из файла, формат определяется по расширению"""
+    if path.endswith(".csv"):
+        return iter_bugs_from_csv(path)
+    return iter_bugs_from_jsonl(path)
+
+
+def bug_content(bug: Dict[str, Any]) -> str:
+    """Контекст для векторизации бага (заголовок + описание)"""
+    return f"{bug['title']}. {bug['description']}"
+
+
+def content_hash(bug: Dict[str, Any]) -> str:
+    """Хэш содержимого бага для пропуска неизмененных записей"""
+    return hashlib.sha256(bug_content(bug).encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """Манифест загруженных багов: пространство имен -> {id: хэш содержимого}"""
+
+    def __init__(self, path: str = INGEST_MANIFEST_PATH):
+        self._path = path
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, str]] = {}
+        self.reload()
+
+    def reload(self) -> None:
+        """Повторное чтение манифеста с диска (его мог обновить другой воркер)"""
+        if self._path and os.path.exists(self._path):
+            with open(self._path, encoding="utf-8") as f:
+                data = json.load(f)
+            with self._lock:
+                self._data = data
+
+    def hashes(self, namespace: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._data.get(namespace, {}))
+
+    def replace(self, namespace: str, hashes: Dict[str, str]) -> None:
+        """Сохранение нового состояния пространства имен (атомарно на диск)"""
+        with self._lock:
+            self._data[namespace] = dict(hashes)
+            if self._path:
+                with open(self._path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(self._data, f)
+                os.replace(self._path + ".tmp", self._path)
+
+
+@contextmanager
+def ingest_lock(path: str = INGEST_LOCK_PATH) -> Iterator[None]:
+    """Межпроцессная блокировка загрузки: при нескольких воркерах индекс обновляет один процесс за раз"""
+    if not path or fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class IngestionPipeline:
+    """
+    Потоковая загрузка багов в один или несколько векторных индексов
+
+    Баги читаются из итератора пачками, неизмененные (по хэшу содержимого из
+    манифеста) пропускаются, остальные векторизуются одним вызовом модели на
+    пачку и загружаются порциями размера upsert_batch_size бэкенда с
+    ограниченным числом параллельных запросов. Баги, пропавшие из источника,
+    удаляются из индекса. Если в манифесте нет записей пространства имен (манифест
+    только в памяти нового процесса или удален), загруженные хэши берутся из
+    метаданных первого индекса, умеющего перечислять свои записи. Векторизованные пачки до загрузки можно проверить на
+    дубликаты (duplicate_check, см. duplicates.DuplicateChecker).
+    """
+
+    def __init__(self, encode_batch: Callable[[List[str]], Any], targets: List[VectorIndexBackend],
+                 namespace: str, manifest: Optional[IngestManifest] = None,
+                 encode_batch_size: int = INGEST_ENCODE_BATCH_SIZE, parallelism: int = INGEST_UPSERT_PARALLELISM,
+                 duplicate_check: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None):
+        self._encode_batch = encode_batch
+        self._duplicate_check = duplicate_check
+        self._targets = targets
+        self._namespace = namespace
+        self._manifest = manifest
+        self._encode_batch_size = max(1, encode_batch_size)
+        self._parallelism = max(1, parallelism)
+
+    def run(self, bugs: Iterable[Dict[str, Any]], delete_missing: bool = True, force: bool = False) -> Dict[str, Any]:
+        """
+        Загрузка багов из итератора
+
+        Args:
+            bugs: Итератор словарей с полями id, title, description
+            delete_missing: Удалять из индекса баги, которых нет в источнике
+            force: Перезагрузить все баги, игнорируя манифест (например, для нового индекса)
+
+        Returns:
+            Отчет: число просмотренных, пропущенных, загруженных и удаленных багов, скорость
+            и возможные дубликаты среди загруженных (при заданном duplicate_check)
+        """
+        started = time.perf_counter()
+        known = self._manifest.hashes(self._namespace) if self._manifest is not None else {}
+        if not known:
+            known = self._index_hashes()
+        seen: Dict[str, str] = {}
+        report: Dict[str, Any] = {"seen": 0, "skipped": 0, "upserted": 0, "deleted": 0, "encode_seconds": 0.0}
+        if self._duplicate_check is not None:
+            report["duplicates"] = []
+        buffers: Dict[int, List[Dict[str, Any]]] = {id(target): [] for target in self._targets}
+        in_flight: List[Future] = []
+
+        with ThreadPoolExecutor(max_workers=self._parallelism, thread_name_prefix="ingest") as executor:
+            for batch in _batched(bugs, self._encode_batch_size):
+                changed = []
+                for bug in batch:
+                    bug_id = str(bug["id"])
+                    digest = content_hash(bug)
+                    seen[bug_id] = digest
+                    if not force and known.get(bug_id) == digest:
+                        report["skipped"] += 1
+                    else:
+                        changed.append((bug_id, digest, bug))
+                report["seen"] += len(batch)
+
+                if changed:
+                    encode_started = time.perf_counter()
+                    vectors = self._encode_batch([bug_content(bug) for _, _, bug in changed])
+                    report["encode_seconds"] += time.perf_counter() - encode_started
+                    records = [
+                        {
+                            "id": bug_id,
+                            "values": vector,
+                            "metadata": {
+                                "title": bug["title"],
+                                "description": bug["description"],
+                                "content_hash": digest
+                            }
+                        }
+                        for (bug_id, digest, bug), vector in zip(changed, vectors)
+                    ]
+                    report["upserted"] += len(records)
+                    if self._duplicate_check is not None:
+                        report["duplicates"].extend(self._duplicate_check(records))
+                    for target in self._targets:
+                        buffer = buffers[id(target)]
+                        buffer.extend(records)
+                        while len(buffer) >= target.upsert_batch_size:
+                            chunk = buffer[:target.upsert_batch_size]
+                            del buffer[:target.upsert_batch_size]
+                            in_flight = self._submit(executor, in_flight, target, chunk)
+
+                progress_every = max(1, INGEST_PROGRESS_EVERY)
+                if report["seen"] // progress_every != (report["seen"] - len(batch)) // progress_every:
+                    self._log_progress(report, started)
+
+            for target in self._targets:
+                buffer = buffers[id(target)]
+                if buffer:
+                    in_flight = self._submit(executor, in_flight, target, buffer)
+            for future in in_flight:
+                future.result()
+
+        if delete_missing:
+            missing = [bug_id for bug_id in known if bug_id not in seen]
+            if missing:
+                for target in self._targets:
+                    for chunk in _batched(missing, target.upsert_batch_size):
+                        target.delete(chunk, self._namespace)
+                report["deleted"] = len(missing)
+
+        if self._manifest is not None:
+            hashes = seen if delete_missing else {**known, **seen}
+            self._manifest.replace(self._namespace, hashes)
+
+        report["seconds"] = time.perf_counter() - started
+        report["records_per_second"] = report["seen"] / report["seconds"] if report["seconds"] else 0.0
+        self._log_progress(report, started, done=True)
+        return report
+
+    def _index_hashes(self) -> Dict[str, str]:
+        """
+        Хэши содержимого уже загруженных багов из метаданных индекса
+
+        Записи без хэша (загруженные до его появления) получают пустой хэш: они
+        будут загружены заново, но при delete_missing удалятся, если пропали из источника.
+        """
+        for target in self._targets:
+            list_ids = getattr(target, "list_ids", None)
+            if list_ids is None:
+                continue
+            try:
+                ids = list_ids(self._namespace)
+                if ids is None:
+                    continue
+                metadata = target.fetch_metadata(ids, self._namespace) if ids else {}
+            except Exception as e:
+                logger.warning(f"Не удалось получить загруженные записи из {target.name}: {str(e)}")
+                continue
+            logger.info(f"Манифест пуст, хэши {len(ids)} загруженных записей получены из {target.name}")
+            return {str(bug_id): (metadata.get(bug_id) or {}).get("content_hash") or "" for bug_id in ids}
+        return {}
+
+    def _submit(self, executor: ThreadPoolExecutor, in_flight: List[Future],
+                target: VectorIndexBackend, chunk: List[Dict[str, Any]]) -> List[Future]:
+        """Отправка порции в бэкенд; не более parallelism порций одновременно"""
+        running = []
+        for future in in_flight:
+            if future.done():
+                future.result()  # пробрасываем ошибку завершившейся порции
+            else:
+                running.append(future)
+        in_flight = running
+        while len(in_flight) >= self._parallelism:
+            in_flight.pop(0).result()
+        in_flight.append(executor.submit(target.upsert, chunk, self._namespace))
+        return in_flight
+
+    @staticmethod
+    def _log_progress(report: Dict[str, Any], started: float, done: bool = False) -> None:
+        elapsed = time.perf_counter() - started
+        rate = report["seen"] / elapsed if elapsed else 0.0
+        prefix = "Загрузка завершена" if done else "Прогресс загрузки"
+        logger.info(
+            f"{prefix}: просмотрено {report['seen']}, пропущено {report['skipped']}, "
+            f"загружено {report['upserted']}, удалено {report['deleted']} ({rate:.1f} записей/с)"
+        )
+
+
+def main() -> None:
+    """Загрузка багов из JSONL/CSV файла в настроенный векторный индекс"""
+    parser = argparse.ArgumentParser(description="Потоковая загрузка багов в векторный индекс")
+    parser.add_argument("source", help="Путь к файлу .jsonl или .csv с полями id, title, description")
+    parser.add_argument("--keep-missing", action="store_true", help="Не удалять баги, отсутствующие в файле")
+    parser.add_argument("--force", action="store_true", help="Перезагрузить все баги, игнорируя манифест")
+    parser.add_argument("--namespace", help="Игра (пространство имен); по умолчанию PINECONE_NAMESPACE")
+    args = parser.parse_args()
+
+    from .vector_db import VectorDatabase
+
+    vector_db = VectorDatabase()
+    namespace = vector_db.resolve_namespace(args.namespace)
+    vector_db.start_db(load_initial_data=False)
+    report = vector_db.ingest(
+        iter_bugs_from_file(args.source), delete_missing=not args.keep_missing, force=args.force, namespace=namespace
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+Лексический поиск BM25 по названию и описанию багов
+
+Инвертированный индекс в памяти процесса с токенизацией для русского языка
+(нижний регистр, ё -> е, стоп-слова, стемминг Портера/Snowball). Используется
+вместе с векторным поиском: оценки объединяются, а короткие запросы с точным
+совпадением ключевых слов обслуживаются без векторизации и обращения к индексу.
+"""
+
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import LEXICAL_TITLE_BOOST, LEXICAL_MAX_NAMESPACES, LEXICAL_VERSION_CHECK_SECONDS
+from .metrics import NAMESPACE_EVICTIONS, NAMESPACE_LOADS
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-яё]+")
+
+_STOP_WORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот от
+меня еще нет о из ему теперь когда даже ну ли если уже или ни быть был него до вас нибудь опять уж вам ведь
+там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без будто чего раз
+тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один почти мой тем чтобы
+нее сейчас были куда зачем всех никогда можно при наконец два об другой хоть после над больше тот через эти
+нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя
+такой им более всегда конечно всю между это
+""".split())
+
+# Стеммер Snowball для русского языка: окончания удаляются из области RV (после первой гласной)
+_RV_RE = re.compile(r"^(.*?[аеиоуыэюя])(.*)$")
+_PERFECTIVE_GERUND_RE = re.compile(r"((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$")
+_REFLEXIVE_RE = re.compile(r"(с[яь])$")
+_ADJECTIVE_RE = re.compile(r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$")
+_PARTICIPLE_RE = re.compile(r"((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$")
+_VERB_RE = re.compile(
+    r"((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)"
+    r"|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$"
+)
+_NOUN_RE = re.compile(
+    r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$"
+)
+_DERIVATIONAL_RE = re.compile(r".*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$")
+_SUPERLATIVE_RE = re.compile(r"(ейше|ейш)$")
+
+
+def stem(word: str) -> str:
+    """Основа русского слова (латиница и числа возвращаются как есть)"""
+    match = _RV_RE.match(word)
+    if not match:
+        return word
+    prefix, rv = match.groups()
+    stripped = _PERFECTIVE_GERUND_RE.sub("", rv, 1)
+    if stripped == rv:
+        rv = _REFLEXIVE_RE.sub("", rv, 1)
+        stripped = _ADJECTIVE_RE.sub("", rv, 1)
+        if stripped != rv:
+            rv = _PARTICIPLE_RE.sub("", stripped, 1)
+        else:
+            stripped = _VERB_RE.sub("", rv, 1)
+            rv = _NOUN_RE.sub("", rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+    rv = re.sub(r"и$", "", rv)
+    if _DERIVATIONAL_RE.match(rv):
+        rv = re.sub(r"ость?$", "", rv)
+    stripped = re.sub(r"ь$", "", rv)
+    if stripped == rv:
+        rv = _SUPERLATIVE_RE.sub("", rv, 1)
+        rv = re.sub(r"нн$", "н", rv)
+    else:
+        rv = stripped
+    return prefix + rv
+
+
+def tokenize(text: str) -> List[str]:
+    """Токены текста для лексического индекса: основы слов без стоп-слов"""
+    words = _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+    return [stem(word) for word in words if word not in _STOP_WORDS]
+
+
+class _LexicalNamespace:
+    """
+    Постинги и длины документов одного пространства имен
+
+    Опубликованный в LexicalIndex экземпляр не изменяется: обновление строит копию
+    (copy), в которой копируются только списки постингов затронутых терминов.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.lengths: Dict[str, float] = {}
+        self.terms: Dict[str, List[str]] = {}
+        self.metadata: Dict[str, Dict[str, Any]] = {}
+        self.total_length = 0.0
+        # Термины, чьи постинги уже принадлежат этому экземпляру (можно изменять на месте)
+        self._owned: Set[str] = set()
+
+    def copy(self) -> "_LexicalNamespace":
+        data = _LexicalNamespace()
+        data.postings = dict(self.postings)
+        data.lengths = dict(self.lengths)
+        data.terms = dict(self.terms)
+        data.metadata = dict(self.metadata)
+        data.total_length = self.total_length
+        return data
+
+    def own_postings(self, term: str) -> Dict[str, float]:
+        """Постинги термина, которые можно изменять (при первом обращении - копия)"""
+        if term not in self._owned:
+            self.postings[term] = dict(self.postings.get(term, {}))
+            self._owned.add(term)
+        return self.postings[term]
+
+    def seal(self) -> "_LexicalNamespace":
+        """Завершение изменений перед публикацией (дальше экземпляр только читается)"""
+        self._owned = set()
+        return self
+
+
+class LexicalIndex:
+    """
+    Инвертированный индекс BM25 по полям title и description
+
+    Совместим с целями IngestionPipeline (upsert/delete записей с метаданными),
+    поэтому обновляется вместе с векторным индексом. Вхождения в название
+    учитываются с весом LEXICAL_TITLE_BOOST.
+
+    С загрузчиком (loader) индекс пространства имен строится из его записей при
+    первом обращении, а в памяти остаются max_namespaces последних использованных;
+    обновления незагруженных пространств имен пропускаются - загрузчик читает
+    уже обновленный источник (хранилище документов). Изменения источника, сделанные
+    в обход индекса (загрузка из CLI или другим воркером), обнаруживаются по версии
+    источника (version), которая проверяется не чаще раза в version_check_interval
+    секунд: при ее изменении все загруженные пространства имен сбрасываются.
+
+    Без загрузчика индекс содержит только то, что загружено через этот экземпляр.
+    """
+
+    name = "lexical"
+    upsert_batch_size = 50000
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, title_boost: float = LEXICAL_TITLE_BOOST,
+                 loader: Optional[Callable[[str], Iterable[Dict[str, Any]]]] = None,
+                 max_namespaces: int = LEXICAL_MAX_NAMESPACES, version: Optional[Callable[[], Any]] = None,
+                 version_check_interval: float = LEXICAL_VERSION_CHECK_SECONDS):
+        self.k1 = k1
+        self.b = b
+        self.title_boost = title_boost
+        self._namespaces: "OrderedDict[str, _LexicalNamespace]" = OrderedDict()
+        self._loader = loader
+        self._max_namespaces = max(1, max_namespaces)
+        self._lock = threading.Lock()
+        # Обновления строят копию пространства имен вне _lock и публикуют ее по одному
+        self._write_lock = threading.Lock()
+        # Версия источника, из которого построены загруженные пространства имен, и номер
+        # поколения: построенный до сброса индекс не попадает в память после него
+        self._version_source = version if loader is not None else None
+        self._version: Any = None
+        self._generation = 0
+        self._version_check_interval = max(0.0, version_check_interval)
+        self._checked = 0.0
+
+    def count(self, namespace: str) -> int:
+        data = self._namespaces.get(namespace)
+        return len(data.lengths) if data is not None else 0
+
+    def loaded_namespaces(self) -> List[str]:
+        with self._lock:
+            return list(self._namespaces)
+
+    def is_current(self, namespace: str) -> bool:
+        """Поиск по пространству имен не потребует загрузки из источника или проверки его версии"""
+        if self._loader is None:
+            return True
+        return namespace in self._namespaces and not self._version_due()
+
+    def load(self, namespace: str) -> None:
+        """Загрузка пространства имен и проверка версии источника заранее (например, в пуле потоков)"""
+        self._ensure(namespace)
+
+    def _version_due(self) -> bool:
+        return (self._version_source is not None
+                and time.monotonic() - self._checked >= self._version_check_interval)
+
+    def _check_version(self, force: bool = False) -> None:
+        """Сброс загруженных пространств имен, если версия источника изменилась"""
+        if self._version_source is None or not (force or self._version_due()):
+            return
+        self._checked = time.monotonic()
+        try:
+            version = self._version_source()
+        except Exception as e:
+            logger.warning(f"Не удалось проверить версию источника лексического индекса: {str(e)}")
+            return
+        with self._lock:
+            if self._version is not None and version != self._version and self._namespaces:
+                logger.info(f"Источник лексического индекса изменился, сброшено пространств имен: {len(self._namespaces)}")
+                self._namespaces.clear()
+                self._generation += 1
+            self._version = version
+
+    def _ensure(self, namespace: str) -> Optional[_LexicalNamespace]:
+        """Индекс пространства имен; при отсутствии в памяти строится загрузчиком (вне блокировки)"""
+        self._check_version()
+        with self._lock:
+            data = self._namespaces.get(namespace)
+            if data is not None:
+                self._namespaces.move_to_end(namespace)
+                return data
+            generation = self._generation
+        if self._loader is None:
+            return None
+        built = _LexicalNamespace()
+        for record in self._loader(namespace):
+            self._add(built, record)
+        built.seal()
+        with self._lock:
+            if generation != self._generation:
+                # Источник изменился во время построения: индекс используется один раз и не сохраняется
+                return built
+            data = self._namespaces.setdefault(namespace, built)
+            if data is built:
+                NAMESPACE_LOADS.labels("lexical").inc()
+                while len(self._namespaces) > self._max_namespaces:
+                    self._namespaces.popitem(last=False)
+                    NAMESPACE_EVICTIONS.labels("lexical").inc()
+        return data
+
+    def upsert(self, records: List[Dict[str, Any]], namespace: str) -> None:
+        """Добавление или замена документов вида {"id", "metadata": {"title", "description"}}"""
+        self._update(namespace, lambda data: [self._add(data, record) for record in records])
+
+    def _update(self, namespace: str, apply: Callable[[_LexicalNamespace], Any]) -> None:
+        """
+        Изменение копии пространства имен и ее публикация
+
+        Поиск продолжает читать прежний снимок без блокировок. Незагруженное пространство
+        имен при загрузчике не обновляется; если за время обновления его сбросили
+        (изменилась версия источника), копия не публикуется - загрузчик прочитает источник.
+        """
+        with self._write_lock:
+            with self._lock:
+                current = self._namespaces.get(namespace)
+            if current is None and self._loader is not None:
+                return
+            data = current.copy() if current is not None else _LexicalNamespace()
+            apply(data)
+            with self._lock:
+                if self._namespaces.get(namespace) is current:
+                    self._namespaces[namespace] = data.seal()
+
+    def _add(self, data: _LexicalNamespace, record: Dict[str, Any]) -> None:
+        bug_id = str(record["id"])
+        metadata = record.get("metadata") or {}
+        self._remove(data, bug_id)
+        frequencies: Dict[str, float] = {}
+        for term in tokenize(metadata.get("title") or ""):
+            frequencies[term] = frequencies.get(term, 0.0) + self.title_boost
+        for term in tokenize(metadata.get("description") or ""):
+            frequencies[term] = frequencies.get(term, 0.0) + 1.0
+        for term, frequency in frequencies.items():
+            data.own_postings(term)[bug_id] = frequency
+        length = sum(frequencies.values())
+        data.lengths[bug_id] = length
+        data.terms[bug_id] = list(frequencies)
+        data.metadata[bug_id] = {"title": metadata.get("title"), "description": metadata.get("description")}
+        data.total_length += length
+
+    def refresh(self) -> None:
+        """Немедленная проверка версии источника перед загрузкой данных"""
+        self._check_version(force=True)
+
+    def after_fork(self) -> None:
+        """Версии источника родителя несравнимы с версиями воркера: индексы строятся заново"""
+        with self._lock:
+            if self._loader is not None:
+                self._namespaces.clear()
+                self._generation += 1
+            self._version = None
+            self._checked = 0.0
+
+    def delete(self, ids: List[str], namespace: str) -> None:
+        with self._lock:
+            data = self._namespaces.get(namespace)
+        if data is None or not any(str(bug_id) in data.lengths for bug_id in ids):
+            return
+        self._update(namespace, lambda data: [self._remove(data, str(bug_id)) for bug_id in ids])
+
+    @staticmethod
+    def _remove(data: _LexicalNamespace, bug_id: str) -> None:
+        if bug_id not in data.lengths:
+            return
+        for term in data.terms.pop(bug_id):
+            postings = data.own_postings(term)
+            postings.pop(bug_id, None)
+            if not postings:
+                del data.postings[term]
+        data.total_length -= data.lengths.pop(bug_id)
+        data.metadata.pop(bug_id, None)
+
+    def search(self, query: str, top_k: int, namespace: str, load: bool = True) -> Tuple[List[Dict[str, Any]], Set[str]]:
+        """
+        Поиск BM25
+
+        Оценки считаются по неизменяемому снимку пространства имен без блокировок.
+
+        Args:
+            query: Текст запроса
+            top_k: Число результатов
+            namespace: Пространство имен
+            load: Проверить версию источника и построить незагруженное пространство имен;
+                False - только уже загруженный индекс (для event loop, см. load)
+
+        Returns:
+            Найденные документы (id, score, title, description) с оценкой, нормированной
+            к [0, 1) верхней границей BM25 для этого запроса, и множество документов,
+            содержащих все термины запроса
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [], set()
+        data = self._ensure(namespace) if load else self._loaded(namespace)
+        if data is None or not data.lengths:
+            return [], set()
+        total = len(data.lengths)
+        avg_length = data.total_length / total
+        scores: Dict[str, float] = {}
+        upper_bound = 0.0
+        matched: Optional[Set[str]] = None
+        for term in terms:
+            postings = data.postings.get(term, {})
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            upper_bound += idf * (self.k1 + 1)
+            for bug_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * data.lengths[bug_id] / avg_length)
+                scores[bug_id] = scores.get(bug_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+            matched = set(postings) if matched is None else matched & set(postings)
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        results = [
+            {"id": bug_id, "score": score / upper_bound, **data.metadata[bug_id]}
+            for bug_id, score in best
+        ]
+        return results, matched or set()
+
+    def _loaded(self, namespace: str) -> Optional[_LexicalNamespace]:
+        """Загруженный снимок пространства имен без проверки версии и загрузки"""
+        with self._lock:
+            data = self._namespaces.get(namespace)
+            if data is not None:
+                self._namespaces.move_to_end(namespace)
+            return data
+
+
+def fuse_results(vector_results: List[Dict[str, Any]], lexical_results: List[Dict[str, Any]],
+                 weight: float, top_k: int) -> List[Dict[str, Any]]:
+    """
+    Объединение векторных и лексических результатов
+
+    Лексическая оценка только повышает косинусную близость:
+    score = vector + weight * lexical * (1 - vector). Запросы без совпадающих
+    слов сохраняют исходную оценку и порог уверенности остается прежним.
+    """
+    lexical_scores = {result["id"]: result["score"] for result in lexical_results}
+    fused: Dict[str, Dict[str, Any]] = {}
+    for result in vector_results:
+        fused[result["id"]] = dict(result, vector_score=result["score"], lexical_score=lexical_scores.get(result["id"], 0.0))
+    for result in lexical_results:
+        if result["id"] not in fused:
+            fused[result["id"]] = dict(result, vector_score=0.0, lexical_score=result["score"])
+    for result in fused.values():
+        vector_score = float(result["vector_score"])
+        result["score"] = vector_score + weight * result["lexical_score"] * (1 - max(vector_score, 0.0))
+    return sorted(fused.values(), key=lambda result: result["score"], reverse=True)[:top_k]
+
+
+def iter_lexical_records(bugs: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+    """Записи для LexicalIndex.upsert из словарей багов"""
+    for bug in bugs:
+        yield {"id": str(bug["id"]), "metadata": {"title": bug.get("title"), "description": bug.get("description")}}
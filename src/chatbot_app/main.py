@@ -2,34 +2,134 @@
 Модуль чат-бота для поиска и предоставления информации о багах в игре
 """
 
+import asyncio
+import json
 import logging
-from typing import Dict, Any
-from fastapi import FastAPI, HTTPException
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, List, Optional
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import uvicorn
 
-from .vector_db import VectorDatabase
-from .config import CONFIDENCE_THRESHOLD
-from .schemas import UserQuery, BotResponse
+from .vector_db import VectorDatabase, UnknownNamespaceError
+from .config import CONFIDENCE_THRESHOLD, NAMESPACE_CONFIDENCE_THRESHOLDS, PINECONE_NAMESPACE, BATCH_MAX_QUERIES, STARTUP_WARMUP, SERVER_HOST, SERVER_PORT, SERVER_WORKERS, DUPLICATES_THRESHOLD, DUPLICATES_MIN_THRESHOLD
+from .schemas import UserQuery, BotResponse, BatchQuery, BatchResponse, BatchQueryError, DuplicatesResponse
+from .startup import StartupState
+from .metrics import (
+    COMPONENT_STATS, CONTENT_TYPE, REQUEST_SECONDS, REQUESTS, UNKNOWN_ANSWERS,
+    render as render_metrics, stage, start_request_timings, server_timing_header
+)
+from .resilience import SearchUnavailableError
+from .admission import PRIORITY_HEADER, AdmissionController, AdmissionSlot, OverloadedError
+from .profiling import PROFILE_HEADER, should_profile, start_profiler, finish_profiler
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Инициализация векторной базы данных
-try:
-    vector_db = VectorDatabase()
-    vector_db.start_db()
-    logger.info("VectorDatabase initialized successfully")
-except Exception as init_error:
-    logger.error(f"FATAL: Failed to initialize VectorDatabase: {init_error}")
-    raise SystemExit(f"Failed to initialize VectorDatabase: {init_error}")
+# Векторная база данных создается в фоне после старта сервера (см. lifespan)
+vector_db: Optional[VectorDatabase] = None
+startup_state = StartupState()
+
+# Статистика компонентов в /metrics (переносится в метрики при выдаче, в воркерах - еще и периодически)
+COMPONENT_STATS.add("chatbot", lambda: {"ready": int(startup_state.ready)})
+COMPONENT_STATS.add(
+    "chatbot_encoder",
+    lambda: {"queue_depth": vector_db.encoder.stats()["queue_depth"]} if vector_db is not None else {},
+)
+COMPONENT_STATS.add(
+    "chatbot_telemetry", lambda: vector_db.telemetry.stats() if vector_db is not None else {},
+    counters=("emitted", "sent", "dropped", "spilled", "failed_batches"),
+)
+COMPONENT_STATS.add(
+    "chatbot_query_log", lambda: vector_db.query_log.stats() if vector_db is not None else {},
+    counters=("emitted", "written", "dropped", "segments", "write_errors"),
+)
+COMPONENT_STATS.add(
+    "chatbot_cache", lambda: vector_db.cache.stats() if vector_db is not None and vector_db.cache is not None else {},
+    counters=("embedding_hits", "embedding_misses", "result_hits", "result_misses", "invalidations"),
+)
+# Ограничение числа одновременно обрабатываемых запросов поиска (в каждом воркере)
+admission = AdmissionController()
+
+def initialize_service(warmup: bool = STARTUP_WARMUP) -> None:
+    """
+    Загрузка модели, подключение к индексу и прогрев с замером длительности фаз
+
+    Args:
+        warmup: Выполнить прогрев модели (в режиме нескольких воркеров - в каждом воркере после fork)
+    """
+    global vector_db
+    try:
+        with startup_state.track("model_load"):
+            db = VectorDatabase()
+        with startup_state.track("index_start"):
+            db.start_db()
+        if warmup:
+            with startup_state.track("warmup"):
+                db.warm_up()
+        vector_db = db
+        startup_state.mark_ready()
+        logger.info("VectorDatabase initialized successfully")
+    except Exception as init_error:
+        logger.error(f"FATAL: Failed to initialize VectorDatabase: {init_error}")
+        startup_state.mark_failed(str(init_error))
+
+def get_vector_db() -> VectorDatabase:
+    """Доступ к векторной базе; до завершения инициализации возвращает 503"""
+    if vector_db is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Сервис запускается (фаза: {startup_state.phase})",
+            headers={"Retry-After": "5"}
+        )
+    return vector_db
+
+def search_unavailable(error: SearchUnavailableError) -> HTTPException:
+    """503 при недоступности поиска: клиент отличает сбой индекса от ответа 'Не знаю'"""
+    retry_after = max(1, int(error.retry_after + 0.999))
+    return HTTPException(
+        status_code=503,
+        detail=f"Поиск временно недоступен: {str(error)}",
+        headers={"Retry-After": str(retry_after)}
+    )
+
+def overloaded(error: OverloadedError) -> HTTPException:
+    """503 при перегрузке: запрос отклонен до обработки, клиент повторяет его через Retry-After"""
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(max(1, int(error.retry_after + 0.999)))}
+    )
+
+async def admit(lane: str) -> AdmissionSlot:
+    """Допуск запроса к обработке; при перегрузке - 503 с Retry-After"""
+    try:
+        return await admission.acquire(lane)
+    except OverloadedError as e:
+        raise overloaded(e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Фоновая инициализация при старте и освобождение ресурсов при остановке"""
+    # В воркере после fork модель и индекс уже загружены родителем (см. serving.py)
+    init_task = asyncio.create_task(run_in_threadpool(initialize_service)) if vector_db is None else None
+    yield
+    if init_task is not None and not init_task.done():
+        logger.warning("Остановка сервера до завершения инициализации")
+    if vector_db is not None:
+        await vector_db.aclose()
 
 # Создание и настройка FastAPI приложения
 app = FastAPI(
     title="Чат-бот для поиска информации о багах в игре",
     description="API для поиска информации о багах в игре с использованием векторной базы данных Pinecone",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Настройка CORS
@@ -38,28 +138,120 @@ app.add_middleware(
     allow_origins=["*"],  # Пока что не ограничиваем список доменов
 )
 
-def process_query(query: str) -> Dict[str, Any]:
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Метрики длительности запросов, заголовок Server-Timing и выборочное профилирование"""
+    timings = start_request_timings()
+    profiler = start_profiler() if should_profile(request.headers.get(PROFILE_HEADER)) else None
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        # Шаблон пути маршрута, а не фактический путь, чтобы не раздувать число меток
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.labels(request.method, path).observe(elapsed)
+        REQUESTS.labels(request.method, path, str(status)).inc()
+        if profiler is not None:
+            await run_in_threadpool(finish_profiler, profiler, f"{request.method} {path}")
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    if profiler is not None:
+        response.headers["X-Profile-Id"] = profiler.id
+    return response
+
+def resolve_namespace(namespace: Optional[str]) -> str:
+    """Пространство имен запроса; неизвестная игра - 404"""
+    try:
+        return get_vector_db().resolve_namespace(namespace)
+    except UnknownNamespaceError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def confidence_threshold(namespace: str) -> float:
+    """Порог уверенности для игры (NAMESPACE_CONFIDENCE_THRESHOLDS, по умолчанию CONFIDENCE_THRESHOLD)"""
+    return NAMESPACE_CONFIDENCE_THRESHOLDS.get(namespace, CONFIDENCE_THRESHOLD)
+
+async def aprocess_query(query: str, namespace: str = PINECONE_NAMESPACE, source: str = "query") -> Dict[str, Any]:
     """
-    Обработка запроса пользователя и поиск соответствующего бага
-    
+    Асинхронная обработка запроса пользователя без блокировки event loop
+
     Args:
         query: Текстовый запрос пользователя
-        
+        namespace: Игра (пространство имен индекса)
+        source: Эндпоинт запроса для журнала запросов (query или stream)
+
     Returns:
         Словарь с ответом бота
     """
-    # Поиск информации в векторной базе
     logger.info(f"Обработка запроса: '{query}'")
-    bug_results = vector_db.search_bugs(query, top_k=1)
-    
+    started = time.perf_counter()
+    bug_results = await get_vector_db().asearch_bugs(query, top_k=1, namespace=namespace)
+    with stage("result_shaping"):
+        result = build_response(query, bug_results, namespace)
+    record_query(query, bug_results, result, source, time.perf_counter() - started)
+    return result
+
+def record_query(query: str, bug_results: List[Dict[str, Any]], result: Dict[str, Any], source: str, elapsed: float) -> None:
+    """
+    Запись события запроса в локальный журнал (см. query_log.py и query_analysis.py)
+
+    Args:
+        query: Текстовый запрос пользователя
+        bug_results: Найденные баги
+        result: Ответ бота
+        source: Эндпоинт запроса: query, stream или batch
+        elapsed: Длительность поиска и формирования ответа (секунды)
+    """
+    top = bug_results[0] if bug_results else {}
+    namespace = result.get("namespace") or PINECONE_NAMESPACE
+    threshold = confidence_threshold(namespace)
+    with stage("telemetry"):
+        get_vector_db().query_log.emit({
+            "ts": time.time(),
+            "namespace": namespace,
+            "query": query,
+            "source": source,
+            "ids": [match["id"] for match in bug_results],
+            "scores": [round(float(match["score"]), 5) for match in bug_results],
+            "confidence": result["confidence"],
+            "threshold": threshold,
+            "answered": bool(bug_results) and result["confidence"] >= threshold,
+            # Быстрый лексический путь: уверенность фиксированная, а не косинусная близость
+            "fast_path": "lexical_score" in top and "vector_score" not in top,
+            "status": result.get("status", "ok"),
+            "latency_ms": round(elapsed * 1000, 2),
+        })
+
+def build_response(query: str, bug_results: List[Dict[str, Any]], namespace: str = PINECONE_NAMESPACE) -> Dict[str, Any]:
+    """
+    Формирование ответа бота по результатам поиска
+
+    Args:
+        query: Текстовый запрос пользователя
+        bug_results: Найденные баги, отсортированные по убыванию схожести
+        namespace: Игра, порог уверенности которой применяется
+
+    Returns:
+        Словарь с ответом бота
+    """
+    # Ответ резервного индекса при недоступности основного помечается отдельно от обычного
+    degraded_source = bug_results[0].get("degraded") if bug_results else None
+    status = {"status": "degraded", "degraded_source": degraded_source} if degraded_source else {"status": "ok"}
+    status["namespace"] = namespace
+    threshold = confidence_threshold(namespace)
+
     # Формирование ответа
     if not bug_results:
         logger.info(f"No relevant bugs found for query: '{query}'")
+        UNKNOWN_ANSWERS.labels("no_results").inc()
         return {
             "response": "Не знаю",
             "confidence": 0.0,
             "bug_title": None,
-            "bug_description": None
+            "bug_description": None,
+            "namespace": namespace
         }
     
     top_result = bug_results[0]
@@ -68,13 +260,15 @@ def process_query(query: str) -> Dict[str, Any]:
     logger.info(f"Найден лучший результат. ID: {top_result.get('id')}, Title: '{top_result.get('title')}', Score: {confidence:.4f}")
     
     # Если уверенность ниже порога, отвечаем "Не знаю"
-    if confidence < CONFIDENCE_THRESHOLD:
-        logger.info(f"Confidence score {confidence:.2f} below threshold {CONFIDENCE_THRESHOLD} for query: '{query}'")
+    if confidence < threshold:
+        logger.info(f"Confidence score {confidence:.2f} below threshold {threshold} for query: '{query}'")
+        UNKNOWN_ANSWERS.labels("low_confidence").inc()
         return {
             "response": "Не знаю",
             "confidence": confidence,
             "bug_title": None,
-            "bug_description": None
+            "bug_description": None,
+            **status
         }
     
     logger.info(f"Found bug '{top_result.get('title')}' with confidence {confidence:.2f} for query: '{query}'")
@@ -83,16 +277,18 @@ def process_query(query: str) -> Dict[str, Any]:
         "response": top_result["description"],
         "confidence": confidence,
         "bug_title": top_result["title"],
-        "bug_description": top_result["description"]
+        "bug_description": top_result["description"],
+        **status
     }
 
 @app.post("/query", response_model=BotResponse, tags=["search"])
-async def handle_query(user_query: UserQuery):
+async def handle_query(user_query: UserQuery, priority: Optional[str] = Header(None, alias=PRIORITY_HEADER)):
     """
     Обработка HTTP запроса от пользователя
     
     Args:
         user_query: Объект с запросом пользователя
+        priority: Полоса запроса из заголовка X-Request-Priority (interactive или batch)
         
     Returns:
         Ответ бота в JSON формате
@@ -100,19 +296,221 @@ async def handle_query(user_query: UserQuery):
     if not user_query or not user_query.query:
          raise HTTPException(status_code=400, detail="Query cannot be empty")
          
+    namespace = resolve_namespace(user_query.namespace)
+    slot = await admit(AdmissionController.lane(priority))
     try:
         logger.info(f"Received query: '{user_query.query}'")
-        result = process_query(user_query.query)
+        result = await aprocess_query(user_query.query, namespace)
         return BotResponse(**result)
+    except HTTPException:
+        raise
+    except SearchUnavailableError as e:
+        raise search_unavailable(e)
     except Exception as e:
         logger.error(f"Ошибка при обработке запроса '{user_query.query}': {str(e)}")
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+    finally:
+        slot.release()
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Событие Server-Sent Events с данными в JSON"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def stream_query_events(query: str, namespace: str = PINECONE_NAMESPACE,
+                              slot: Optional[AdmissionSlot] = None) -> AsyncIterator[str]:
+    """
+    События потокового ответа: search (запрос принят), match (название бага и
+    уверенность сразу после поиска), answer (текст ответа), done (полный ответ)
+    или error
+
+    Место допуска slot освобождается сразу после поиска, не дожидаясь отправки событий.
+    """
+    yield sse_event("search", {"query": query, "namespace": namespace})
+    try:
+        result = await aprocess_query(query, namespace, source="stream")
+    except HTTPException as e:
+        yield sse_event("error", {"status": e.status_code, "detail": e.detail})
+        return
+    except SearchUnavailableError as e:
+        error = search_unavailable(e)
+        yield sse_event("error", {"status": error.status_code, "detail": error.detail, "retry_after": error.headers["Retry-After"]})
+        return
+    except Exception as e:
+        logger.error(f"Ошибка при потоковой обработке запроса '{query}': {str(e)}")
+        yield sse_event("error", {"status": 500, "detail": "Внутренняя ошибка сервера"})
+        return
+    finally:
+        if slot is not None:
+            slot.release()
+    yield sse_event("match", {"bug_title": result["bug_title"], "confidence": result["confidence"], "status": result["status"]})
+    yield sse_event("answer", {"response": result["response"]})
+    yield sse_event("done", BotResponse(**result).model_dump())
+
+@app.post("/query/stream", tags=["search"])
+async def handle_query_stream(user_query: UserQuery, priority: Optional[str] = Header(None, alias=PRIORITY_HEADER)):
+    """
+    Потоковая обработка запроса (Server-Sent Events)
+
+    Первое событие отправляется сразу, название бага и уверенность - как только
+    найдено совпадение, поэтому клиент может показывать ответ по частям.
+
+    Args:
+        user_query: Объект с запросом пользователя
+        priority: Полоса запроса из заголовка X-Request-Priority (interactive или batch)
+
+    Returns:
+        Поток событий text/event-stream
+    """
+    if not user_query or not user_query.query:
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    # До начала потока, чтобы во время запуска и при перегрузке клиент получил 503 с Retry-After,
+    # а для неизвестной игры - 404
+    namespace = resolve_namespace(user_query.namespace)
+    slot = await admit(AdmissionController.lane(priority))
+    logger.info(f"Received streaming query: '{user_query.query}'")
+    return StreamingResponse(
+        stream_query_events(user_query.query, namespace, slot),
+        media_type="text/event-stream",
+        # Отключаем буферизацию событий в прокси (nginx)
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Если клиент отключился до начала потока, место освобождается здесь
+        background=BackgroundTask(slot.release),
+    )
+
+@app.post("/query/batch", response_model=BatchResponse, tags=["search"])
+async def handle_query_batch(batch: BatchQuery):
+    """
+    Пакетная обработка запросов (инструменты триажа, регрессионные прогоны QA)
+
+    Пакет занимает одно место допуска в полосе batch: при перегрузке запросы
+    интерфейса обслуживаются раньше.
+
+    Args:
+        batch: Список запросов и количество кандидатов top_k
+
+    Returns:
+        Ответы в порядке запросов и список ошибок для неудачных запросов
+    """
+    if not batch.queries:
+        raise HTTPException(status_code=400, detail="Queries cannot be empty")
+    if len(batch.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"Batch size exceeds limit of {BATCH_MAX_QUERIES} queries")
+
+    logger.info(f"Received batch of {len(batch.queries)} queries (top_k={batch.top_k})")
+    results: List[Optional[BotResponse]] = [None] * len(batch.queries)
+    errors: List[BatchQueryError] = []
+
+    db = get_vector_db()
+    # Запросы группируются по играм: каждая группа - одна пачка векторизации и поиска
+    groups: Dict[str, List[int]] = {}
+    for i, item in enumerate(batch.queries):
+        if not item.query or not item.query.strip():
+            errors.append(BatchQueryError(index=i, detail="Query cannot be empty"))
+            continue
+        try:
+            groups.setdefault(db.resolve_namespace(item.namespace), []).append(i)
+        except UnknownNamespaceError as e:
+            errors.append(BatchQueryError(index=i, detail=str(e)))
+
+    slot = await admit("batch")
+    started = time.perf_counter()
+    try:
+        grouped = await asyncio.gather(*(
+            db.asearch_bugs_batch([batch.queries[i].query for i in indices], top_k=batch.top_k, namespace=namespace)
+            for namespace, indices in groups.items()
+        ))
+    finally:
+        slot.release()
+    elapsed = time.perf_counter() - started
+    with stage("result_shaping"):
+        for (namespace, indices), outcomes in zip(groups.items(), grouped):
+            for i, outcome in zip(indices, outcomes):
+                if isinstance(outcome, Exception):
+                    errors.append(BatchQueryError(index=i, detail=f"Ошибка поиска: {str(outcome) or type(outcome).__name__}"))
+                    continue
+                results[i] = batch_result(batch.queries[i].query, outcome, batch.top_k, namespace, elapsed)
+
+    errors.sort(key=lambda error: error.index)
+    return BatchResponse(results=results, errors=errors)
+
+def batch_result(query: str, outcome: List[Dict[str, Any]], top_k: int, namespace: str, elapsed: float) -> BotResponse:
+    """Ответ на один запрос пачки; при top_k > 1 - со списком кандидатов (в журнал - с длительностью всей пачки)"""
+    result = build_response(query, outcome, namespace)
+    record_query(query, outcome, result, "batch", elapsed)
+    if top_k > 1:
+        result["matches"] = [
+            {"id": match["id"], "score": float(match["score"]), "title": match.get("title")}
+            for match in outcome
+        ]
+    return BotResponse(**result)
+
+@app.get("/bugs/duplicates", response_model=DuplicatesResponse, tags=["bugs"])
+async def find_duplicates(
+    namespace: Optional[str] = None,
+    threshold: float = Query(
+        DUPLICATES_THRESHOLD, ge=DUPLICATES_MIN_THRESHOLD, le=1,
+        description="Порог косинусной близости (ниже DUPLICATES_MIN_THRESHOLD почти все баги игры попарно похожи)"
+    ),
+    method: str = Query("auto", pattern="^(auto|exact|ann)$", description="exact - все пары, ann - кандидаты IVF"),
+    limit: int = Query(100, ge=1, le=10000, description="Максимум пар и групп в ответе"),
+):
+    """
+    Поиск дубликатов среди всех багов игры по близости эмбеддингов
+
+    Поиск проходит по всей базе игры, поэтому выполняется в пуле потоков и занимает
+    место допуска в полосе batch.
+    """
+    namespace = resolve_namespace(namespace)
+    slot = await admit("batch")
+    try:
+        return await run_in_threadpool(get_vector_db().find_duplicates, namespace, threshold, method, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при поиске дубликатов в '{namespace}': {str(e)}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+    finally:
+        slot.release()
 
 @app.get("/health", tags=["system"])
 async def health_check():
-    """Проверка работоспособности FastAPI"""
+    """Проверка работоспособности FastAPI (liveness)"""
     logger.debug("Health check requested")
-    return {"status": "ok"}
+    if startup_state.failed:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": startup_state.error})
+    return {"status": "ok", "phase": startup_state.phase}
+
+@app.get("/ready", tags=["system"])
+async def readiness_check():
+    """Готовность к обработке запросов (readiness): модель загружена, индекс подключен"""
+    state = startup_state.snapshot()
+    if not startup_state.ready:
+        return JSONResponse(status_code=503, content={"status": "not_ready", **state})
+    return {"status": "ready", **state}
+
+@app.get("/stats", tags=["system"])
+async def service_stats():
+    """Внутренние метрики сервиса (запуск, допуск запросов, микробатчинг векторизации, кэш, телеметрия, индекс, документы)"""
+    db = get_vector_db()
+    return {
+        "startup": startup_state.snapshot(),
+        "encoder": db.encoder.stats(),
+        "telemetry": db.telemetry.stats(),
+        "query_log": db.query_log.stats(),
+        "cache": await run_in_threadpool(db.cache.stats) if db.cache is not None else None,
+        "vector_backend": db.backend.stats() if hasattr(db.backend, "stats") else None,
+        "docstore": db.docstore.stats() if db.docstore is not None else None,
+        "admission": admission.stats(),
+        "namespaces": {
+            "served": db.namespaces(),
+            "lexical_loaded": db.lexical.loaded_namespaces() if db.lexical is not None else None
+        }
+    }
+
+@app.get("/metrics", tags=["system"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Метрики в формате Prometheus: длительность этапов и запросов, ответы 'Не знаю', ошибки, кэш"""
+    return PlainTextResponse(await run_in_threadpool(render_metrics), media_type=CONTENT_TYPE)
 
 @app.post("/initialize_db", tags=["system"])
 async def initialize_database():
@@ -121,14 +519,21 @@ async def initialize_database():
     """
     try:
         logger.info("Initializing database via API call...")
-        vector_db.upsert_bugs_data()
+        report = await run_in_threadpool(get_vector_db().upsert_bugs_data)
         logger.info("Database initialized successfully via API.")
-        return {"status": "success", "message": "База данных успешно инициализирована"}
+        return {"status": "success", "message": "База данных успешно инициализирована", "report": report}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка при инициализации базы данных через API: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка сервера при инициализации БД: {str(e)}")
 
 if __name__ == "__main__":
     # Запуск сервера
-    logger.info("Starting Uvicorn server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    if SERVER_WORKERS > 1:
+        from .serving import serve
+
+        serve(SERVER_HOST, SERVER_PORT, SERVER_WORKERS)
+    else:
+        logger.info("Starting Uvicorn server...")
+        uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT) 
\ No newline at end of file
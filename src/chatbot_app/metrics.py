@@ -0,0 +1,252 @@
+"""
+Метрики сервиса в формате Prometheus и замер длительности этапов запроса
+
+Метрики ведутся библиотекой prometheus_client и отдаются эндпоинтом /metrics.
+Длительности этапов текущего HTTP запроса дополнительно собираются через
+contextvars для заголовка Server-Timing.
+
+При нескольких воркерах используется multiprocess режим prometheus_client: значения
+каждого процесса пишутся в файлы каталога PROMETHEUS_MULTIPROC_DIR, а /metrics
+любого воркера отдает их объединение. Каталог должен быть задан до импорта
+prometheus_client, поэтому при SERVER_WORKERS > 1 без PROMETHEUS_MULTIPROC_DIR
+здесь создается временный каталог.
+"""
+
+import atexit
+import contextvars
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import SERVER_WORKERS
+
+if SERVER_WORKERS > 1 and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="game-bugs-metrics-")
+    _owner = os.getpid()
+    # Каталог удаляет только создавший его процесс (воркеры завершаются через os._exit)
+    atexit.register(lambda: os.getpid() == _owner and shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True))
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR", "")
+
+# Границы гистограмм длительности в секундах (от долей миллисекунды до секунд)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class ComponentStats:
+    """
+    Числовые поля статистики компонентов (QueryCache.stats, TelemetrySink.stats) в виде метрик
+
+    Значения переносятся в метрики при выдаче /metrics, а в воркерах (start) еще и
+    раз в refresh_interval секунд, поэтому файлы каждого воркера остаются актуальными,
+    даже если /metrics отдает другой воркер. Поля-счетчики увеличивают Counter на прирост (в multiprocess режиме
+    суммируются по всем воркерам), остальные поля - Gauge с меткой pid работающих воркеров.
+    """
+
+    def __init__(self, refresh_interval: float = 1.0):
+        self.refresh_interval = refresh_interval
+        self._sources: List[Tuple[str, Callable[[], Dict[str, Any]], Tuple[str, ...]]] = []
+        self._metrics: Dict[str, Any] = {}
+        # Последние перенесенные значения полей-счетчиков
+        self._last: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, prefix: str, collect: Callable[[], Dict[str, Any]], counters: Iterable[str] = ()) -> None:
+        """
+        Регистрация статистики компонента
+
+        Args:
+            prefix: Префикс имен метрик
+            collect: Функция, возвращающая словарь статистики; нечисловые поля пропускаются
+            counters: Поля, которые являются монотонными счетчиками (остальные - gauge)
+        """
+        with self._lock:
+            self._sources.append((prefix, collect, tuple(counters)))
+
+    def refresh(self) -> None:
+        """Перенос текущей статистики в метрики"""
+        with self._lock:
+            for name, value, counter in self._collect():
+                if not counter:
+                    self._metric(name, Gauge).set(value)
+                    continue
+                previous = self._last.get(name, 0.0)
+                self._last[name] = value
+                # Уменьшение значения - сброс статистики компонента, учитывается все новое значение
+                self._metric(name, Counter).inc(value - previous if value >= previous else value)
+
+    def start(self) -> None:
+        """
+        Периодический перенос статистики (вызывается в воркере после fork)
+
+        Текущие значения счетчиков считаются уже перенесенными: их учел родитель.
+        """
+        with self._lock:
+            self._last.update({name: value for name, value, counter in self._collect() if counter})
+        threading.Thread(target=self._refresh_loop, name="component-stats", daemon=True).start()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка переноса статистики компонентов в метрики: {str(e)}")
+
+    def _collect(self) -> List[Tuple[str, float, bool]]:
+        values = []
+        for prefix, collect, counters in self._sources:
+            try:
+                stats = collect() or {}
+            except Exception as e:
+                logger.warning(f"Не удалось собрать статистику {prefix}: {str(e)}")
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                values.append((f"{prefix}_{key}", float(value), key in counters))
+        return values
+
+    def _metric(self, name: str, kind: type):
+        metric = self._metrics.get(name)
+        if metric is None:
+            options = {} if kind is Counter else {"multiprocess_mode": "liveall"}
+            metric = self._metrics[name] = kind(name, f"Статистика компонента: {name}", **options)
+        return metric
+
+
+COMPONENT_STATS = ComponentStats()
+
+
+def render() -> bytes:
+    """Все метрики (в multiprocess режиме - объединенные по воркерам) в текстовом формате Prometheus"""
+    COMPONENT_STATS.refresh()
+    if not MULTIPROCESS_DIR:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_process_dead(pid: int) -> None:
+    """Удаление gauge завершившегося воркера из выдачи (счетчики и гистограммы сохраняются)"""
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(pid)
+
+
+STAGE_SECONDS = Histogram(
+    "chatbot_stage_duration_seconds",
+    "Длительность этапов обработки запроса (cache, encode, vector_query, lexical, hydrate, result_shaping, telemetry, telemetry_send)",
+    ["stage"], buckets=DEFAULT_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "chatbot_request_duration_seconds", "Длительность HTTP запросов", ["method", "path"], buckets=DEFAULT_BUCKETS,
+)
+REQUESTS = Counter(
+    "chatbot_requests_total", "Число HTTP запросов по коду ответа", ["method", "path", "status"],
+)
+UNKNOWN_ANSWERS = Counter(
+    "chatbot_unknown_answers_total", "Ответы 'Не знаю' по причине (no_results, low_confidence)", ["reason"],
+)
+ERRORS = Counter(
+    "chatbot_errors_total", "Ошибки обработки по типу", ["type"],
+)
+FALLBACK_QUERIES = Counter(
+    "chatbot_fallback_queries_total", "Запросы, обслуженные резервным индексом (локальным или лексическим)",
+)
+VECTOR_HEDGED_REQUESTS = Counter(
+    "chatbot_vector_hedged_requests_total", "Повторные (hedged) запросы к векторному индексу", ["backend"],
+)
+VECTOR_QUERY_FAILURES = Counter(
+    "chatbot_vector_query_failures_total", "Неудачные запросы к векторному индексу (timeout, error, circuit_open)",
+    ["backend", "reason"],
+)
+CIRCUIT_BREAKER_STATE = Gauge(
+    "chatbot_circuit_breaker_state", "Состояние автомата отключения индекса (0 closed, 1 half_open, 2 open)", ["backend"],
+    multiprocess_mode="livemax",
+)
+DEGRADED_RESPONSES = Counter(
+    "chatbot_degraded_responses_total", "Ответы из деградированного пути при недоступности индекса", ["source"],
+)
+LEXICAL_FAST_PATH_HITS = Counter(
+    "chatbot_lexical_fast_path_total", "Запросы, обслуженные лексическим индексом без векторного поиска",
+)
+NAMESPACE_LOADS = Counter(
+    "chatbot_namespace_loads_total", "Загрузки пространств имен (игр) при первом обращении", ["component"],
+)
+NAMESPACE_EVICTIONS = Counter(
+    "chatbot_namespace_evictions_total", "Вытеснения пространств имен (игр) из памяти по LRU", ["component"],
+)
+DUPLICATES_FLAGGED = Counter(
+    "chatbot_duplicates_flagged_total", "Загруженные баги, похожие на уже проиндексированные (возможные дубликаты)",
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "chatbot_admission_in_flight", "Запросы, допущенные к обработке и еще не завершенные", multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "chatbot_admission_queue_depth", "Запросы, ожидающие допуска к обработке, по полосам (interactive, batch)", ["lane"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_WAIT_SECONDS = Histogram(
+    "chatbot_admission_queue_wait_seconds", "Время ожидания допуска к обработке", ["lane"], buckets=DEFAULT_BUCKETS,
+)
+ADMISSION_REJECTIONS = Counter(
+    "chatbot_admission_rejections_total", "Запросы, отклоненные при перегрузке (queue_full, expected_wait, queue_timeout, shed)",
+    ["lane", "reason"],
+)
+ENCODE_BATCH_SIZE = Histogram(
+    "chatbot_encode_batch_size", "Размер батчей микробатчинга векторизации",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+ENCODE_QUEUE_WAIT_SECONDS = Histogram(
+    "chatbot_encode_queue_wait_seconds", "Время ожидания запроса в очереди микробатчинга", buckets=DEFAULT_BUCKETS,
+)
+
+
+# Длительности этапов текущего HTTP запроса (для Server-Timing); None вне запроса
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def start_request_timings() -> Dict[str, float]:
+    """Начало сбора длительностей этапов для текущего запроса"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Учет длительности этапа в гистограмме и в Server-Timing текущего запроса"""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Замер длительности этапа обработки запроса"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def server_timing_header(timings: Dict[str, float], total: Optional[float] = None) -> str:
+    """Значение заголовка Server-Timing (длительности в миллисекундах)"""
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
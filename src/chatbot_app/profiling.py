@@ -0,0 +1,116 @@
+"""
+Выборочный сэмплирующий профилировщик запросов
+
+Во время профилируемого запроса фоновый поток с интервалом PROFILER_INTERVAL_MS
+снимает стеки всех потоков процесса (event loop и пулы векторизации/I/O) и
+накапливает их в свернутом виде (collapsed stacks). Результат сохраняется в
+PROFILER_OUTPUT_DIR и открывается в speedscope или flamegraph.pl.
+
+Одновременно профилируется не больше одного запроса: сэмплы снимаются со всего
+процесса, поэтому в профиль попадают и конкурентные запросы.
+"""
+
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from .config import PROFILER_ENABLED, PROFILER_SAMPLE_RATE, PROFILER_INTERVAL_MS, PROFILER_OUTPUT_DIR
+
+logger = logging.getLogger(__name__)
+
+# Заголовок запроса, включающий профилирование при PROFILER_ENABLED
+PROFILE_HEADER = "x-profile"
+
+# Имена функций в вершине стека простаивающих потоков (ожидание задач, событий, сокетов)
+_IDLE_FRAMES = {"wait", "select", "_worker"}
+
+_active_lock = threading.Lock()
+
+
+class SamplingProfiler:
+    """Сбор стеков всех потоков процесса с фиксированным интервалом"""
+
+    def __init__(self, interval_ms: float = PROFILER_INTERVAL_MS, max_depth: int = 64):
+        self.id = uuid.uuid4().hex[:12]
+        self._interval = max(0.001, interval_ms / 1000)
+        self._max_depth = max_depth
+        self._stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self.duration = 0.0
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self._interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or frame.f_code.co_name in _IDLE_FRAMES:
+                    continue
+                names = []
+                while frame is not None and len(names) < self._max_depth:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Профиль в свернутом формате: стек через ';' и число сэмплов"""
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+    def save(self, output_dir: str = PROFILER_OUTPUT_DIR) -> str:
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{self.id}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        return path
+
+
+def should_profile(header_value: Optional[str]) -> bool:
+    """Профилировать ли запрос: по заголовку X-Profile или по доле PROFILER_SAMPLE_RATE"""
+    if not PROFILER_ENABLED:
+        return False
+    if header_value and header_value.strip().lower() in ("1", "true", "yes"):
+        return True
+    return PROFILER_SAMPLE_RATE > 0 and random.random() < PROFILER_SAMPLE_RATE
+
+
+def start_profiler() -> Optional[SamplingProfiler]:
+    """Запуск профилировщика, если сейчас не профилируется другой запрос"""
+    if not _active_lock.acquire(blocking=False):
+        return None
+    profiler = SamplingProfiler()
+    profiler.start()
+    return profiler
+
+
+def finish_profiler(profiler: SamplingProfiler, label: str) -> Optional[str]:
+    """Остановка профилировщика и сохранение профиля; возвращает путь к файлу"""
+    try:
+        profiler.stop()
+        path = profiler.save()
+        logger.info(f"Профиль запроса {label} ({profiler.duration * 1000:.1f} мс, {profiler.samples} сэмплов) сохранен в {path}")
+        return path
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить профиль запроса {label}: {str(e)}")
+        return None
+    finally:
+        _active_lock.release()
@@ -0,0 +1,198 @@
+"""
+Сжатое представление эмбеддингов: float16, скалярное int8 и product quantization (PQ)
+
+Сжатые коды используются для приближенной оценки всех кандидатов, после чего
+несколько лучших переоцениваются точно по векторам полной точности (см.
+LocalBackend), поэтому top-1 совпадает с точным поиском, а в памяти процесса
+постоянно находятся только коды.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+# Число строк, переводимых во float32 за один шаг приближенной оценки (блок остается в кэше процессора)
+_BLOCK_ROWS = 4096
+
+
+class Quantizer:
+    """Базовый интерфейс: кодирование строк и приближенное скалярное произведение с запросом"""
+
+    kind = "none"
+
+    def __init__(self, trained_size: int = 0):
+        self.trained_size = trained_size
+
+    def encode(self, rows: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Приближенные скалярные произведения строк (по их кодам) с нормализованным запросом"""
+        raise NotImplementedError
+
+    def layout(self, codes: np.ndarray) -> np.ndarray:
+        """Коды в порядке хранения, удобном для scores (по умолчанию построчно)"""
+        return np.ascontiguousarray(codes)
+
+    def params(self) -> Dict[str, np.ndarray]:
+        """Параметры для сохранения на диск"""
+        return {}
+
+    def nbytes(self) -> int:
+        """Размер параметров (кодовых книг, масштабов) в байтах"""
+        return sum(value.nbytes for value in self.params().values())
+
+
+class Float16Quantizer(Quantizer):
+    """Половинная точность: в 2 раза меньше памяти, погрешность оценки ~1e-3"""
+
+    kind = "float16"
+
+    def encode(self, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(rows, dtype=np.float16)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        return _blocked(codes, lambda block: block.astype(np.float32) @ query)
+
+
+class Int8Quantizer(Quantizer):
+    """Скалярное квантование int8 с масштабом по каждой координате: в 4 раза меньше памяти"""
+
+    kind = "int8"
+
+    def __init__(self, scale: np.ndarray, trained_size: int = 0):
+        super().__init__(trained_size)
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    @classmethod
+    def train(cls, matrix: np.ndarray) -> "Int8Quantizer":
+        scale = np.abs(np.asarray(matrix, dtype=np.float32)).max(axis=0) / 127
+        scale[scale == 0] = 1.0
+        return cls(scale, len(matrix))
+
+    def encode(self, rows: np.ndarray) -> np.ndarray:
+        # Значения за пределами обученного диапазона обрезаются
+        return np.clip(np.rint(np.asarray(rows, dtype=np.float32) / self.scale), -127, 127).astype(np.int8)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # Масштаб переносится в запрос: (codes * scale) @ q == codes @ (scale * q)
+        scaled = (query * self.scale).astype(np.float32)
+        return _blocked(codes, lambda block: block.astype(np.float32) @ scaled)
+
+    def params(self) -> Dict[str, np.ndarray]:
+        return {"scale": self.scale}
+
+
+class ProductQuantizer(Quantizer):
+    """
+    Product quantization: вектор делится на m подвекторов, каждый кодируется номером
+    ближайшего из 256 центроидов своего подпространства (1 байт на подвектор)
+
+    Приближенное скалярное произведение считается по таблице (m, 256) скалярных
+    произведений подвекторов запроса с центроидами (asymmetric distance computation).
+    Коды хранятся по столбцам: выборка из таблицы идет по непрерывному столбцу подвектора.
+    """
+
+    kind = "pq"
+
+    def __init__(self, codebooks: np.ndarray, dimension: int, trained_size: int = 0):
+        super().__init__(trained_size)
+        # (m, ks, dsub); размерность дополняется нулями до кратной m
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)
+        self.dimension = int(dimension)
+
+    @property
+    def subvectors(self) -> int:
+        return self.codebooks.shape[0]
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, subvectors: int, iterations: int = 10, seed: int = 0,
+              sample_size: int = 256 * 40) -> "ProductQuantizer":
+        """Обучение кодовых книг k-means в каждом подпространстве на выборке строк"""
+        n, dimension = matrix.shape
+        subvectors = max(1, min(subvectors or max(1, dimension // 4), dimension))
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(matrix[np.sort(rng.choice(n, min(n, sample_size), replace=False))], dtype=np.float32)
+        parts = _split(sample, subvectors)
+        ks = min(256, len(sample))
+        codebooks = np.stack([_kmeans(parts[:, j], ks, iterations, rng) for j in range(subvectors)])
+        return cls(codebooks, dimension, n)
+
+    def encode(self, rows: np.ndarray) -> np.ndarray:
+        parts = _split(np.asarray(rows, dtype=np.float32), self.subvectors)
+        codes = np.empty((len(rows), self.subvectors), dtype=np.uint8, order="F")
+        for j, codebook in enumerate(self.codebooks):
+            codes[:, j] = _nearest(parts[:, j], codebook)
+        return codes
+
+    def layout(self, codes: np.ndarray) -> np.ndarray:
+        return np.asfortranarray(codes)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        query_parts = _split(query[None, :].astype(np.float32), self.subvectors)[0]
+        table = np.einsum("mkd,md->mk", self.codebooks, query_parts)
+        scores = np.zeros(len(codes), dtype=np.float32)
+        for j in range(self.subvectors):
+            scores += table[j].take(codes[:, j])
+        return scores
+
+    def params(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks, "dimension": np.asarray(self.dimension)}
+
+
+def train_quantizer(kind: str, matrix: np.ndarray, pq_subvectors: int = 0) -> Optional[Quantizer]:
+    """Обучение квантователя по типу из LOCAL_INDEX_QUANTIZATION (none - без сжатия)"""
+    if kind == "none":
+        return None
+    if kind == "float16":
+        return Float16Quantizer(len(matrix))
+    if kind == "int8":
+        return Int8Quantizer.train(matrix)
+    if kind == "pq":
+        return ProductQuantizer.train(matrix, pq_subvectors)
+    raise ValueError(f"Unknown quantization '{kind}', expected none, float16, int8 or pq")
+
+
+def load_quantizer(kind: str, params: Dict[str, np.ndarray], trained_size: int) -> Quantizer:
+    """Восстановление квантователя из параметров, сохраненных Quantizer.params"""
+    if kind == "float16":
+        return Float16Quantizer(trained_size)
+    if kind == "int8":
+        return Int8Quantizer(params["scale"], trained_size)
+    if kind == "pq":
+        return ProductQuantizer(params["codebooks"], int(params["dimension"]), trained_size)
+    raise ValueError(f"Unknown quantization '{kind}'")
+
+
+def _blocked(codes: np.ndarray, score_block) -> np.ndarray:
+    """Оценка блоками строк, чтобы временные float32 копии не превышали _BLOCK_ROWS строк"""
+    if len(codes) <= _BLOCK_ROWS:
+        return score_block(codes)
+    return np.concatenate([score_block(codes[start:start + _BLOCK_ROWS]) for start in range(0, len(codes), _BLOCK_ROWS)])
+
+
+def _split(rows: np.ndarray, subvectors: int) -> np.ndarray:
+    """Строки (n, d) -> подвекторы (n, m, dsub) с дополнением нулями до кратной m размерности"""
+    pad = (-rows.shape[1]) % subvectors
+    if pad:
+        rows = np.pad(rows, ((0, 0), (0, pad)))
+    return rows.reshape(len(rows), subvectors, -1)
+
+
+def _nearest(rows: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Номер ближайшего (по евклидову расстоянию) центроида: argmax(2 x.c - |c|^2)"""
+    return np.argmax(2 * rows @ centroids.T - (centroids ** 2).sum(axis=1), axis=1)
+
+
+def _kmeans(rows: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = rows[rng.choice(len(rows), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest(rows, centroids)
+        counts = np.bincount(labels, minlength=k)
+        # Суммы по кластерам через bincount по каждой координате (np.add.at на порядок медленнее)
+        sums = np.stack([np.bincount(labels, weights=rows[:, d], minlength=k) for d in range(rows.shape[1])], axis=1)
+        empty = counts == 0
+        centroids = sums / np.maximum(counts, 1)[:, None]
+        # Пустые кластеры переинициализируем случайными точками выборки
+        centroids[empty] = rows[rng.choice(len(rows), int(empty.sum()))]
+    return centroids
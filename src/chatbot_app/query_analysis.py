@@ -0,0 +1,356 @@
+"""
+Офлайн-анализ журнала запросов (см. query_log.py)
+
+События всех сегментов читаются в столбцы numpy, дальше вся обработка векторная:
+- рекомендация порога уверенности (CONFIDENCE_THRESHOLD и пороги по играм). С
+  размеченными запросами (--labels) выбирается наименьший порог с точностью не ниже
+  --target-precision (или с лучшей F1), без разметки - порог Оцу, разделяющий
+  распределение уверенности на "похожие" и "непохожие" запросы;
+- самые частые запросы без ответа ("Не знаю") - кандидаты на новые баги или синонимы;
+- набор прогрева кэшей: самые частые запросы (WARMUP_QUERIES_PATH).
+
+Запуск из корня проекта:
+    python -m src.chatbot_app.query_analysis [query_logs] [--since-hours 24] [--labels labels.jsonl]
+        [--warmup-output warmup.jsonl] [--output report.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .config import CONFIDENCE_THRESHOLD, NAMESPACE_CONFIDENCE_THRESHOLDS, PINECONE_NAMESPACE, QUERY_LOG_DIR, WARMUP_QUERIES_LIMIT
+from .cache import normalize_query
+from .query_log import iter_segment_lines, segment_paths
+
+# Минимум событий игры с результатами поиска для отдельной рекомендации порога
+MIN_NAMESPACE_EVENTS = 50
+
+# Число корзин гистограммы уверенности для порога Оцу
+_HISTOGRAM_BINS = 200
+
+
+def load_events(paths: Iterable[str], since: Optional[float] = None,
+                include_batch: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Чтение событий журнала в столбцы
+
+    Args:
+        paths: Сегменты журнала или каталоги с ними
+        since: Учитывать события не раньше этого времени (unix time)
+        include_batch: Учитывать запросы /query/batch (прогоны QA искажают частоты)
+
+    Returns:
+        Столбцы одинаковой длины: ts, namespace, query, key (игра + нормализованный
+        запрос), top_id, confidence, answered, fast_path, degraded, latency_ms, source
+    """
+    columns: Dict[str, List[Any]] = {name: [] for name in (
+        "ts", "namespace", "query", "key", "top_id", "confidence", "answered", "fast_path", "degraded",
+        "latency_ms", "source"
+    )}
+    for path in _expand(paths):
+        # Сегмент, измененный до начала окна, содержит только более старые события
+        if since is not None and os.path.getmtime(path) < since:
+            continue
+        for line in iter_segment_lines(path):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if since is not None and event.get("ts", 0.0) < since:
+                continue
+            if not include_batch and event.get("source") == "batch":
+                continue
+            namespace = event.get("namespace") or PINECONE_NAMESPACE
+            ids = event.get("ids") or []
+            columns["ts"].append(event.get("ts", 0.0))
+            columns["namespace"].append(namespace)
+            columns["query"].append(event.get("query", ""))
+            columns["key"].append(f"{namespace}\x1f{normalize_query(event.get('query', ''))}")
+            columns["top_id"].append(ids[0] if ids else "")
+            columns["confidence"].append(event.get("confidence", 0.0))
+            columns["answered"].append(bool(event.get("answered")))
+            columns["fast_path"].append(bool(event.get("fast_path")))
+            columns["degraded"].append(event.get("status") == "degraded")
+            columns["latency_ms"].append(event.get("latency_ms", 0.0))
+            columns["source"].append(event.get("source", "query"))
+
+    return {
+        "ts": np.asarray(columns["ts"], dtype=np.float64),
+        "namespace": np.asarray(columns["namespace"], dtype=object),
+        "query": np.asarray(columns["query"], dtype=object),
+        "key": np.asarray(columns["key"], dtype=object),
+        "top_id": np.asarray(columns["top_id"], dtype=object),
+        "confidence": np.asarray(columns["confidence"], dtype=np.float32),
+        "answered": np.asarray(columns["answered"], dtype=bool),
+        "fast_path": np.asarray(columns["fast_path"], dtype=bool),
+        "degraded": np.asarray(columns["degraded"], dtype=bool),
+        "latency_ms": np.asarray(columns["latency_ms"], dtype=np.float32),
+        "source": np.asarray(columns["source"], dtype=object),
+    }
+
+
+def _expand(paths: Iterable[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            yield from segment_paths(path)
+        else:
+            yield path
+
+
+def load_labels(path: str) -> Dict[str, Optional[str]]:
+    """
+    Разметка запросов: JSONL с полями query, bug_id (null - правильный ответ "Не знаю") и namespace
+
+    Returns:
+        Ключ (игра + нормализованный запрос) -> ожидаемый id бага или None
+    """
+    labels: Dict[str, Optional[str]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                namespace = item.get("namespace") or PINECONE_NAMESPACE
+                bug_id = item.get("bug_id")
+                labels[f"{namespace}\x1f{normalize_query(item['query'])}"] = str(bug_id) if bug_id is not None else None
+    return labels
+
+
+def otsu_threshold(confidence: np.ndarray) -> Optional[float]:
+    """Порог, максимизирующий межклассовую дисперсию гистограммы уверенности (метод Оцу)"""
+    if len(confidence) < 2:
+        return None
+    hist, edges = np.histogram(confidence, bins=_HISTOGRAM_BINS, range=(0.0, 1.0))
+    centers = (edges[:-1] + edges[1:]) / 2
+    weight_low = np.cumsum(hist)
+    weight_high = weight_low[-1] - weight_low
+    mass_low = np.cumsum(hist * centers)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_low = mass_low / weight_low
+        mean_high = (mass_low[-1] - mass_low) / weight_high
+        variance = weight_low * weight_high * (mean_low - mean_high) ** 2
+    variance = np.nan_to_num(variance, nan=-1.0)
+    if variance.max() <= 0:
+        return None
+    return float(edges[int(np.argmax(variance)) + 1])
+
+
+def labeled_threshold(confidence: np.ndarray, correct: np.ndarray, positives: int,
+                      target_precision: float) -> Optional[Dict[str, float]]:
+    """
+    Порог по размеченным запросам
+
+    Для каждого возможного порога (уникальные значения уверенности) точность - доля
+    правильных среди ответов с уверенностью не ниже порога, полнота - доля правильных
+    среди запросов, у которых есть правильный баг. Выбирается наименьший порог с
+    точностью не ниже target_precision, а если такого нет - порог с лучшей F1.
+
+    Args:
+        confidence: Уверенность размеченных запросов
+        correct: Найден ожидаемый баг
+        positives: Число запросов, у которых есть правильный баг
+        target_precision: Целевая точность ответов
+    """
+    if not len(confidence) or not positives:
+        return None
+    order = np.argsort(-confidence, kind="stable")
+    scores = confidence[order]
+    answered = np.arange(1, len(scores) + 1)
+    hits = np.cumsum(correct[order])
+    # Порог проходит между разными значениями: берем последнюю позицию каждой группы равных оценок
+    last = np.append(scores[1:] != scores[:-1], True)
+    scores, answered, hits = scores[last], answered[last], hits[last]
+    precision = hits / answered
+    recall = hits / positives
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+    meets = np.nonzero(precision >= target_precision)[0]
+    best = int(meets[-1]) if len(meets) else int(np.argmax(f1))
+    return {
+        "threshold": float(scores[best]),
+        "precision": float(precision[best]),
+        "recall": float(recall[best]),
+        "f1": float(f1[best]),
+        "meets_target": bool(len(meets)),
+    }
+
+
+def recommend_thresholds(events: Dict[str, np.ndarray], labels: Optional[Dict[str, Optional[str]]] = None,
+                         target_precision: float = 0.9) -> Dict[str, Any]:
+    """
+    Рекомендации порога уверенности: общий и по играм с достаточным числом событий
+
+    Учитываются только ответы векторного поиска: у быстрого лексического пути и
+    деградированных ответов уверенность не сравнима с косинусной близостью.
+    """
+    usable = ~events["fast_path"] & ~events["degraded"] & (events["top_id"] != "")
+    recommendations: Dict[str, Any] = {}
+    namespaces = np.unique(events["namespace"][usable]) if usable.any() else []
+    for scope in [None, *namespaces]:
+        mask = usable if scope is None else usable & (events["namespace"] == scope)
+        if scope is not None and mask.sum() < MIN_NAMESPACE_EVENTS:
+            continue
+        confidence = events["confidence"][mask]
+        current = NAMESPACE_CONFIDENCE_THRESHOLDS.get(scope, CONFIDENCE_THRESHOLD) if scope else CONFIDENCE_THRESHOLD
+        item: Dict[str, Any] = {
+            "events": int(mask.sum()),
+            "current_threshold": current,
+            "current_answer_rate": float((confidence >= current).mean()) if len(confidence) else 0.0,
+        }
+        if labels:
+            expected = np.asarray([labels.get(key, "") for key in events["key"][mask]], dtype=object)
+            labeled = expected != ""
+            has_bug = labeled & np.not_equal(expected, None)
+            correct = has_bug & (events["top_id"][mask] == expected)
+            result = labeled_threshold(confidence[labeled], correct[labeled], int(has_bug.sum()), target_precision)
+            item.update({"method": "labeled", "labeled_events": int(labeled.sum())})
+            if result is not None:
+                item.update(result)
+        else:
+            threshold = otsu_threshold(confidence)
+            item.update({"method": "otsu", "threshold": threshold})
+        if item.get("threshold") is not None:
+            # Округление вверх: точность при округленном пороге не ниже найденной
+            item["threshold"] = math.ceil(item["threshold"] * 1000) / 1000
+            item["answer_rate"] = float((confidence >= item["threshold"]).mean())
+        recommendations["all" if scope is None else scope] = item
+
+    overall = recommendations.get("all", {}).get("threshold")
+    per_namespace = [
+        f"{name}:{item['threshold']}" for name, item in recommendations.items()
+        if name != "all" and item.get("threshold") is not None
+    ]
+    return {
+        "recommendations": recommendations,
+        "env": {
+            "CONFIDENCE_THRESHOLD": overall,
+            "NAMESPACE_CONFIDENCE_THRESHOLDS": ",".join(per_namespace),
+        },
+    }
+
+
+def frequent_queries(events: Dict[str, np.ndarray], mask: Optional[np.ndarray] = None,
+                     limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Самые частые запросы (после нормализации) среди событий mask
+
+    Returns:
+        Записи {"query", "namespace", "count", "answered_share", "mean_confidence"} по убыванию частоты
+    """
+    if mask is None:
+        mask = np.ones(len(events["key"]), dtype=bool)
+    keys = events["key"][mask]
+    if not len(keys):
+        return []
+    unique, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    answered = np.bincount(inverse, weights=events["answered"][mask], minlength=len(unique))
+    confidence = np.bincount(inverse, weights=events["confidence"][mask], minlength=len(unique))
+    order = np.argsort(-counts, kind="stable")[:max(0, limit)]
+    queries, namespaces = events["query"][mask], events["namespace"][mask]
+    return [
+        {
+            "query": queries[first[i]],
+            "namespace": namespaces[first[i]],
+            "count": int(counts[i]),
+            "answered_share": float(answered[i] / counts[i]),
+            "mean_confidence": float(confidence[i] / counts[i]),
+        }
+        for i in order
+    ]
+
+
+def latency_summary(events: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Перцентили длительности обработки по источникам запросов (мс)"""
+    summary: Dict[str, Any] = {}
+    for source in np.unique(events["source"]) if len(events["source"]) else []:
+        latency = events["latency_ms"][events["source"] == source]
+        p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+        summary[source] = {"count": int(len(latency)), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+    return summary
+
+
+def analyze(events: Dict[str, np.ndarray], labels: Optional[Dict[str, Optional[str]]] = None,
+            target_precision: float = 0.9, top: int = 50) -> Dict[str, Any]:
+    """Отчет по журналу: объем, доля ответов, длительность, порог и частые запросы без ответа"""
+    total = len(events["key"])
+    return {
+        "events": total,
+        "unique_queries": int(len(np.unique(events["key"]))) if total else 0,
+        "answer_rate": float(events["answered"].mean()) if total else 0.0,
+        "period": {
+            "from": float(events["ts"].min()) if total else None,
+            "to": float(events["ts"].max()) if total else None,
+        },
+        "latency_ms": latency_summary(events),
+        "threshold": recommend_thresholds(events, labels, target_precision),
+        "top_unanswered": frequent_queries(events, ~events["answered"], top),
+    }
+
+
+def write_warmup_set(events: Dict[str, np.ndarray], path: str, limit: int = WARMUP_QUERIES_LIMIT) -> int:
+    """
+    Сохранение набора прогрева кэшей: самые частые запросы, по убыванию частоты
+
+    Запросы быстрого лексического пути не попадают в набор: они обслуживаются без
+    векторизации и кэша.
+
+    Returns:
+        Число запросов в наборе
+    """
+    items = frequent_queries(events, ~events["fast_path"], limit)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(
+                {"query": item["query"], "namespace": item["namespace"], "count": item["count"]}, ensure_ascii=False
+            ) + "\n")
+    os.replace(path + ".tmp", path)
+    return len(items)
+
+
+def iter_warmup_queries(path: str) -> Iterator[Dict[str, Any]]:
+    """Чтение набора прогрева (JSONL с полями query и namespace)"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main() -> None:
+    """Отчет по журналу запросов и набор прогрева кэшей"""
+    parser = argparse.ArgumentParser(description="Офлайн-анализ журнала запросов")
+    parser.add_argument("paths", nargs="*", default=[QUERY_LOG_DIR] if QUERY_LOG_DIR else [],
+                        help="Сегменты журнала или каталоги с ними (по умолчанию QUERY_LOG_DIR)")
+    parser.add_argument("--since-hours", type=float, help="Только события за последние N часов")
+    parser.add_argument("--include-batch", action="store_true", help="Учитывать запросы /query/batch")
+    parser.add_argument("--labels", help="JSONL с разметкой: query, bug_id (null - правильный ответ 'Не знаю'), namespace")
+    parser.add_argument("--target-precision", type=float, default=0.9, help="Целевая точность ответов для порога по разметке")
+    parser.add_argument("--top", type=int, default=50, help="Число частых запросов без ответа в отчете")
+    parser.add_argument("--warmup-output", help="Файл для набора прогрева кэшей (WARMUP_QUERIES_PATH)")
+    parser.add_argument("--warmup-size", type=int, default=WARMUP_QUERIES_LIMIT, help="Размер набора прогрева")
+    parser.add_argument("--output", help="Файл для сохранения отчета в JSON")
+    args = parser.parse_args()
+    if not args.paths:
+        parser.error("укажите сегменты журнала или каталог (QUERY_LOG_DIR не задан)")
+
+    started = time.perf_counter()
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    events = load_events(args.paths, since=since, include_batch=args.include_batch)
+    labels = load_labels(args.labels) if args.labels else None
+    report = analyze(events, labels, args.target_precision, args.top)
+    if args.warmup_output:
+        report["warmup"] = {"path": args.warmup_output, "queries": write_warmup_set(events, args.warmup_output, args.warmup_size)}
+    report["seconds"] = time.perf_counter() - started
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Локальный журнал запросов: буферизованная запись, ротация и сжатие сегментов
+
+Каждое событие (текст запроса, id и оценки найденных багов, уверенность, ответ или
+"Не знаю", длительность) - одна строка JSON. Запрос только ставит событие в очередь
+в памяти; фоновый поток раз в QUERY_LOG_FLUSH_INTERVAL_SECONDS дописывает все
+накопленные события в текущий сегмент одной операцией записи. Сегмент закрывается
+при достижении QUERY_LOG_MAX_SEGMENT_MB или возраста QUERY_LOG_ROTATE_SECONDS и
+сжимается gzip, старые сжатые сегменты сверх QUERY_LOG_MAX_FILES удаляются.
+
+У каждого процесса (воркера) свой сегмент: queries-<время начала>-<pid>.jsonl, поэтому
+записи разных воркеров не перемешиваются и не требуют блокировок. Читает журнал
+офлайн-анализ (см. query_analysis.py) - сжатые и текущие сегменты одинаково.
+"""
+
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import (
+    QUERY_LOG_DIR, QUERY_LOG_QUEUE_SIZE, QUERY_LOG_FLUSH_INTERVAL_SECONDS, QUERY_LOG_MAX_SEGMENT_MB,
+    QUERY_LOG_ROTATE_SECONDS, QUERY_LOG_MAX_FILES
+)
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "queries-"
+
+
+def segment_paths(directory: str = QUERY_LOG_DIR) -> List[str]:
+    """Сегменты журнала в каталоге (сжатые и текущие) в порядке времени начала"""
+    paths = glob.glob(os.path.join(directory, SEGMENT_PREFIX + "*.jsonl"))
+    paths += glob.glob(os.path.join(directory, SEGMENT_PREFIX + "*.jsonl.gz"))
+    return sorted(paths, key=os.path.basename)
+
+
+def iter_segment_lines(path: str) -> Iterator[bytes]:
+    """
+    Строки сегмента журнала
+
+    Последняя строка текущего сегмента может быть дописана не полностью, поэтому
+    обрыв сжатого потока и неполная последняя строка не считаются ошибкой.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        try:
+            for line in f:
+                if line.endswith(b"\n"):
+                    yield line
+        except EOFError:
+            logger.warning(f"Сегмент журнала {path} оборван, прочитано до места обрыва")
+
+
+class QueryLog:
+    """
+    Неблокирующая запись событий запросов в локальный журнал
+
+    Фоновый поток запускается при первом событии (повторно - в дочернем процессе
+    после fork). При переполнении очереди события отбрасываются, а не задерживают
+    ответ.
+    """
+
+    def __init__(self, directory: str = QUERY_LOG_DIR, max_queue_size: int = QUERY_LOG_QUEUE_SIZE,
+                 flush_interval: float = QUERY_LOG_FLUSH_INTERVAL_SECONDS,
+                 max_segment_mb: float = QUERY_LOG_MAX_SEGMENT_MB, rotate_seconds: float = QUERY_LOG_ROTATE_SECONDS,
+                 max_files: int = QUERY_LOG_MAX_FILES):
+        self._directory = directory
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max(1, max_queue_size))
+        self._flush_interval = max(0.01, flush_interval)
+        self._max_segment_bytes = max(1, int(max_segment_mb * 1024 * 1024))
+        self._rotate_seconds = max(1.0, rotate_seconds)
+        self._max_files = max(0, max_files)
+
+        self._file = None
+        self._path: Optional[str] = None
+        self._opened = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+        self._stats_lock = threading.Lock()
+        self._counters = {"emitted": 0, "written": 0, "dropped": 0, "segments": 0, "write_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._directory)
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self._counters[name] += value
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        """Постановка события в очередь без ожидания диска"""
+        if not self.enabled:
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+            self._count("emitted")
+        except queue.Full:
+            self._count("dropped")
+
+    def _ensure_started(self) -> None:
+        """Запуск фонового потока (повторно - в дочернем процессе после fork)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # Открытый родителем сегмент принадлежит родителю
+            self._pid = os.getpid()
+            self._file = None
+            self._path = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        """Цикл фонового потока: запись накопленных событий и ротация сегментов"""
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            self._compress_orphaned()
+        except OSError as e:
+            logger.error(f"Ошибка при подготовке каталога журнала запросов {self._directory}: {str(e)}")
+        while not self._stop.is_set():
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            self._flush()
+        self._flush()
+        self._close_segment()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _flush(self) -> None:
+        """Запись всех накопленных событий в текущий сегмент одной операцией"""
+        events = self._drain()
+        try:
+            if self._file is not None and (
+                self._file.tell() >= self._max_segment_bytes or time.time() - self._opened >= self._rotate_seconds
+            ):
+                self._close_segment()
+            if not events:
+                return
+            if self._file is None:
+                self._open_segment()
+            self._file.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events).encode("utf-8"))
+            self._file.flush()
+            self._count("written", len(events))
+        except OSError as e:
+            logger.error(f"Ошибка при записи журнала запросов: {str(e)}")
+            self._count("write_errors")
+            self._count("dropped", len(events))
+
+    def _open_segment(self) -> None:
+        self._opened = time.time()
+        # Микросекунды в имени: при частой ротации сегменты одного процесса не совпадают по имени
+        started = time.strftime('%Y%m%dT%H%M%S', time.gmtime(self._opened)) + f"{self._opened % 1:.6f}"[1:]
+        name = f"{SEGMENT_PREFIX}{started}-{os.getpid()}.jsonl"
+        self._path = os.path.join(self._directory, name)
+        self._file = open(self._path, "ab")
+
+    def _close_segment(self) -> None:
+        """Закрытие текущего сегмента, его сжатие и удаление старых сегментов"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file, path = None, self._path
+        try:
+            self._compress(path)
+            self._count("segments")
+            self._enforce_retention()
+        except OSError as e:
+            logger.error(f"Ошибка при сжатии сегмента журнала {path}: {str(e)}")
+            self._count("write_errors")
+
+    @staticmethod
+    def _compress(path: str) -> None:
+        with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        os.remove(path)
+
+    def _compress_orphaned(self) -> None:
+        """Сжатие несжатых сегментов завершившихся процессов (например, после аварийной остановки)"""
+        for path in glob.glob(os.path.join(self._directory, SEGMENT_PREFIX + "*.jsonl")):
+            try:
+                pid = int(os.path.basename(path)[:-len(".jsonl")].rsplit("-", 1)[1])
+            except (IndexError, ValueError):
+                continue
+            if pid != os.getpid() and process_alive(pid):
+                continue
+            try:
+                self._compress(path)
+            except OSError as e:
+                logger.warning(f"Не удалось сжать сегмент журнала {path}: {str(e)}")
+
+    def _enforce_retention(self) -> None:
+        if not self._max_files:
+            return
+        compressed = sorted(glob.glob(os.path.join(self._directory, SEGMENT_PREFIX + "*.jsonl.gz")), key=os.path.basename)
+        for path in compressed[:-self._max_files]:
+            os.remove(path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики записанных и отброшенных событий и закрытых сегментов"""
+        with self._stats_lock:
+            stats: Dict[str, Any] = dict(self._counters)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["segment"] = self._path if self._file is not None else None
+        return stats
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Остановка фонового потока с записью оставшихся событий и сжатием сегмента"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+
+def process_alive(pid: int) -> bool:
+    """Процесс с данным pid еще работает (его файлы нельзя забирать)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,305 @@
+"""
+Устойчивый слой запросов к сетевому векторному индексу
+
+Каждый запрос к Pinecone ограничен дедлайном. Если ответ не пришел за время,
+близкое к p95 последних запросов (или первый запрос завершился ошибкой), параллельно
+отправляется второй (hedged) запрос и используется первый успешный ответ. Серия
+неудачных запросов открывает автомат (circuit breaker): пока он открыт, запросы
+к индексу не отправляются и сразу используется деградированный путь (резервный
+локальный или лексический индекс), что ограничивает задержку при сбоях Pinecone.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, FIRST_COMPLETED, Future, wait
+from typing import Any, Dict, List, Optional, Set
+
+from .config import (
+    VECTOR_QUERY_TIMEOUT_MS, VECTOR_HEDGE_ENABLED, VECTOR_HEDGE_QUANTILE, VECTOR_HEDGE_DELAY_MS,
+    VECTOR_HEDGE_MIN_SAMPLES, CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_RESET_SECONDS
+)
+from .metrics import CIRCUIT_BREAKER_STATE, VECTOR_HEDGED_REQUESTS, VECTOR_QUERY_FAILURES
+from .vector_backends import VectorIndexBackend
+
+logger = logging.getLogger(__name__)
+
+
+class SearchUnavailableError(Exception):
+    """Поиск невозможен: основной индекс недоступен и деградированного пути нет"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(SearchUnavailableError):
+    """Автомат открыт: запросы к индексу временно не отправляются"""
+
+
+class CircuitBreaker:
+    """
+    Автомат отключения индекса после серии ошибок
+
+    closed - запросы идут как обычно; после failure_threshold ошибок подряд
+    автомат открывается на reset_seconds (open), затем пропускает один пробный
+    запрос (half_open): успех закрывает автомат, ошибка снова открывает.
+    """
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_BREAKER_FAILURES,
+                 reset_seconds: float = CIRCUIT_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = "closed"
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        CIRCUIT_BREAKER_STATE.labels(name).set(0)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def retry_after(self) -> float:
+        """Сколько секунд осталось до пробного запроса"""
+        with self._lock:
+            if self._state != "open":
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас"""
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._set_state("half_open")
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self._state != "closed":
+                logger.info(f"Автомат {self.name} закрыт, индекс снова доступен")
+                self._set_state("closed")
+
+    def release(self) -> None:
+        """Пробный запрос отменен без результата - следующий запрос снова может быть пробным"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == "half_open" or (self._state == "closed" and self._failures >= self.failure_threshold):
+                logger.warning(f"Автомат {self.name} открыт на {self.reset_seconds} с после {self._failures} ошибок подряд")
+                self._opened_at = time.monotonic()
+                self._set_state("open")
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        CIRCUIT_BREAKER_STATE.labels(self.name).set(self.STATES[state])
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self._state, "consecutive_failures": self._failures}
+
+
+class LatencyTracker:
+    """Скользящее окно длительностей успешных запросов для расчета задержки hedging"""
+
+    def __init__(self, window: int = 512):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, VECTOR_HEDGE_MIN_SAMPLES):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class ResilientBackend(VectorIndexBackend):
+    """
+    Обертка сетевого бэкенда с дедлайнами, hedged-запросами и автоматом отключения
+
+    Загрузка данных (upsert/delete) передается бэкенду как есть: ошибки загрузки
+    должны быть видны сразу, а не маскироваться деградированным ответом.
+    """
+
+    def __init__(self, backend: VectorIndexBackend, io_executor: Executor,
+                 timeout_ms: float = VECTOR_QUERY_TIMEOUT_MS, hedge: bool = VECTOR_HEDGE_ENABLED):
+        self.backend = backend
+        self.name = backend.name
+        self.upsert_batch_size = backend.upsert_batch_size
+        self.is_local = backend.is_local
+        self._io_executor = io_executor
+        self.timeout = timeout_ms / 1000 if timeout_ms > 0 else None
+        self.hedge = hedge
+        self.breaker = CircuitBreaker(backend.name)
+        self.latency = LatencyTracker()
+
+    def start(self, dimension: int) -> bool:
+        return self.backend.start(dimension)
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str) -> None:
+        self.backend.upsert(vectors, namespace)
+
+    def delete(self, ids: List[str], namespace: str) -> None:
+        self.backend.delete(ids, namespace)
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+
+    def before_fork(self) -> None:
+        self.backend.before_fork()
+
+    def after_fork(self) -> None:
+        self.backend.after_fork()
+
+    def refresh(self) -> None:
+        self.backend.refresh()
+
+    def list_ids(self, namespace: str) -> Optional[List[str]]:
+        return self.backend.list_ids(namespace)
+
+    def fetch_metadata(self, ids: List[str], namespace: str) -> Dict[str, Dict[str, Any]]:
+        return self.backend.fetch_metadata(ids, namespace)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Задержка перед вторым запросом: p95 последних ответов (до накопления статистики - VECTOR_HEDGE_DELAY_MS)"""
+        if not self.hedge:
+            return None
+        delay = self.latency.quantile(VECTOR_HEDGE_QUANTILE)
+        if delay is None:
+            delay = VECTOR_HEDGE_DELAY_MS / 1000
+        if self.timeout is not None and delay >= self.timeout:
+            return None
+        return delay
+
+    def _check_breaker(self) -> None:
+        if not self.breaker.allow():
+            VECTOR_QUERY_FAILURES.labels(self.name, "circuit_open").inc()
+            raise CircuitOpenError(f"Автомат {self.name} открыт", self.breaker.retry_after())
+
+    def _record(self, started: float, error: Optional[Exception]) -> None:
+        if error is None:
+            self.latency.observe(time.perf_counter() - started)
+            self.breaker.record_success()
+        else:
+            reason = "timeout" if isinstance(error, TimeoutError) else "error"
+            VECTOR_QUERY_FAILURES.labels(self.name, reason).inc()
+            self.breaker.record_failure()
+
+    def query(self, vector: Any, top_k: int, namespace: str) -> List[Dict[str, Any]]:
+        """Синхронный запрос с дедлайном и hedging через пул потоков ввода-вывода"""
+        self._check_breaker()
+        started = time.perf_counter()
+        try:
+            results = self._hedged_call(vector, top_k, namespace, started)
+        except Exception as e:
+            self._record(started, e)
+            raise
+        self._record(started, None)
+        return results
+
+    def _hedged_call(self, vector: Any, top_k: int, namespace: str, started: float) -> List[Dict[str, Any]]:
+        delay = self.hedge_delay()
+        pending = {self._io_executor.submit(self.backend.query, vector, top_k, namespace)}
+        hedged = delay is None
+        last_error: Optional[BaseException] = None
+        while pending:
+            remaining = self._remaining(started)
+            timeout = remaining if hedged else min(delay, remaining) if remaining is not None else delay
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._cancel(pending)
+                    return future.result()
+                last_error = future.exception()
+            if not hedged and (done or self._remaining(started) != 0):
+                # Первый запрос завис дольше p95 или завершился ошибкой - отправляем второй
+                hedged = True
+                VECTOR_HEDGED_REQUESTS.labels(self.name).inc()
+                pending.add(self._io_executor.submit(self.backend.query, vector, top_k, namespace))
+            elif not done:
+                self._cancel(pending)
+                raise TimeoutError(f"Дедлайн {self.timeout * 1000:.0f} мс запроса к {self.name} истек")
+        raise last_error
+
+    async def aquery(self, vector: Any, top_k: int, namespace: str) -> List[Dict[str, Any]]:
+        """Асинхронный запрос с дедлайном и hedging"""
+        self._check_breaker()
+        started = time.perf_counter()
+        try:
+            results = await self._ahedged_call(vector, top_k, namespace, started)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            self._record(started, e)
+            raise
+        self._record(started, None)
+        return results
+
+    async def _ahedged_call(self, vector: Any, top_k: int, namespace: str, started: float) -> List[Dict[str, Any]]:
+        delay = self.hedge_delay()
+        pending = {asyncio.ensure_future(self.backend.aquery(vector, top_k, namespace))}
+        hedged = delay is None
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                remaining = self._remaining(started)
+                timeout = remaining if hedged else min(delay, remaining) if remaining is not None else delay
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                if not hedged and (done or self._remaining(started) != 0):
+                    hedged = True
+                    VECTOR_HEDGED_REQUESTS.labels(self.name).inc()
+                    pending.add(asyncio.ensure_future(self.backend.aquery(vector, top_k, namespace)))
+                elif not done:
+                    raise TimeoutError(f"Дедлайн {self.timeout * 1000:.0f} мс запроса к {self.name} истек")
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _remaining(self, started: float) -> Optional[float]:
+        if self.timeout is None:
+            return None
+        return max(0.0, self.timeout - (time.perf_counter() - started))
+
+    @staticmethod
+    def _cancel(futures: Set[Future]) -> None:
+        for future in futures:
+            future.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.quantile(0.95)
+        return {
+            "backend": self.name,
+            "circuit": self.breaker.snapshot(),
+            "timeout_ms": self.timeout * 1000 if self.timeout is not None else None,
+            "hedge_delay_ms": (self.hedge_delay() or 0.0) * 1000 if self.hedge else None,
+            "latency_p95_ms": p95 * 1000 if p95 is not None else None,
+        }
@@ -2,13 +2,30 @@
 Модели данных (схемы) для запросов и ответов чат-бота
 """
 
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
+from .config import BATCH_MAX_TOP_K
+
+# Имя пространства имен (игры): используется в именах файлов локального индекса и ключах кэша.
+# Проверяется в VectorDatabase.resolve_namespace, а не в схеме: в пакетном запросе
+# некорректное имя - ошибка одного запроса, а не всей пачки
+NAMESPACE_PATTERN = r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$"
+
 
 class UserQuery(BaseModel):
     """Модель для запроса пользователя"""
     query: str = Field(..., description="Текстовый запрос пользователя")
+    namespace: Optional[str] = Field(
+        None, description="Игра (пространство имен индекса); по умолчанию PINECONE_NAMESPACE"
+    )
+
+
+class BugMatch(BaseModel):
+    """Модель для найденного бага в списке кандидатов"""
+    id: str = Field(..., description="Идентификатор бага")
+    score: float = Field(..., description="Косинусная близость запроса и бага")
+    title: Optional[str] = Field(None, description="Название бага")
 
 
 class BotResponse(BaseModel):
@@ -17,6 +34,12 @@ class BotResponse(BaseModel):
     confidence: float = Field(..., description="Уровень уверенности бота в ответе от 0 до 1")
     bug_title: Optional[str] = Field(None, description="Название бага, если найден")
     bug_description: Optional[str] = Field(None, description="Полное описание найденного бага")
+    matches: Optional[List[BugMatch]] = Field(None, description="Кандидаты top_k для пакетного поиска")
+    status: str = Field(
+        "ok", description="ok - обычный ответ; degraded - ответ резервного индекса (local, lexical) при недоступности основного"
+    )
+    degraded_source: Optional[str] = Field(None, description="Источник деградированного ответа: local или lexical")
+    namespace: Optional[str] = Field(None, description="Игра (пространство имен), в которой выполнялся поиск")
     
     class Config:
         schema_extra = {
@@ -24,6 +47,53 @@ class BotResponse(BaseModel):
                 "response": "При загрузке уровня в многопользовательском режиме клиент зависает...",
                 "confidence": 0.85,
                 "bug_title": "Ошибка при загрузке уровня в многопользовательском режиме",
-                "bug_description": "При загрузке уровня в многопользовательском режиме клиент зависает..."
+                "bug_description": "При загрузке уровня в многопользовательском режиме клиент зависает...",
+                "status": "ok"
             }
-        } 
\ No newline at end of file
+        }
+
+
+class BatchQuery(BaseModel):
+    """Модель для пакетного запроса"""
+    queries: List[UserQuery] = Field(..., description="Список запросов пользователей")
+    top_k: int = Field(1, ge=1, le=BATCH_MAX_TOP_K, description="Количество кандидатов для каждого запроса")
+
+
+class BatchQueryError(BaseModel):
+    """Модель для ошибки обработки одного запроса из пачки"""
+    index: int = Field(..., description="Позиция запроса в пачке")
+    detail: str = Field(..., description="Описание ошибки")
+
+
+class BatchResponse(BaseModel):
+    """Модель для ответа на пакетный запрос"""
+    results: List[Optional[BotResponse]] = Field(..., description="Ответы в порядке запросов (null для неудачных)")
+    errors: List[BatchQueryError] = Field(default_factory=list, description="Ошибки отдельных запросов")
+
+
+class DuplicatePair(BaseModel):
+    """Модель для пары похожих багов"""
+    id_a: str = Field(..., description="Идентификатор первого бага")
+    id_b: str = Field(..., description="Идентификатор второго бага")
+    score: float = Field(..., description="Косинусная близость эмбеддингов")
+    title_a: Optional[str] = Field(None, description="Название первого бага")
+    title_b: Optional[str] = Field(None, description="Название второго бага")
+
+
+class DuplicateGroup(BaseModel):
+    """Модель для группы багов, связанных попарной близостью"""
+    ids: List[str] = Field(..., description="Идентификаторы багов группы")
+    max_score: float = Field(..., description="Наибольшая близость пары в группе")
+
+
+class DuplicatesResponse(BaseModel):
+    """Модель для отчета о дубликатах"""
+    namespace: str = Field(..., description="Игра (пространство имен)")
+    threshold: float = Field(..., description="Порог косинусной близости")
+    source: str = Field(..., description="Источник эмбеддингов: локальный индекс или повторная векторизация (encoded)")
+    bugs: int = Field(..., description="Число проверенных багов")
+    pair_count: int = Field(..., description="Число найденных пар")
+    group_count: int = Field(..., description="Число групп дубликатов")
+    pairs: List[DuplicatePair] = Field(default_factory=list, description="Пары по убыванию близости (не больше limit)")
+    groups: List[DuplicateGroup] = Field(default_factory=list, description="Группы по убыванию размера (не больше limit)")
+    seconds: float = Field(..., description="Длительность поиска")
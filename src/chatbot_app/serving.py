@@ -0,0 +1,137 @@
+"""
+Запуск HTTP сервера в нескольких процессах с общей памятью модели и индекса
+
+Родительский процесс один раз загружает модель, подключается к индексу (создает
+его и загружает начальные данные, если нужно) и только после этого порождает
+воркеров через fork. Веса модели и матрицы локального индекса остаются общими
+страницами памяти (copy-on-write), матрицы дополнительно отображаются из файлов
+через mmap. Воркеры принимают соединения с общего сокета, каждый использует
+свою долю ядер для инференса. Упавший воркер перезапускается.
+
+Метрики воркеров объединяются multiprocess режимом prometheus_client через файлы
+каталога PROMETHEUS_MULTIPROC_DIR (см. metrics.py), поэтому /metrics отдает
+одинаковые суммы, какой бы воркер ни принял запрос.
+"""
+
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+import uvicorn
+
+from . import main as app_module
+from .config import SERVER_HOST, SERVER_PORT, SERVER_WORKERS, WORKER_THREADS, STARTUP_WARMUP
+from .inference import worker_threads
+from .metrics import COMPONENT_STATS, mark_process_dead
+
+logger = logging.getLogger(__name__)
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, number: int, threads: int) -> None:
+    """Тело воркера после fork: восстановление состояния, прогрев и обслуживание запросов"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    db = app_module.vector_db
+    db.after_fork(threads)
+    COMPONENT_STATS.start()
+    if STARTUP_WARMUP:
+        with app_module.startup_state.track(f"warmup_worker_{number}"):
+            db.warm_up()
+        app_module.startup_state.mark_ready()
+    config = uvicorn.Config(app_module.app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, number: int, threads: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, number, threads)
+        except BaseException as e:
+            logger.error(f"Воркер {number} завершился с ошибкой: {str(e)}")
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info(f"Запущен воркер {number} (pid {pid})")
+    return pid
+
+
+def serve(host: str = SERVER_HOST, port: int = SERVER_PORT, workers: int = SERVER_WORKERS) -> None:
+    """
+    Предзагрузка модели и индекса в родителе и запуск воркеров через fork
+
+    Args:
+        host: Адрес для прослушивания
+        port: Порт
+        workers: Число процессов-воркеров
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("Режим нескольких воркеров требует os.fork (Linux/macOS)")
+
+    # Индекс создается и заполняется только здесь; прогрев выполняет каждый воркер
+    app_module.initialize_service(warmup=False)
+    if app_module.vector_db is None:
+        logger.error(f"Инициализация не удалась: {app_module.startup_state.error}")
+        sys.exit(1)
+    app_module.vector_db.before_fork()
+    # Объекты, созданные при загрузке, исключаются из сборки мусора, чтобы GC
+    # не трогал их заголовки и не копировал общие страницы в воркерах
+    gc.collect()
+    gc.freeze()
+
+    # Статистика родителя (загрузка данных до fork) учитывается один раз - в его файлах метрик
+    COMPONENT_STATS.refresh()
+    # Родитель не обслуживает запросы, поэтому его gauge не выдаются
+    mark_process_dead(os.getpid())
+
+    sock = _bind_socket(host, port)
+    threads = worker_threads(workers, WORKER_THREADS)
+    logger.info(f"Запуск {workers} воркеров на {host}:{port}, потоков инференса на воркер: {threads}")
+    children: Dict[int, int] = {_spawn(sock, number, threads): number for number in range(workers)}
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        number = children.pop(pid, None)
+        if number is None:
+            continue
+        mark_process_dead(pid)
+        if not stopping:
+            logger.warning(f"Воркер {number} (pid {pid}) завершился со статусом {status}, перезапуск")
+            time.sleep(1)
+            children[_spawn(sock, number, threads)] = number
+    sock.close()
+    logger.info("Все воркеры остановлены")
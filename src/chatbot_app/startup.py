@@ -0,0 +1,65 @@
+"""
+Состояние запуска сервиса: фазы инициализации и их длительность
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupState:
+    """Текущая фаза запуска (starting -> <фаза> -> ready/failed) и длительности фаз"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.phase = "starting"
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.phase == "ready"
+
+    @property
+    def failed(self) -> bool:
+        return self.phase == "failed"
+
+    @contextmanager
+    def track(self, phase: str) -> Iterator[None]:
+        """Замер длительности фазы запуска"""
+        with self._lock:
+            self.phase = phase
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.timings[phase] = elapsed
+            logger.info(f"Фаза запуска '{phase}' заняла {elapsed:.2f} с")
+
+    def mark_ready(self) -> None:
+        with self._lock:
+            self.phase = "ready"
+            self.timings["total"] = time.perf_counter() - self._started
+        logger.info(f"Сервис готов к работе за {self.timings['total']:.2f} с")
+
+    def mark_failed(self, error: str) -> None:
+        with self._lock:
+            self.phase = "failed"
+            self.error = error
+            self.timings["total"] = time.perf_counter() - self._started
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "phase": self.phase,
+                "error": self.error,
+                "timings": dict(self.timings),
+                "uptime": time.perf_counter() - self._started,
+            }
@@ -0,0 +1,233 @@
+"""
+Фоновая отправка телеметрии (запросы и ошибки) в n8n пачками
+"""
+
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from .config import (
+    TELEMETRY_QUEUE_SIZE, TELEMETRY_BATCH_SIZE, TELEMETRY_FLUSH_INTERVAL_SECONDS, TELEMETRY_MAX_RETRIES,
+    TELEMETRY_RETRY_BACKOFF_SECONDS, TELEMETRY_TIMEOUT_SECONDS, TELEMETRY_OVERFLOW_POLICY, TELEMETRY_SPILL_PATH
+)
+from .metrics import stage
+from .query_log import process_alive
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetrySink:
+    """
+    Неблокирующий приемник событий телеметрии
+
+    События складываются в ограниченную очередь в памяти; фоновый поток раз в
+    TELEMETRY_FLUSH_INTERVAL_SECONDS (или при накоплении TELEMETRY_BATCH_SIZE
+    событий) отправляет их одним POST {"events": [...]} через keep-alive сессию
+    с повторами и экспоненциальной задержкой. При переполнении очереди или
+    неудачной отправке события отбрасываются (policy="drop") или дописываются
+    в файл (policy="spill") и переотправляются после восстановления n8n.
+
+    Файл сохраненных событий у каждого процесса свой (к имени добавляется pid), поэтому
+    воркеры не перезаписывают события друг друга; файлы завершившихся процессов
+    переотправляет первый воркер, которому удалось их забрать.
+    """
+
+    def __init__(self, url: Optional[str], max_queue_size: int = TELEMETRY_QUEUE_SIZE,
+                 batch_size: int = TELEMETRY_BATCH_SIZE, flush_interval: float = TELEMETRY_FLUSH_INTERVAL_SECONDS,
+                 overflow_policy: str = TELEMETRY_OVERFLOW_POLICY, spill_path: str = TELEMETRY_SPILL_PATH):
+        self._url = url
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max(1, max_queue_size))
+        self._batch_size = max(1, batch_size)
+        self._flush_interval = max(0.01, flush_interval)
+        self._overflow_policy = overflow_policy
+        self._spill_path = spill_path
+        self._spill_lock = threading.Lock()
+
+        self._session: Optional[requests.Session] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+        self._stats_lock = threading.Lock()
+        self._counters = {"emitted": 0, "sent": 0, "dropped": 0, "spilled": 0, "failed_batches": 0}
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self._counters[name] += value
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        """Постановка события в очередь без ожидания сети"""
+        if not self._url:
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+            self._count("emitted")
+        except queue.Full:
+            self._overflow([event])
+        if self._queue.qsize() >= self._batch_size:
+            self._wakeup.set()
+
+    def _ensure_started(self) -> None:
+        """Запуск фонового потока (повторно - в дочернем процессе после fork)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._session = requests.Session()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="telemetry-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        """Цикл фонового потока: сбор пачек и отправка"""
+        while not self._stop.is_set():
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            self._safe_flush()
+        self._safe_flush()
+
+    def _safe_flush(self) -> None:
+        # Непредвиденная ошибка не должна останавливать поток: телеметрия прекратилась бы молча
+        try:
+            self._flush()
+        except Exception as e:
+            logger.error(f"Ошибка в потоке отправки телеметрии: {str(e)}")
+
+    def _flush(self) -> None:
+        """Отправка всех накопленных событий пачками по batch_size"""
+        while True:
+            batch = self._drain()
+            if not batch:
+                return
+            if self._send(batch):
+                self._replay_spill()
+            else:
+                self._overflow(batch)
+                return
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, batch: List[Dict[str, Any]]) -> bool:
+        """Отправка пачки событий с повторами и экспоненциальной задержкой"""
+        delay = TELEMETRY_RETRY_BACKOFF_SECONDS
+        for attempt in range(TELEMETRY_MAX_RETRIES + 1):
+            try:
+                with stage("telemetry_send"):
+                    response = self._session.post(self._url, json={"events": batch}, timeout=TELEMETRY_TIMEOUT_SECONDS)
+                if response.status_code == 200:
+                    self._count("sent", len(batch))
+                    logger.debug(f"Отправлено {len(batch)} событий в n8n")
+                    return True
+                logger.warning(f"n8n вернул статус {response.status_code}: {response.text}")
+            except requests.exceptions.RequestException as req_e:
+                logger.warning(f"Ошибка при отправке телеметрии в n8n (попытка {attempt + 1}): {str(req_e)}")
+            if attempt < TELEMETRY_MAX_RETRIES and not self._stop.wait(delay):
+                delay *= 2
+        self._count("failed_batches")
+        return False
+
+    def _overflow(self, events: List[Dict[str, Any]]) -> None:
+        """Обработка событий, которые не удалось поставить в очередь или отправить"""
+        if self._overflow_policy == "spill" and self._spill_path:
+            try:
+                with self._spill_lock, open(self._own_spill_path(), "a", encoding="utf-8") as f:
+                    for event in events:
+                        f.write(json.dumps(event, ensure_ascii=False) + "\n")
+                self._count("spilled", len(events))
+                return
+            except OSError as e:
+                logger.error(f"Ошибка при сохранении телеметрии на диск: {str(e)}")
+        self._count("dropped", len(events))
+
+    def _own_spill_path(self) -> str:
+        root, ext = os.path.splitext(self._spill_path)
+        return f"{root}-{os.getpid()}{ext}"
+
+    def _orphaned_spill_paths(self) -> List[str]:
+        """Файлы событий завершившихся процессов (и общий файл прежних версий без pid)"""
+        root, ext = os.path.splitext(self._spill_path)
+        paths = [self._spill_path]
+        for path in glob.glob(f"{glob.escape(root)}-*{ext}") + glob.glob(f"{glob.escape(root)}-*{ext}.replay"):
+            name = path[len(root) + 1:]
+            try:
+                pid = int(name[:name.index(ext)] if ext else name.split(".", 1)[0])
+            except ValueError:
+                continue
+            if pid != os.getpid() and not process_alive(pid):
+                paths.append(path)
+        return paths
+
+    def _replay_spill(self) -> None:
+        """Повторная отправка событий, сохраненных на диск, после успешной отправки"""
+        if self._overflow_policy != "spill" or not self._spill_path:
+            return
+        own = self._own_spill_path()
+        replay_path = own + ".replay"
+        # Свой .replay остается, если прошлая переотправка прервалась ошибкой
+        for path in [replay_path, own] + self._orphaned_spill_paths():
+            # Файл забирается атомарным переименованием: другой воркер его уже не получит
+            with self._spill_lock:
+                try:
+                    os.replace(path, replay_path)
+                except FileNotFoundError:
+                    continue
+            events = self._read_spill(replay_path)
+            os.remove(replay_path)
+            logger.info(f"Повторная отправка {len(events)} сохраненных событий телеметрии")
+            for start in range(0, len(events), self._batch_size):
+                batch = events[start:start + self._batch_size]
+                if not self._send(batch):
+                    self._overflow(events[start:])
+                    return
+
+    @staticmethod
+    def _read_spill(path: str) -> List[Dict[str, Any]]:
+        """События из файла; оборванные при аварийной остановке строки пропускаются"""
+        events, skipped = [], 0
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    skipped += 1
+        if skipped:
+            logger.warning(f"Пропущено {skipped} поврежденных строк сохраненной телеметрии в {path}")
+        return events
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики отправленных, отброшенных и сохраненных на диск событий"""
+        with self._stats_lock:
+            stats: Dict[str, Any] = dict(self._counters)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Остановка фонового потока с отправкой оставшихся событий"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+        if self._session is not None:
+            self._session.close()
@@ -3,10 +3,11 @@
 """
 
 import streamlit as st
+import json
 import logging
 import requests
 import os
-from typing import Union, Dict, Any
+from typing import Union, Dict, Any, Iterator, Tuple
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -14,6 +15,10 @@ logger = logging.getLogger(__name__)
 
 # URL API сервиса (берем из переменной окружения или используем значение по умолчанию, но учитываем хост при запуске в  docker compose)
 API_URL = os.environ.get("CHATBOT_API_URL", "http://chatbot:8000")
+# Как часто проверять доступность API (секунды); между проверками используется последний результат
+HEALTH_CHECK_INTERVAL_SECONDS = int(os.environ.get("HEALTH_CHECK_INTERVAL_SECONDS", 15))
+# Игры для выбора в сайдбаре (через запятую); пусто - поиск в игре по умолчанию
+GAME_NAMESPACES = [name.strip() for name in os.environ.get("GAME_NAMESPACES", "").split(",") if name.strip()]
 
 # Настройка страницы
 st.set_page_config(
@@ -26,13 +31,21 @@ st.set_page_config(
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
+# Одна HTTP сессия с пулом keep-alive соединений на все сессии и перезапуски скрипта
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 # Функция для отправки запроса к API
-def query_api(query_text: str) -> Union[Dict[str, Any], None]:
+def query_api(query_text: str, namespace: Union[str, None] = None) -> Union[Dict[str, Any], None]:
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{API_URL}/query",
-            json={"query": query_text},
-            headers={"Content-Type": "application/json"},
+            json={"query": query_text, "namespace": namespace},
             timeout=10
         )
         response.raise_for_status()
@@ -41,10 +54,33 @@ def query_api(query_text: str) -> Union[Dict[str, Any], None]:
         logger.error(f"Ошибка при отправке запроса к API: {str(e)}")
         return None
 
-# Функция для проверки работоспособности API
+# Потоковый запрос к API: события (тип, данные) по мере их поступления
+def stream_query_api(query_text: str, namespace: Union[str, None] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    with get_http_session().post(
+        f"{API_URL}/query/stream",
+        json={"query": query_text, "namespace": namespace},
+        headers={"Accept": "text/event-stream"},
+        stream=True,
+        timeout=10
+    ) as response:
+        response.raise_for_status()
+        event, data = "message", []
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                field, _, value = line.partition(":")
+                if field == "event":
+                    event = value.strip()
+                elif field == "data":
+                    data.append(value.strip())
+            elif data:
+                yield event, json.loads("\n".join(data))
+                event, data = "message", []
+
+# Функция для проверки работоспособности API (не чаще раза в HEALTH_CHECK_INTERVAL_SECONDS)
+@st.cache_data(ttl=HEALTH_CHECK_INTERVAL_SECONDS, show_spinner=False)
 def check_api_health() -> bool:
     try:
-        response = requests.get(f"{API_URL}/health", timeout=5)
+        response = get_http_session().get(f"{API_URL}/health", timeout=5)
         if response.status_code == 200:
             health_data = response.json()
             return health_data.get("status") == "ok"
@@ -52,7 +88,54 @@ def check_api_health() -> bool:
     except requests.exceptions.RequestException:
         return False
 
-# Проверка доступности API 
+# Отображение ответа бота
+def render_bug_title(bug_title: str) -> None:
+    st.markdown(f"""
+    <div style="background-color: #FFF4E3; color: #FF5500; padding: 8px; border-radius: 5px; border-left: 3px solid #FF5500; margin-top: 5px;">
+    <strong>Баг:</strong> {bug_title}
+    </div>
+    """, unsafe_allow_html=True)
+
+# Получение ответа с отображением по мере поступления событий потока
+def answer_streaming(query_text: str, namespace: Union[str, None] = None) -> Dict[str, Any]:
+    status = st.empty()
+    answer = st.empty()
+    title = st.empty()
+    status.caption("Поиск ответа...")
+    try:
+        for event, data in stream_query_api(query_text, namespace):
+            if event == "match":
+                if data.get("bug_title"):
+                    with title.container():
+                        render_bug_title(data["bug_title"])
+                caption = f"Уверенность: {data.get('confidence', 0.0):.2f}"
+                if data.get("status") == "degraded":
+                    caption += " (основной индекс недоступен, ответ из резервного)"
+                status.caption(caption)
+            elif event == "answer":
+                answer.write(data.get("response", "Не знаю"))
+            elif event == "done":
+                return data
+            elif event == "error":
+                logger.error(f"Ошибка API при потоковом ответе: {data.get('detail')}")
+                break
+    except (requests.exceptions.RequestException, ValueError) as e:
+        response = getattr(e, "response", None)
+        # Сервис перегружен или запускается: повторный запрос только добавит нагрузки
+        if response is not None and response.status_code == 503:
+            retry_after = response.headers.get("Retry-After", "несколько")
+            logger.warning(f"API перегружен, повтор через {retry_after} с")
+            status.empty()
+            return {"response": f"Сервис перегружен, повторите запрос через {retry_after} с", "bug_title": None, "confidence": 0.0}
+        logger.error(f"Ошибка потокового запроса к API: {str(e)}")
+        # Старая версия API без /query/stream или обрыв потока: обычный запрос
+        result = query_api(query_text, namespace)
+        if result:
+            return result
+    status.empty()
+    return {}
+
+# Проверка доступности API (результат кэшируется на HEALTH_CHECK_INTERVAL_SECONDS)
 api_is_alive = check_api_health()
 
 # Заголовок приложения
@@ -66,11 +149,17 @@ with st.sidebar:
 
     Введите ваш запрос в поле внизу, и бот найдет наиболее подходящий ответ на основе векторного поиска.
     """)
+
+    # Выбор игры: поиск выполняется только по багам выбранной игры
+    game = st.selectbox("Игра", GAME_NAMESPACES) if GAME_NAMESPACES else None
     
     if api_is_alive:
         st.success("API работает", icon="✅")
     else:
         st.error("API недоступен", icon="⚠️")
+        if st.button("🔄 Проверить снова"):
+            check_api_health.clear()
+            st.rerun()
 
     # Кнопка очистки истории чата
     if st.button("🧹 Очистить чат"):
@@ -86,19 +175,16 @@ if api_is_alive:
             with st.chat_message("assistant"):
                 st.write(message["content"])
                 if "bug_title" in message and message["bug_title"]:
-                    st.markdown(f"""
-                    <div style="background-color: #FFF4E3; color: #FF5500; padding: 8px; border-radius: 5px; border-left: 3px solid #FF5500; margin-top: 5px;">
-                    <strong>Баг:</strong> {message["bug_title"]}
-                    </div>
-                    """, unsafe_allow_html=True)
+                    render_bug_title(message["bug_title"])
 
     if prompt := st.chat_input("Введите ваш запрос о багах в игре..."):
         st.session_state.chat_history.append({"role": "user", "content": prompt})
-        
-        with st.spinner("Поиск ответа..."):
+        st.chat_message("user").write(prompt)
+
+        with st.chat_message("assistant"):
             logger.info(f"Получен запрос: {prompt}")
             try:
-                result = query_api(prompt)
+                result = answer_streaming(prompt, game)
                 if result:
                     response = {
                         "role": "assistant",
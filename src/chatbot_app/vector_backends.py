@@ -0,0 +1,864 @@
+"""
+Бэкенды векторного индекса: Pinecone и локальный индекс в памяти процесса
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import PINECONE_API_KEY, PINECONE_INDEX_NAME, PINECONE_CLOUD, PINECONE_REGION, PINECONE_HOST
+from .config import LOCAL_INDEX_TYPE, IVF_NLIST, IVF_NPROBE, IVF_MIN_TRAIN_SIZE, INGEST_UPSERT_BATCH_SIZE
+from .config import LOCAL_INDEX_RELOAD_SECONDS, PINECONE_POOL_MAXSIZE, DOCSTORE_ENABLED
+from .config import LOCAL_INDEX_QUANTIZATION, QUANTIZATION_RERANK_CANDIDATES, PQ_SUBVECTORS
+from .config import LOCAL_INDEX_MEMORY_BUDGET_MB
+from .metrics import NAMESPACE_EVICTIONS, NAMESPACE_LOADS
+from .quantization import Quantizer, load_quantizer, train_quantizer
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndexBackend:
+    """Базовый интерфейс векторного индекса"""
+
+    name = "base"
+    # Максимальное число записей в одном вызове upsert при потоковой загрузке
+    upsert_batch_size = 100
+    # Локальный бэкенд отвечает без сетевых вызовов и может вызываться прямо из event loop
+    is_local = False
+
+    def start(self, dimension: int) -> bool:
+        """
+        Подключение к индексу (или его создание)
+
+        Args:
+            dimension: Размерность эмбеддингов модели
+
+        Returns:
+            True, если индекс пуст и в него нужно загрузить начальные данные
+        """
+        raise NotImplementedError
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str) -> None:
+        """Добавление или обновление записей вида {"id", "values", "metadata"}"""
+        raise NotImplementedError
+
+    def delete(self, ids: List[str], namespace: str) -> None:
+        """Удаление записей по идентификаторам"""
+        raise NotImplementedError
+
+    def query(self, vector: np.ndarray, top_k: int, namespace: str) -> List[Dict[str, Any]]:
+        """Поиск ближайших записей: список словарей с id, score, title и description"""
+        raise NotImplementedError
+
+    async def aquery(self, vector: np.ndarray, top_k: int, namespace: str) -> List[Dict[str, Any]]:
+        """Асинхронный поиск ближайших записей"""
+        return self.query(vector, top_k, namespace)
+
+    def query_batch(self, vectors: Any, top_k: int, namespace: str) -> List[List[Dict[str, Any]]]:
+        """Поиск ближайших записей для нескольких векторов запросов"""
+        return [self.query(vector, top_k, namespace) for vector in vectors]
+
+    def list_ids(self, namespace: str) -> Optional[List[str]]:
+        """Идентификаторы всех записей пространства имен (None, если бэкенд не умеет их перечислять)"""
+        return None
+
+    def fetch_metadata(self, ids: List[str], namespace: str) -> Dict[str, Dict[str, Any]]:
+        """Метаданные записей по идентификаторам (для восстановления хранилища документов)"""
+        return {}
+
+    async def aclose(self) -> None:
+        """Освобождение ресурсов бэкенда"""
+
+    def before_fork(self) -> None:
+        """Подготовка к fork воркеров в режиме нескольких процессов"""
+
+    def after_fork(self) -> None:
+        """Пересоздание соединений и потоков в дочернем процессе после fork"""
+
+    def refresh(self) -> None:
+        """Подхват изменений индекса, сделанных другими процессами (перед загрузкой данных)"""
+
+
+class PineconeBackend(VectorIndexBackend):
+    """Векторный индекс в Pinecone"""
+
+    name = "pinecone"
+    upsert_batch_size = INGEST_UPSERT_BATCH_SIZE
+
+    def __init__(self, io_executor: Executor, include_metadata: bool = not DOCSTORE_ENABLED):
+        self._io_executor = io_executor
+        # Без метаданных в ответе: тексты багов берутся из локального хранилища документов
+        self.include_metadata = include_metadata
+        self.index = None
+        self._pc = None
+        self._index_host: Optional[str] = None
+        # Асинхронный клиент индекса создается лениво внутри event loop
+        self._async_index = None
+        self._async_index_failed = False
+
+    def start(self, dimension: int) -> bool:
+        """Инициализация подключения к Pinecone"""
+        from pinecone import ServerlessSpec
+
+        pc = self._client()
+        existing_indexes = [index["name"] for index in pc.list_indexes()]
+        created = False
+        if PINECONE_INDEX_NAME not in existing_indexes:
+            logger.info(f"Creating Pinecone index: {PINECONE_INDEX_NAME}")
+            pc.create_index(
+                name=PINECONE_INDEX_NAME,
+                dimension=dimension,
+                metric="cosine",
+                spec=ServerlessSpec(
+                    cloud=PINECONE_CLOUD,
+                    region=PINECONE_REGION
+                )
+            )
+            logger.info(f"Index created.")
+            created = True
+        else:
+            logger.info(f"Pinecone index '{PINECONE_INDEX_NAME}' already exists.")
+        # Инициализируем индекс
+        self._pc = pc
+        self._index_host = pc.describe_index(PINECONE_INDEX_NAME).host
+        self.index = self._open_index()
+        logger.info(f"Успешно подключено к индексу Pinecone: {PINECONE_INDEX_NAME}")
+        return created
+
+    @staticmethod
+    def _client() -> Any:
+        from pinecone import Pinecone
+
+        return Pinecone(api_key=PINECONE_API_KEY, host=PINECONE_HOST) if PINECONE_HOST else Pinecone(api_key=PINECONE_API_KEY)
+
+    def _open_index(self) -> Any:
+        """Клиент индекса с пулом keep-alive соединений на все потоки ввода-вывода"""
+        if self._index_host:
+            return self._pc.Index(host=self._index_host, connection_pool_maxsize=PINECONE_POOL_MAXSIZE)
+        return self._pc.Index(PINECONE_INDEX_NAME, connection_pool_maxsize=PINECONE_POOL_MAXSIZE)
+
+    def after_fork(self) -> None:
+        """Новые HTTP клиенты в воркере: пулы соединений родителя нельзя использовать после fork"""
+        if self._pc is None:
+            return
+        self._pc = self._client()
+        self.index = self._open_index()
+        self._async_index = None
+        self._async_index_failed = False
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str) -> None:
+        # Векторы остаются NumPy массивами до сетевой границы, в списки они переводятся только здесь
+        vectors = [dict(vector, values=_as_list(vector["values"])) for vector in vectors]
+        if not self.include_metadata:
+            # В Pinecone остается только хэш содержимого: описания не упираются в лимит размера метаданных
+            vectors = [
+                dict(vector, metadata={"content_hash": (vector.get("metadata") or {}).get("content_hash")})
+                for vector in vectors
+            ]
+        self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def delete(self, ids: List[str], namespace: str) -> None:
+        self.index.delete(ids=ids, namespace=namespace)
+
+    def list_ids(self, namespace: str) -> Optional[List[str]]:
+        ids: List[str] = []
+        for page in self.index.list(namespace=namespace):
+            ids.extend(page)
+        return ids
+
+    def fetch_metadata(self, ids: List[str], namespace: str) -> Dict[str, Dict[str, Any]]:
+        metadata: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(ids), 100):
+            response = self.index.fetch(ids=ids[start:start + 100], namespace=namespace)
+            for bug_id, vector in response.vectors.items():
+                metadata[bug_id] = dict(vector.metadata or {})
+        return metadata
+
+    def query(self, vector: np.ndarray, top_k: int, namespace: str) -> List[Dict[str, Any]]:
+        results = self.index.query(
+            vector=_as_list(vector),
+            top_k=top_k,
+            include_metadata=self.include_metadata,
+            namespace=namespace
+        )
+        logger.info(f"Получен ответ от Pinecone API")
+        return self._format_matches(results)
+
+    async def aquery(self, vector: np.ndarray, top_k: int, namespace: str) -> List[Dict[str, Any]]:
+        """Запрос к Pinecone без блокировки event loop"""
+        index = self._get_async_index()
+        if index is not None:
+            results = await index.query(
+                vector=_as_list(vector),
+                top_k=top_k,
+                include_metadata=self.include_metadata,
+                namespace=namespace
+            )
+            logger.info(f"Получен ответ от Pinecone API")
+            return self._format_matches(results)
+
+        # Асинхронный клиент недоступен - выполняем синхронный запрос в пуле потоков
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_executor, self.query, vector, top_k, namespace)
+
+    def _get_async_index(self) -> Any:
+        """Ленивое создание асинхронного клиента индекса Pinecone (требует pinecone[asyncio])"""
+        if self._async_index is None and not self._async_index_failed and self._pc is not None and self._index_host:
+            try:
+                self._async_index = self._pc.IndexAsyncio(host=self._index_host)
+            except Exception as e:
+                logger.warning(f"Асинхронный клиент Pinecone недоступен, используется пул потоков: {str(e)}")
+                self._async_index_failed = True
+        return self._async_index
+
+    @staticmethod
+    def _format_matches(results: Any) -> List[Dict[str, Any]]:
+        """Преобразование ответа Pinecone в список багов"""
+        bug_results = []
+        if results and hasattr(results, 'matches') and results.matches:
+            logger.info(f"Количество сматченных объектов: {len(results.matches)}")
+            for match in results.matches:
+                bug_results.append({
+                    "id": match.id,
+                    "score": match.score,
+                    "title": match.metadata.get("title") if match.metadata else None,
+                    "description": match.metadata.get("description") if match.metadata else None
+                })
+        else:
+            logger.warning(f"Pinecone не вернул смчаченных объектов {results}")
+        return bug_results
+
+    async def aclose(self) -> None:
+        if self._async_index is not None:
+            await self._async_index.close()
+            self._async_index = None
+
+
+def _as_list(vector: Any) -> List[float]:
+    """Вектор в виде списка float для JSON API Pinecone"""
+    return vector.tolist() if isinstance(vector, np.ndarray) else list(vector)
+
+
+class IVFIndex:
+    """
+    Приближенный индекс IVF (inverted file) поверх матрицы нормализованных эмбеддингов
+
+    Векторы разбиваются сферическим k-means на nlist кластеров; при поиске точно
+    оцениваются только векторы из nprobe ближайших к запросу кластеров.
+    Экземпляр неизменяем: вставки возвращают новый индекс с теми же центроидами.
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, trained_size: int):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.trained_size = trained_size
+        # Инвертированные списки: строки матрицы, отсортированные по номеру кластера
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(len(centroids) + 1))
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> "IVFIndex":
+        """Обучение центроидов сферическим k-means на выборке и распределение всех векторов"""
+        n = len(matrix)
+        nlist = max(1, min(nlist or int(4 * np.sqrt(n)), n))
+        rng = np.random.default_rng(seed)
+        sample_size = min(n, 256 * nlist)
+        sample = np.asarray(matrix[rng.choice(n, sample_size, replace=False)], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            # Пустые кластеры переинициализируем случайными точками выборки
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalize_rows(sums)
+        return cls(centroids, cls.assign(centroids, matrix), n)
+
+    @staticmethod
+    def assign(centroids: np.ndarray, rows: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        """Номер ближайшего центроида для каждой строки (блоками, чтобы ограничить память)"""
+        labels = np.empty(len(rows), dtype=np.int32)
+        for start in range(0, len(rows), block_size):
+            labels[start:start + block_size] = np.argmax(rows[start:start + block_size] @ centroids.T, axis=1)
+        return labels
+
+    def with_rows(self, matrix: np.ndarray, positions: np.ndarray) -> "IVFIndex":
+        """Новый индекс с (пере)распределенными строками matrix[positions] без переобучения"""
+        assignments = np.empty(len(matrix), dtype=np.int32)
+        assignments[:len(self.assignments)] = self.assignments[:len(matrix)]
+        if len(positions):
+            assignments[positions] = self.assign(self.centroids, matrix[positions])
+        return IVFIndex(self.centroids, assignments, self.trained_size)
+
+    def candidates(self, query_vector: np.ndarray, nprobe: int) -> np.ndarray:
+        """Строки матрицы из nprobe ближайших к запросу кластеров"""
+        probes = top_k_indices(self.centroids @ query_vector, min(nprobe, len(self.centroids)))
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes])
+
+
+class LocalNamespace:
+    """Неизменяемый снимок пространства имен локального индекса"""
+
+    def __init__(self, matrix: np.ndarray, ids: List[str], metadata: List[Dict[str, Any]],
+                 ivf: Optional[IVFIndex] = None, quantizer: Optional[Quantizer] = None,
+                 codes: Optional[np.ndarray] = None):
+        self.matrix = matrix
+        self.ids = ids
+        self.metadata = metadata
+        self.ivf = ivf
+        # Сжатые коды строк матрицы (None - поиск по float32 без сжатия)
+        self.quantizer = quantizer
+        self.codes = codes
+        self.positions = {bug_id: i for i, bug_id in enumerate(ids)}
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-нормализация строк матрицы (для косинусной близости через скалярное произведение)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Индексы top_k наибольших значений в порядке убывания (argpartition + сортировка кандидатов)"""
+    if top_k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class LocalBackend(VectorIndexBackend):
+    """
+    Локальный векторный индекс в памяти процесса
+
+    Нормализованные эмбеддинги хранятся в непрерывной матрице float32, точный
+    косинусный top-k считается одним матричным умножением и argpartition.
+    Для больших корпусов включается приближенный поиск IVF (index_type="ivf").
+    При заданном пути индекс сохраняется в .npy и загружается через mmap.
+
+    Со сжатием (quantization=float16/int8/pq) кандидаты оцениваются по компактным
+    кодам, а лучшие rerank_candidates переоцениваются точно по float32. При заданном
+    пути после сохранения матрица float32 остается только отображением файла, из
+    которого читаются строки короткого списка, и в памяти процесса живут коды.
+
+    При включенном хранилище документов (include_metadata=False) в индексе, как и в
+    Pinecone, хранится только хэш содержимого: поиск возвращает id и оценки, а
+    названия и описания подставляются из хранилища документов.
+
+    Пространства имен (игры), сохраненные на диск, загружаются при первом
+    обращении и вытесняются по LRU, когда суммарный размер загруженных превышает
+    memory_budget_mb; вытесненное пространство имен загрузится снова при следующем запросе.
+
+    В режиме нескольких воркеров матрица отображается из файла, поэтому ее
+    страницы разделяются процессами через page cache, а изменения, записанные
+    другим воркером, подхватываются периодической проверкой файлов.
+    """
+
+    name = "local"
+    is_local = True
+    # Каждый upsert копирует снимок пространства имен, поэтому загружаем крупными пачками
+    upsert_batch_size = 50000
+
+    def __init__(self, path: str = "", index_type: str = LOCAL_INDEX_TYPE, nlist: int = IVF_NLIST,
+                 nprobe: int = IVF_NPROBE, min_train_size: int = IVF_MIN_TRAIN_SIZE,
+                 quantization: str = LOCAL_INDEX_QUANTIZATION, rerank_candidates: int = QUANTIZATION_RERANK_CANDIDATES,
+                 pq_subvectors: int = PQ_SUBVECTORS, memory_budget_mb: float = LOCAL_INDEX_MEMORY_BUDGET_MB,
+                 executor: Optional[Executor] = None, include_metadata: bool = not DOCSTORE_ENABLED):
+        """
+        Args:
+            path: Каталог для сохранения индекса (пустая строка - только в памяти)
+            index_type: flat (точный поиск) или ivf (приближенный поиск)
+            nlist: Число кластеров IVF (0 - 4 * sqrt(n))
+            nprobe: Число просматриваемых кластеров при поиске (точность/задержка)
+            min_train_size: Минимальный размер корпуса для обучения IVF; меньшие корпуса ищутся точно
+            quantization: Сжатие векторов: none, float16, int8 или pq
+            rerank_candidates: Сколько лучших по кодам кандидатов переоценивать точно (0 - без переоценки)
+            pq_subvectors: Число подвекторов PQ (0 - размерность / 4)
+            memory_budget_mb: Бюджет памяти загруженных пространств имен (0 - без ограничения; только при заданном path)
+            executor: Пул потоков для асинхронного поиска (None - пул event loop по умолчанию)
+            include_metadata: Хранить название и описание (False - только хэш содержимого)
+        """
+        if quantization not in ("none", "float16", "int8", "pq"):
+            raise ValueError(f"Unknown quantization '{quantization}', expected none, float16, int8 or pq")
+        self._path = path
+        self._index_type = index_type
+        self._quantization = quantization
+        self.rerank_candidates = max(0, rerank_candidates)
+        self._pq_subvectors = pq_subvectors
+        self._nlist = nlist
+        self.nprobe = nprobe
+        self._min_train_size = max(1, min_train_size)
+        self._dimension: Optional[int] = None
+        self._namespaces: Dict[str, LocalNamespace] = {}
+        self._write_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # Время последнего обращения к пространству имен для вытеснения LRU
+        self._last_used: Dict[str, float] = {}
+        self._memory_budget = int(max(0.0, memory_budget_mb) * 1024 * 1024)
+        # Время изменения файлов загруженных пространств имен и период их проверки (0 - не проверять)
+        self._mtimes: Dict[str, int] = {}
+        self.reload_interval = 0.0
+        self._checked = 0.0
+        self._executor = executor
+        self.include_metadata = include_metadata
+
+    def start(self, dimension: int) -> bool:
+        self._dimension = dimension
+        if self._path:
+            os.makedirs(self._path, exist_ok=True)
+            stored = self.stored_namespaces()
+            logger.info(f"Локальный индекс '{self._path}': {len(stored)} пространств имен, загрузка при первом обращении")
+            return not stored
+        return self.count() == 0
+
+    def stored_namespaces(self) -> List[str]:
+        """Пространства имен, сохраненные в каталоге индекса"""
+        if not self._path or not os.path.isdir(self._path):
+            return []
+        return sorted(
+            file_name[:-len(".npy")] for file_name in os.listdir(self._path)
+            if file_name.endswith(".npy") and not file_name.endswith(".codes.npy")
+        )
+
+    def before_fork(self) -> None:
+        """Замена матриц в памяти на отображения файлов, чтобы воркеры разделяли страницы"""
+        if self._path:
+            self.reload(force=True)
+
+    def after_fork(self) -> None:
+        if self._path:
+            self.reload_interval = LOCAL_INDEX_RELOAD_SECONDS
+
+    def refresh(self) -> None:
+        if self._path:
+            self.reload()
+
+    def reload(self, force: bool = False) -> List[str]:
+        """
+        Повторная загрузка с диска загруженных пространств имен, файлы которых изменились
+        (например, другим воркером); незагруженные загрузятся при первом обращении
+
+        Args:
+            force: Перезагрузить все загруженные пространства имен независимо от времени изменения
+
+        Returns:
+            Список перезагруженных пространств имен
+        """
+        reloaded = []
+        for namespace in list(self._namespaces):
+            try:
+                mtime = os.stat(self._files(namespace)[0]).st_mtime_ns
+                if not force and self._mtimes.get(namespace) == mtime:
+                    continue
+                snapshot = self._load(namespace)
+            except (OSError, ValueError) as e:
+                # Файлы заменяются по одному: повторим при следующей проверке
+                logger.warning(f"Не удалось загрузить пространство имен '{namespace}': {str(e)}")
+                continue
+            with self._write_lock:
+                self._namespaces[namespace] = snapshot
+                self._mtimes[namespace] = mtime
+            reloaded.append(namespace)
+        if reloaded and not force:
+            logger.info(f"Локальный индекс перезагружен с диска: {', '.join(reloaded)}")
+        return reloaded
+
+    def _snapshot(self, namespace: str) -> Optional[LocalNamespace]:
+        """Текущий снимок пространства имен с периодической проверкой изменений на диске"""
+        if self.reload_interval > 0:
+            now = time.monotonic()
+            if now - self._checked >= self.reload_interval:
+                self._checked = now
+                self.reload()
+        return self._current(namespace)
+
+    def _current(self, namespace: str) -> Optional[LocalNamespace]:
+        """Снимок пространства имен (с загрузкой с диска при первом обращении) без проверки изменений"""
+        snapshot = self._namespaces.get(namespace)
+        if snapshot is None and self._path:
+            snapshot = self._load_on_demand(namespace)
+        if snapshot is not None:
+            self._last_used[namespace] = time.monotonic()
+        return snapshot
+
+    def _load_on_demand(self, namespace: str) -> Optional[LocalNamespace]:
+        """Загрузка пространства имен с диска при первом обращении и вытеснение давно не используемых"""
+        with self._load_lock:
+            snapshot = self._namespaces.get(namespace)
+            if snapshot is not None or not os.path.exists(self._files(namespace)[0]):
+                return snapshot
+            matrix_file = self._files(namespace)[0]
+            mtime = os.stat(matrix_file).st_mtime_ns
+            snapshot = self._load(namespace)
+            self._namespaces[namespace] = snapshot
+            self._mtimes[namespace] = mtime
+            self._last_used[namespace] = time.monotonic()
+            NAMESPACE_LOADS.labels("local_index").inc()
+            logger.info(f"Пространство имен '{namespace}' загружено с диска: {len(snapshot.ids)} векторов")
+            self._evict(keep=namespace)
+        return snapshot
+
+    @staticmethod
+    def _resident_bytes(snapshot: LocalNamespace) -> int:
+        size = snapshot.matrix.nbytes
+        if snapshot.codes is not None:
+            size += snapshot.codes.nbytes
+        if snapshot.ivf is not None:
+            size += snapshot.ivf.assignments.nbytes + snapshot.ivf.order.nbytes + snapshot.ivf.centroids.nbytes
+        return size
+
+    def _evict(self, keep: str) -> None:
+        """Вытеснение давно не используемых пространств имен при превышении бюджета памяти"""
+        if not self._memory_budget or not self._path:
+            return
+        sizes = {namespace: self._resident_bytes(snapshot) for namespace, snapshot in list(self._namespaces.items())}
+        total = sum(sizes.values())
+        for namespace in sorted(sizes, key=lambda name: self._last_used.get(name, 0.0)):
+            if total <= self._memory_budget:
+                break
+            # Вытесняются только сохраненные на диск пространства имен: их можно загрузить снова
+            if namespace == keep or not os.path.exists(self._files(namespace)[0]):
+                continue
+            self._namespaces.pop(namespace, None)
+            self._mtimes.pop(namespace, None)
+            self._last_used.pop(namespace, None)
+            total -= sizes[namespace]
+            NAMESPACE_EVICTIONS.labels("local_index").inc()
+            logger.info(f"Пространство имен '{namespace}' вытеснено из памяти ({sizes[namespace] / 1024 / 1024:.1f} МБ)")
+
+    def list_ids(self, namespace: str) -> Optional[List[str]]:
+        snapshot = self._snapshot(namespace)
+        return list(snapshot.ids) if snapshot is not None else []
+
+    def fetch_metadata(self, ids: List[str], namespace: str) -> Dict[str, Dict[str, Any]]:
+        snapshot = self._snapshot(namespace)
+        if snapshot is None:
+            return {}
+        return {bug_id: snapshot.metadata[snapshot.positions[bug_id]] for bug_id in ids if bug_id in snapshot.positions}
+
+    def vectors(self, namespace: str) -> Optional[Tuple[np.ndarray, List[str]]]:
+        """Нормализованные эмбеддинги и id пространства имен (снимок; None - пространство имен пусто)"""
+        snapshot = self._snapshot(namespace)
+        if snapshot is None or not snapshot.ids:
+            return None
+        return snapshot.matrix, snapshot.ids
+
+    def count(self, namespace: Optional[str] = None) -> int:
+        """Количество векторов в пространстве имен (или во всем индексе)"""
+        if namespace is not None:
+            snapshot = self._namespaces.get(namespace)
+            return len(snapshot.ids) if snapshot is not None else 0
+        return sum(len(snapshot.ids) for snapshot in self._namespaces.values())
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str) -> None:
+        if not vectors:
+            return
+        if not self.include_metadata:
+            # Записи, загруженные до хранилища документов, сохраняют тексты: из них его восстанавливает check_docstore
+            vectors = [
+                dict(vector, metadata={"content_hash": (vector.get("metadata") or {}).get("content_hash")})
+                for vector in vectors
+            ]
+        new_rows = normalize_rows(np.asarray([v["values"] for v in vectors], dtype=np.float32))
+        with self._write_lock:
+            current = self._current(namespace)
+            if current is None:
+                matrix = np.empty((0, new_rows.shape[1]), dtype=np.float32)
+                ids: List[str] = []
+                metadata: List[Dict[str, Any]] = []
+                positions: Dict[str, int] = {}
+            else:
+                # Копия матрицы: текущий снимок может читаться конкурентно или быть mmap только на чтение
+                matrix = np.array(current.matrix, dtype=np.float32)
+                ids = list(current.ids)
+                metadata = list(current.metadata)
+                positions = dict(current.positions)
+
+            appended = []
+            for row, record in zip(new_rows, vectors):
+                position = positions.get(record["id"])
+                if position is not None:
+                    matrix[position] = row
+                    metadata[position] = record.get("metadata") or {}
+                else:
+                    positions[record["id"]] = len(ids) + len(appended)
+                    appended.append((row, record))
+            if appended:
+                matrix = np.vstack([matrix, np.stack([row for row, _ in appended])])
+                ids.extend(record["id"] for _, record in appended)
+                metadata.extend(record.get("metadata") or {} for _, record in appended)
+
+            matrix = np.ascontiguousarray(matrix)
+            changed = np.fromiter((positions[record["id"]] for record in vectors), dtype=np.int64, count=len(vectors))
+            ivf = self._update_ivf(current.ivf if current is not None else None, matrix, changed)
+            quantizer, codes = self._update_codes(current, matrix, changed)
+            snapshot = LocalNamespace(matrix, ids, metadata, ivf, quantizer, codes)
+            self._namespaces[namespace] = snapshot
+            if self._path:
+                self._save(namespace, snapshot)
+                self._evict(keep=namespace)
+
+    def delete(self, ids: List[str], namespace: str) -> None:
+        with self._write_lock:
+            current = self._current(namespace)
+            if current is None:
+                return
+            removed = {current.positions[bug_id] for bug_id in ids if bug_id in current.positions}
+            if not removed:
+                return
+            keep = np.array([i not in removed for i in range(len(current.ids))], dtype=bool)
+            matrix = np.ascontiguousarray(current.matrix[keep], dtype=np.float32)
+            ivf = None
+            if current.ivf is not None:
+                ivf = IVFIndex(current.ivf.centroids, current.ivf.assignments[keep], current.ivf.trained_size)
+            codes = current.quantizer.layout(current.codes[keep]) if current.codes is not None else None
+            snapshot = LocalNamespace(
+                matrix,
+                [bug_id for i, bug_id in enumerate(current.ids) if keep[i]],
+                [meta for i, meta in enumerate(current.metadata) if keep[i]],
+                ivf if len(matrix) >= self._min_train_size else None,
+                current.quantizer if codes is not None and len(matrix) else None,
+                codes if len(matrix) else None
+            )
+            self._namespaces[namespace] = snapshot
+            if self._path:
+                self._save(namespace, snapshot)
+
+    def query(self, vector: np.ndarray, top_k: int, namespace: str) -> List[Dict[str, Any]]:
+        snapshot = self._snapshot(namespace)
+        if snapshot is None or not snapshot.ids:
+            logger.warning(f"Локальный индекс пуст для пространства имен '{namespace}'")
+            return []
+        query_vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        if norm > 0:
+            query_vector = query_vector / norm
+        candidates = None
+        if snapshot.ivf is not None:
+            candidates = snapshot.ivf.candidates(query_vector, self.nprobe)
+            if len(candidates) < top_k:
+                candidates = None
+        if snapshot.codes is not None:
+            return self._query_codes(snapshot, query_vector, top_k, candidates)
+        if candidates is not None:
+            scores = snapshot.matrix[candidates] @ query_vector
+            best = top_k_indices(scores, top_k)
+            return self._to_results(snapshot, scores[best], candidates[best])
+        scores = snapshot.matrix @ query_vector
+        best = top_k_indices(scores, top_k)
+        return self._to_results(snapshot, scores[best], best)
+
+    async def aquery(self, vector: np.ndarray, top_k: int, namespace: str) -> List[Dict[str, Any]]:
+        """Поиск в пуле потоков: умножение матриц, загрузка пространства имен с диска и проверка файлов не блокируют event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.query, vector, top_k, namespace)
+
+    def _query_codes(self, snapshot: LocalNamespace, query_vector: np.ndarray, top_k: int,
+                     candidates: Optional[np.ndarray]) -> List[Dict[str, Any]]:
+        """Приближенная оценка по сжатым кодам и точная переоценка короткого списка по float32"""
+        codes = snapshot.codes if candidates is None else snapshot.codes[candidates]
+        approx = snapshot.quantizer.scores(codes, query_vector)
+        if not self.rerank_candidates:
+            best = top_k_indices(approx, top_k)
+            rows = best if candidates is None else candidates[best]
+            return self._to_results(snapshot, approx[best], rows)
+        shortlist = top_k_indices(approx, max(top_k, self.rerank_candidates))
+        rows = shortlist if candidates is None else candidates[shortlist]
+        # Из отображенной матрицы читаются только строки короткого списка (по возрастанию - меньше случайных чтений)
+        rows = np.sort(rows)
+        scores = snapshot.matrix[rows] @ query_vector
+        best = top_k_indices(scores, top_k)
+        return self._to_results(snapshot, scores[best], rows[best])
+
+    def query_batch(self, vectors: Any, top_k: int, namespace: str,
+                    max_block_elements: int = 1 << 24) -> List[List[Dict[str, Any]]]:
+        """Точный поиск для матрицы запросов блочным матричным умножением (IVF - по одному запросу)"""
+        snapshot = self._snapshot(namespace)
+        if snapshot is None or not snapshot.ids:
+            logger.warning(f"Локальный индекс пуст для пространства имен '{namespace}'")
+            return [[] for _ in vectors]
+        if snapshot.ivf is not None or snapshot.codes is not None:
+            return super().query_batch(vectors, top_k, namespace)
+        queries = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        block_size = max(1, max_block_elements // len(snapshot.ids))
+        results = []
+        for start in range(0, len(queries), block_size):
+            block_scores = queries[start:start + block_size] @ snapshot.matrix.T
+            for scores in block_scores:
+                best = top_k_indices(scores, top_k)
+                results.append(self._to_results(snapshot, scores[best], best))
+        return results
+
+    async def aquery_batch(self, vectors: Any, top_k: int, namespace: str) -> List[List[Dict[str, Any]]]:
+        """Пакетный поиск в пуле потоков (см. aquery)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.query_batch, vectors, top_k, namespace)
+
+    def _update_ivf(self, ivf: Optional[IVFIndex], matrix: np.ndarray, changed: np.ndarray) -> Optional[IVFIndex]:
+        """Инкрементальное обновление IVF; переобучение при четырехкратном росте корпуса"""
+        if self._index_type != "ivf" or len(matrix) < self._min_train_size:
+            return None
+        if ivf is None or len(matrix) >= 4 * ivf.trained_size:
+            logger.info(f"Обучение IVF индекса на {len(matrix)} векторах")
+            return IVFIndex.train(matrix, self._nlist)
+        return ivf.with_rows(matrix, changed)
+
+    def _update_codes(self, current: Optional[LocalNamespace], matrix: np.ndarray,
+                      changed: np.ndarray) -> Tuple[Optional[Quantizer], Optional[np.ndarray]]:
+        """Кодирование измененных строк; переобучение квантователя при четырехкратном росте корпуса"""
+        if self._quantization == "none":
+            return None, None
+        quantizer = current.quantizer if current is not None else None
+        if quantizer is None or current.codes is None or len(matrix) >= 4 * quantizer.trained_size:
+            logger.info(f"Обучение квантования {self._quantization} на {len(matrix)} векторах")
+            quantizer = train_quantizer(self._quantization, matrix, self._pq_subvectors)
+            return quantizer, self._encode_rows(quantizer, matrix)
+        codes = quantizer.layout(np.empty((len(matrix),) + current.codes.shape[1:], dtype=current.codes.dtype))
+        codes[:len(current.codes)] = current.codes
+        if len(changed):
+            codes[changed] = quantizer.encode(matrix[changed])
+        return quantizer, codes
+
+    @staticmethod
+    def _encode_rows(quantizer: Quantizer, matrix: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        """Кодирование всей матрицы блоками (матрица может быть отображением файла)"""
+        return quantizer.layout(np.concatenate(
+            [quantizer.encode(matrix[start:start + block_size]) for start in range(0, len(matrix), block_size)]
+        ))
+
+    def memory_usage(self, namespace: str) -> Dict[str, Any]:
+        """Размер векторов пространства имен в байтах: float32 матрица и сжатые коды с параметрами"""
+        snapshot = self._namespaces.get(namespace)
+        if snapshot is None:
+            return {}
+        usage = {
+            "vectors": len(snapshot.ids),
+            "quantization": snapshot.quantizer.kind if snapshot.quantizer is not None else "none",
+            "float32_bytes": int(snapshot.matrix.nbytes),
+            "float32_mapped": isinstance(snapshot.matrix, np.memmap),
+        }
+        if snapshot.codes is not None:
+            usage["code_bytes"] = int(snapshot.codes.nbytes + snapshot.quantizer.nbytes())
+            usage["compression"] = round(usage["float32_bytes"] / max(1, usage["code_bytes"]), 2)
+        return usage
+
+    def stats(self) -> Dict[str, Any]:
+        loaded = list(self._namespaces)
+        return {
+            "backend": self.name,
+            "index_type": self._index_type,
+            "stored_namespaces": len(self.stored_namespaces()),
+            "memory_budget_mb": self._memory_budget / 1024 / 1024 if self._memory_budget else None,
+            "resident_mb": sum(self._resident_bytes(self._namespaces[ns]) for ns in loaded if ns in self._namespaces) / 1024 / 1024,
+            "namespaces": {namespace: self.memory_usage(namespace) for namespace in loaded},
+        }
+
+    @staticmethod
+    def _to_results(snapshot: LocalNamespace, scores: np.ndarray, rows: np.ndarray) -> List[Dict[str, Any]]:
+        """Формирование результатов поиска в том же виде, что и для Pinecone"""
+        return [
+            {
+                "id": snapshot.ids[row],
+                "score": float(score),
+                "title": snapshot.metadata[row].get("title"),
+                "description": snapshot.metadata[row].get("description")
+            }
+            for row, score in zip(rows, scores)
+        ]
+
+    def _files(self, namespace: str) -> Tuple[str, str, str, str, str]:
+        base = os.path.join(self._path, namespace)
+        return f"{base}.npy", f"{base}.meta.json", f"{base}.ivf.npz", f"{base}.codes.npy", f"{base}.quant.npz"
+
+    def _save(self, namespace: str, snapshot: LocalNamespace) -> None:
+        """Атомарное сохранение матрицы, метаданных, IVF и сжатых кодов пространства имен на диск"""
+        matrix_file, meta_file, ivf_file, codes_file, quant_file = self._files(namespace)
+        with open(matrix_file + ".tmp", "wb") as f:
+            np.save(f, snapshot.matrix)
+        with open(meta_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": snapshot.ids, "metadata": snapshot.metadata}, f, ensure_ascii=False)
+        if snapshot.ivf is not None:
+            with open(ivf_file + ".tmp", "wb") as f:
+                np.savez(f, centroids=snapshot.ivf.centroids, assignments=snapshot.ivf.assignments,
+                         trained_size=snapshot.ivf.trained_size)
+            os.replace(ivf_file + ".tmp", ivf_file)
+        elif os.path.exists(ivf_file):
+            os.remove(ivf_file)
+        if snapshot.codes is not None:
+            with open(codes_file + ".tmp", "wb") as f:
+                np.save(f, snapshot.codes)
+            with open(quant_file + ".tmp", "wb") as f:
+                np.savez(f, kind=snapshot.quantizer.kind, trained_size=snapshot.quantizer.trained_size,
+                         **snapshot.quantizer.params())
+            os.replace(quant_file + ".tmp", quant_file)
+            os.replace(codes_file + ".tmp", codes_file)
+        else:
+            for file_name in (codes_file, quant_file):
+                if os.path.exists(file_name):
+                    os.remove(file_name)
+        os.replace(meta_file + ".tmp", meta_file)
+        os.replace(matrix_file + ".tmp", matrix_file)
+        self._mtimes[namespace] = os.stat(matrix_file).st_mtime_ns
+        if snapshot.codes is not None:
+            # Полная матрица нужна только для переоценки короткого списка: держим ее отображением файла
+            self._namespaces[namespace] = LocalNamespace(
+                np.load(matrix_file, mmap_mode="r"), snapshot.ids, snapshot.metadata, snapshot.ivf,
+                snapshot.quantizer, snapshot.codes
+            )
+
+    def _load(self, namespace: str) -> LocalNamespace:
+        """Загрузка пространства имен с диска (матрица отображается через mmap)"""
+        matrix_file, meta_file, ivf_file, codes_file, quant_file = self._files(namespace)
+        matrix = np.load(matrix_file, mmap_mode="r")
+        with open(meta_file, encoding="utf-8") as f:
+            meta = json.load(f)
+        if len(meta["ids"]) != len(matrix):
+            raise ValueError(f"Размеры матрицы ({len(matrix)}) и метаданных ({len(meta['ids'])}) не совпадают")
+        ivf = None
+        if self._index_type == "ivf" and os.path.exists(ivf_file):
+            with np.load(ivf_file) as data:
+                if len(data["assignments"]) == len(matrix):
+                    ivf = IVFIndex(data["centroids"], data["assignments"], int(data["trained_size"]))
+        if ivf is None:
+            ivf = self._update_ivf(None, matrix, np.arange(len(matrix)))
+        quantizer, codes = None, None
+        if self._quantization != "none" and os.path.exists(quant_file) and os.path.exists(codes_file):
+            with np.load(quant_file) as data:
+                if str(data["kind"]) == self._quantization:
+                    params = {key: data[key] for key in data.files if key not in ("kind", "trained_size")}
+                    quantizer = load_quantizer(self._quantization, params, int(data["trained_size"]))
+            # Коды тоже отображаются из файла и разделяются воркерами через page cache
+            codes = np.load(codes_file, mmap_mode="r") if quantizer is not None else None
+            if codes is not None and len(codes) != len(matrix):
+                quantizer, codes = None, None
+        if codes is None and len(matrix):
+            quantizer, codes = self._update_codes(None, matrix, np.arange(len(matrix)))
+        return LocalNamespace(matrix, meta["ids"], meta["metadata"], ivf, quantizer, codes)
+
+
+def create_backend(name: str, io_executor: Executor, local_path: str = "",
+                   search_executor: Optional[Executor] = None) -> VectorIndexBackend:
+    """
+    Создание бэкенда векторного индекса по настройке VECTOR_BACKEND
+
+    Args:
+        name: local или pinecone
+        io_executor: Пул потоков для сетевых запросов к Pinecone
+        local_path: Каталог локального индекса
+        search_executor: Пул потоков для поиска в локальном индексе (нагрузка на CPU)
+    """
+    if name == "local":
+        return LocalBackend(local_path, executor=search_executor)
+    if name != "pinecone":
+        raise ValueError(f"Unknown VECTOR_BACKEND '{name}', expected 'pinecone' or 'local'")
+    from .resilience import ResilientBackend
+
+    return ResilientBackend(PineconeBackend(io_executor), io_executor)
@@ -1,204 +1,975 @@
 """
-Модуль для работы с векторной базой данных Pinecone
+Модуль для работы с векторной базой данных
 """
 
+import asyncio
+import itertools
 import logging
-from typing import List, Dict, Any
-from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
-import requests
+import os
+import re
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Iterable, List, Dict, Any, Optional, Set, Tuple, Union
 from datetime import datetime
 
+import numpy as np
+
 from .bug_data import BUGS_DATA
 from .config import PINECONE_API_KEY, PINECONE_INDEX_NAME, PINECONE_NAMESPACE, N8N_WEBHOOK_URL, MODEL_VECTORIZER, PINECONE_CLOUD, PINECONE_REGION
+from .config import ENCODE_MAX_WORKERS, IO_MAX_WORKERS, QUERY_MAX_CONCURRENCY, ENCODE_BATCH_MAX_SIZE, ENCODE_BATCH_WAIT_MS
+from .config import CACHE_ENABLED, VECTOR_BACKEND, VECTOR_FALLBACK_LOCAL, LOCAL_INDEX_PATH
+from .config import HYBRID_ENABLED, HYBRID_LEXICAL_WEIGHT, HYBRID_CANDIDATES
+from .config import LEXICAL_FAST_PATH, LEXICAL_FAST_PATH_MAX_TOKENS, LEXICAL_FAST_PATH_CONFIDENCE
+from .config import DOCSTORE_ENABLED, DOCSTORE_CHECK_ON_START, GAME_NAMESPACES
+from .config import DUPLICATES_THRESHOLD, DUPLICATES_CHECK_ON_UPSERT, DUPLICATES_CHECK_REMOTE, INGEST_ENCODE_BATCH_SIZE
+from .config import WARMUP_QUERIES_PATH, WARMUP_QUERIES_LIMIT
+from .cache import IndexGeneration, QueryCache
+from .docstore import DocumentStore
+from .duplicates import DuplicateChecker, find_duplicates
+from .telemetry import TelemetrySink
+from .query_log import QueryLog
+from .query_analysis import iter_warmup_queries
+from .ingestion import IngestionPipeline, IngestManifest, ingest_lock, bug_content, content_hash
+from .inference import load_encoder, configure_threads
+from .lexical import LexicalIndex, fuse_results, iter_lexical_records, tokenize
+from .metrics import stage, ENCODE_BATCH_SIZE, ENCODE_QUEUE_WAIT_SECONDS, ERRORS, FALLBACK_QUERIES, LEXICAL_FAST_PATH_HITS
+from .metrics import DEGRADED_RESPONSES
+from .resilience import SearchUnavailableError
+from .schemas import NAMESPACE_PATTERN
+from .vector_backends import VectorIndexBackend, LocalBackend, create_backend
 
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class BatchEncoder:
+    """
+    Сервис микробатчинга векторизации
+
+    Собирает конкурентные запросы на векторизацию в течение короткого окна
+    (или до достижения максимального размера батча), кодирует их одним вызовом
+    модели в пуле потоков и возвращает каждому ожидающему его вектор.
+    """
+
+    def __init__(self, encode_batch: Callable[[List[str]], Any], executor: Executor,
+                 max_batch_size: int = ENCODE_BATCH_MAX_SIZE, max_wait_ms: float = ENCODE_BATCH_WAIT_MS,
+                 max_parallel_batches: int = ENCODE_MAX_WORKERS):
+        """
+        Args:
+            encode_batch: Функция, кодирующая список текстов в матрицу векторов
+            executor: Пул потоков для выполнения кодирования
+            max_batch_size: Максимальное число текстов в одном батче
+            max_wait_ms: Окно ожидания новых запросов после первого в батче
+            max_parallel_batches: Число батчей, кодируемых одновременно
+        """
+        self._encode_batch = encode_batch
+        self._executor = executor
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max(0.0, max_wait_ms) / 1000
+        self._max_parallel_batches = max(1, max_parallel_batches)
+
+        # Очередь, событие и воркер создаются лениво внутри event loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._max_batch_seen = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+        self._batch_size_buckets: Dict[int, int] = {}
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Постановка текста в очередь и ожидание его вектора"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future, time.perf_counter()))
+        if self._queue.qsize() + 1 >= self._max_batch_size:
+            self._batch_full.set()
+        return await future
+
+    def _ensure_started(self) -> None:
+        """Запуск фонового сборщика батчей при первом обращении"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._batch_full = asyncio.Event()
+            self._slots = asyncio.Semaphore(self._max_parallel_batches)
+            self._worker = asyncio.get_running_loop().create_task(self._collect())
+
+    async def _collect(self) -> None:
+        """Сбор запросов из очереди в батчи"""
+        while True:
+            batch = [await self._queue.get()]
+            if self._max_wait > 0 and self._queue.qsize() + 1 < self._max_batch_size:
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self._max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self._max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            await self._slots.acquire()
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            task.add_done_callback(lambda _: self._slots.release())
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        """Кодирование батча одним вызовом модели и раздача векторов ожидающим"""
+        started = time.perf_counter()
+        self._record_batch(len(batch), [started - enqueued for _, _, enqueued in batch])
+        texts = [text for text, _, _ in batch]
+        try:
+            loop = asyncio.get_running_loop()
+            vectors = await loop.run_in_executor(self._executor, self._encode_batch, texts)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def _record_batch(self, size: int, waits: List[float]) -> None:
+        """Обновление метрик размера батча и времени ожидания в очереди"""
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._max_batch_seen = max(self._max_batch_seen, size)
+            self._total_wait += sum(waits)
+            self._max_wait_seen = max(self._max_wait_seen, max(waits))
+            bucket = 1 << (size - 1).bit_length()
+            self._batch_size_buckets[bucket] = self._batch_size_buckets.get(bucket, 0) + 1
+        ENCODE_BATCH_SIZE.observe(size)
+        for wait in waits:
+            ENCODE_QUEUE_WAIT_SECONDS.observe(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики микробатчинга: размеры батчей и время ожидания в очереди"""
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "max_batch_size": self._max_batch_seen,
+                "batch_size_buckets": {f"<={k}": v for k, v in sorted(self._batch_size_buckets.items())},
+                "avg_queue_wait_ms": self._total_wait / self._items * 1000 if self._items else 0.0,
+                "max_queue_wait_ms": self._max_wait_seen * 1000,
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            }
+
+    async def close(self) -> None:
+        """Остановка фонового сборщика батчей"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+
+class UnknownNamespaceError(ValueError):
+    """Запрошенная игра (пространство имен) не обслуживается этим развертыванием"""
+
+
 class VectorDatabase:
-    """Класс для работы с векторной базой данных Pinecone"""
+    """Класс для работы с векторной базой данных (Pinecone или локальный индекс)"""
     
     def __init__(self):
         """Инициализация класса и проверка наличия переменных окружения"""
-        missing_vars = [
-            var_name
-            for var_name, value in {
+        required_vars = {
+            "PINECONE_NAMESPACE": PINECONE_NAMESPACE,
+            "MODEL_VECTORIZER": MODEL_VECTORIZER,
+            "N8N_WEBHOOK_URL": N8N_WEBHOOK_URL
+        }
+        if VECTOR_BACKEND == "pinecone":
+            required_vars.update({
                 "PINECONE_API_KEY": PINECONE_API_KEY,
                 "PINECONE_CLOUD": PINECONE_CLOUD,
                 "PINECONE_REGION": PINECONE_REGION,
-                "PINECONE_INDEX_NAME": PINECONE_INDEX_NAME,
-                "PINECONE_NAMESPACE": PINECONE_NAMESPACE,
-                "MODEL_VECTORIZER": MODEL_VECTORIZER,
-                "N8N_WEBHOOK_URL": N8N_WEBHOOK_URL
-
-                }.items()
-                if not value
-            ]
+                "PINECONE_INDEX_NAME": PINECONE_INDEX_NAME
+            })
+        missing_vars = [var_name for var_name, value in required_vars.items() if not value]
         if missing_vars:
             raise ValueError(f"Missing requireq for database config: {', '.join(missing_vars)}")
         
-        """загрузка модели для векторизации"""
-        self.model = SentenceTransformer(MODEL_VECTORIZER)
+        """загрузка модели для векторизации (движок инференса из INFERENCE_BACKEND)"""
+        self.model = load_encoder()
+
+        # Пулы потоков для асинхронного пути: векторизация (CPU) и блокирующий I/O
+        self._encode_executor = ThreadPoolExecutor(max_workers=ENCODE_MAX_WORKERS, thread_name_prefix="encode")
+        self._io_executor = ThreadPoolExecutor(max_workers=IO_MAX_WORKERS, thread_name_prefix="vector-io")
+        # Микробатчинг конкурентных запросов на векторизацию
+        self.encoder = BatchEncoder(self.vectorize_texts, self._encode_executor)
+        # Фоновая пакетная отправка телеметрии в n8n
+        self.telemetry = TelemetrySink(N8N_WEBHOOK_URL)
+        # Локальный журнал запросов для офлайн-анализа (калибровка порога, частые запросы)
+        self.query_log = QueryLog()
+        # Кэш эмбеддингов запросов и результатов поиска
+        # (поколение индекса увеличивается при каждой загрузке, даже если кэш в этом процессе выключен)
+        self.generation = IndexGeneration()
+        self.cache: Optional[QueryCache] = QueryCache(generation=self.generation) if CACHE_ENABLED else None
+        # Основной бэкенд индекса и локальный резервный на случай сбоев Pinecone
+        # (поиск в локальном индексе - в пуле векторизации: он тоже нагружает CPU)
+        self.backend: VectorIndexBackend = create_backend(
+            VECTOR_BACKEND, self._io_executor, LOCAL_INDEX_PATH, search_executor=self._encode_executor
+        )
+        self.fallback: Optional[LocalBackend] = None
+        if VECTOR_FALLBACK_LOCAL and not self.backend.is_local:
+            self.fallback = LocalBackend(LOCAL_INDEX_PATH, executor=self._encode_executor)
+        # Локальное хранилище названий и описаний: индекс возвращает только id и оценки
+        self.docstore: Optional[DocumentStore] = DocumentStore() if DOCSTORE_ENABLED else None
+        # Лексический индекс BM25 для гибридного поиска и быстрых ответов по ключевым словам;
+        # индексы игр строятся из хранилища документов при первом обращении и заново после его изменения
+        self.lexical: Optional[LexicalIndex] = None
+        if HYBRID_ENABLED:
+            if self.docstore is not None:
+                self.lexical = LexicalIndex(loader=self._lexical_records, version=self.docstore.data_version)
+            else:
+                self.lexical = LexicalIndex()
+        # Манифест хэшей содержимого для пропуска неизмененных багов при загрузке
+        self.manifest = IngestManifest()
+        # Семафор создается лениво внутри event loop
+        self._query_semaphore: Optional[asyncio.Semaphore] = None
+        # Эмбеддинги багов для поиска дубликатов без локального индекса: игра -> id -> (хэш содержимого, вектор)
+        self._encoded: Dict[str, Dict[str, Tuple[str, np.ndarray]]] = {}
+        self._encoded_lock = threading.Lock()
     
-    def start_db (self):
-        """Инициализация подключения к Pinecone"""
+    def start_db (self, load_initial_data: bool = True, check_docstore: bool = DOCSTORE_CHECK_ON_START):
+        """
+        Инициализация подключения к векторному индексу
+
+        Args:
+            load_initial_data: Загрузить BUGS_DATA, если индекс пуст
+            check_docstore: Сверить хранилище документов с индексом и восстановить расхождения
+        """
         try:
-            pc = Pinecone(api_key=PINECONE_API_KEY)
-            existing_indexes = [index["name"] for index in pc.list_indexes()]
-            if PINECONE_INDEX_NAME not in existing_indexes:
-                
-                logger.info(f"Creating Pinecone index: {PINECONE_INDEX_NAME}")
-                pc.create_index(
-                    name=PINECONE_INDEX_NAME,
-                    dimension=self.model.get_sentence_embedding_dimension(),
-                    metric="cosine",
-                    spec=ServerlessSpec(
-                        cloud=PINECONE_CLOUD,
-                        region=PINECONE_REGION
-                            )
-                        )
-                # Инициализируем индекс
-                self.index = pc.Index(PINECONE_INDEX_NAME)
-                logger.info(f"Index created.")
+            dimension = self.model.get_sentence_embedding_dimension()
+            needs_data = self.backend.start(dimension)
+            fallback_needs_data = self.fallback.start(dimension) if self.fallback is not None else False
+            if needs_data and load_initial_data:
                 logger.info(f"Upserting initial bug data for new index...")
-                self.upsert_bugs_data()
-            else:
-                logger.info(f"Pinecone index '{PINECONE_INDEX_NAME}' already exists.")
-                # Инициализируем индекс
-                self.index = pc.Index(PINECONE_INDEX_NAME)
-            logger.info(f"Успешно подключено к индексу Pinecone: {PINECONE_INDEX_NAME}")
+                self.upsert_bugs_data(force=True)
+            elif fallback_needs_data:
+                logger.info(f"Заполнение резервного локального индекса...")
+                IngestionPipeline(self.vectorize_texts, [self.fallback], PINECONE_NAMESPACE).run(BUGS_DATA, delete_missing=False)
+            if self.docstore is not None and check_docstore:
+                for namespace in self.namespaces():
+                    try:
+                        self.check_docstore(repair=True, namespace=namespace)
+                    except Exception as e:
+                        # Расхождения не мешают запуску: недостающие тексты видны в логах при поиске
+                        logger.warning(f"Не удалось сверить хранилище документов '{namespace}' с {self.backend.name}: {str(e)}")
         except Exception as e:
-            logger.error(f"Ошибка при инициализации Pinecone: {str(e)}")
-            self.log_error_to_n8n("Ошибка подключения к Pinecone", str(e))
+            logger.error(f"Ошибка при инициализации {self.backend.name}: {str(e)}")
+            self.log_error_to_n8n(f"Ошибка подключения к {self.backend.name}", str(e))
             raise
 
-    def vectorize_text(self, text: str) -> List[float]:
-        """Преобразование текста в векторное представление"""
-        return self.model.encode(text).tolist()
+    def vectorize_text(self, text: str) -> np.ndarray:
+        """Преобразование текста в векторное представление (NumPy массив; в список - только при отправке в Pinecone)"""
+        return self.model.encode(text)
+
+    def vectorize_texts(self, texts: List[str]) -> Any:
+        """Векторизация списка текстов одним вызовом модели (матрица векторов)"""
+        return self.model.encode(texts)
+
+    def namespaces(self) -> List[str]:
+        """Игры (пространства имен), обслуживаемые развертыванием"""
+        return list(dict.fromkeys([PINECONE_NAMESPACE] + GAME_NAMESPACES))
+
+    def resolve_namespace(self, namespace: Optional[str]) -> str:
+        """
+        Пространство имен запроса: игра по умолчанию, если не указана
+
+        Raises:
+            UnknownNamespaceError: Некорректное имя или игра не входит в GAME_NAMESPACES
+        """
+        if not namespace:
+            return PINECONE_NAMESPACE
+        if not re.match(NAMESPACE_PATTERN, namespace):
+            raise UnknownNamespaceError(f"Некорректное имя игры '{namespace}'")
+        if GAME_NAMESPACES and namespace not in self.namespaces():
+            raise UnknownNamespaceError(f"Игра '{namespace}' не обслуживается")
+        return namespace
 
-    def upsert_bugs_data(self) -> None:
+    def _lexical_records(self, namespace: str) -> Iterable[Dict[str, Any]]:
+        """Записи лексического индекса игры из хранилища документов"""
+        return iter_lexical_records(self.docstore.iter_documents(namespace))
+
+    def warm_up(self) -> None:
+        """Прогрев модели пробной векторизацией (одиночный запрос и небольшой батч) и кэшей частыми запросами"""
+        self.vectorize_text("прогрев модели")
+        self.vectorize_texts(["игра зависает при загрузке уровня", "не сохраняются настройки профиля"])
+        if WARMUP_QUERIES_PATH and os.path.exists(WARMUP_QUERIES_PATH):
+            try:
+                self.warm_caches(iter_warmup_queries(WARMUP_QUERIES_PATH), WARMUP_QUERIES_LIMIT)
+            except Exception as e:
+                logger.warning(f"Не удалось прогреть кэши запросами из {WARMUP_QUERIES_PATH}: {str(e)}")
+
+    def warm_caches(self, items: Iterable[Dict[str, Any]], limit: int = WARMUP_QUERIES_LIMIT) -> Dict[str, int]:
+        """
+        Заполнение кэшей эмбеддингов и результатов частыми запросами
+
+        Запросы векторизуются пачками и ищутся без записи в телеметрию и журнал
+        запросов; заодно загружаются индексы игр, к которым они относятся.
+
+        Args:
+            items: Записи {"query", "namespace"} набора прогрева (по убыванию частоты)
+            limit: Максимум запросов
+
+        Returns:
+            Число прогретых запросов по играм
+        """
+        groups: Dict[str, List[str]] = {}
+        for item in itertools.islice(items, max(0, limit)):
+            try:
+                namespace = self.resolve_namespace(item.get("namespace"))
+            except UnknownNamespaceError:
+                continue
+            groups.setdefault(namespace, []).append(item["query"])
+
+        warmed: Dict[str, int] = {}
+        fetch_k = self._fetch_k(1)
+        for namespace, queries in groups.items():
+            for start in range(0, len(queries), INGEST_ENCODE_BATCH_SIZE):
+                batch = queries[start:start + INGEST_ENCODE_BATCH_SIZE]
+                for query, vector in zip(batch, self.vectorize_texts(batch)):
+                    if self.cache is not None:
+                        self.cache.set_embedding(query, vector)
+                        if self.cache.get_results(vector, fetch_k, namespace) is not None:
+                            continue
+                    results, degraded = self._query_backends(query, vector, fetch_k, namespace)
+                    if self.cache is not None and not degraded:
+                        self.cache.set_results(vector, fetch_k, namespace, results)
+            warmed[namespace] = len(queries)
+        if warmed:
+            logger.info(f"Кэши прогреты частыми запросами: {warmed}")
+        return warmed
+
+    def before_fork(self) -> None:
+        """Подготовка к fork воркеров: матрицы локального индекса отображаются из файлов"""
+        for backend in (self.backend, self.fallback):
+            if backend is not None:
+                backend.before_fork()
+
+    def after_fork(self, threads: int) -> None:
+        """
+        Восстановление состояния в воркере после fork
+
+        Фоновый поток телеметрии и соединения родителя в дочернем процессе не
+        существуют, поэтому создаются заново; веса модели и матрицы индекса
+        остаются общими страницами памяти. Пулы потоков и микробатчинг родитель
+        не запускает (потоки создаются лениво), их можно использовать как есть.
+
+        Args:
+            threads: Число потоков инференса в воркере
+        """
+        configure_threads(self.model, threads)
+        self.telemetry = TelemetrySink(N8N_WEBHOOK_URL)
+        self.query_log = QueryLog()
+        self._query_semaphore = None
+        if self.docstore is not None:
+            self.docstore.after_fork()
+        if self.lexical is not None:
+            self.lexical.after_fork()
+        for backend in (self.backend, self.fallback):
+            if backend is not None:
+                backend.after_fork()
+
+    async def avectorize_text(self, text: str) -> np.ndarray:
+        """Векторизация текста через микробатчинг в пуле потоков, не блокируя event loop"""
+        return await self.encoder.encode(text)
+
+    def ingest(self, bugs: Iterable[Dict[str, Any]], delete_missing: bool = True, force: bool = False,
+               namespace: str = PINECONE_NAMESPACE) -> Dict[str, Any]:
+        """
+        Потоковая загрузка багов в основной и резервный индексы
+
+        Args:
+            bugs: Итератор словарей с полями id, title, description
+            delete_missing: Удалять из индекса баги, которых нет в источнике
+            force: Перезагрузить все баги, игнорируя манифест
+            namespace: Игра (пространство имен), в которую загружаются баги
+
+        Returns:
+            Отчет о загрузке (см. IngestionPipeline.run); при проверке на дубликаты (см.
+            _duplicate_checker) в нем есть список duplicates - загруженные баги, похожие на уже проиндексированные
+        """
+        targets = [self.backend] + ([self.fallback] if self.fallback is not None else [])
+        # Документы записываются раньше векторов, чтобы найденный id всегда было чем заполнить
+        if self.docstore is not None:
+            targets.insert(0, self.docstore)
+        if self.lexical is not None:
+            targets.append(self.lexical)
+        # Загрузку выполняет один процесс за раз; перед ней подхватываем изменения других воркеров
+        with ingest_lock():
+            self.manifest.reload()
+            for target in targets:
+                target.refresh()
+            pipeline = IngestionPipeline(
+                self.vectorize_texts, targets, namespace, self.manifest,
+                duplicate_check=self._duplicate_checker(namespace, force)
+            )
+            try:
+                report = pipeline.run(bugs, delete_missing=delete_missing, force=force)
+            except Exception:
+                # Часть пачек могла уже попасть в индекс
+                self._index_changed(namespace)
+                raise
+            if report["upserted"] or report["deleted"]:
+                self._index_changed(namespace)
+        return dict(report, namespace=namespace)
+
+    def _index_changed(self, namespace: str) -> None:
+        """Новое поколение индекса игры (для кэшей всех процессов) и сброс кэша результатов этого процесса"""
+        self.generation.bump(namespace)
+        if self.cache is not None:
+            self.cache.invalidate_results(namespace)
+
+    def _duplicate_checker(self, namespace: str, force: bool = False) -> Optional[DuplicateChecker]:
+        """
+        Проверка загружаемых багов на дубликаты (DUPLICATES_CHECK_ON_UPSERT)
+
+        Проверяется по локальному индексу (основному или резервному); удаленный индекс
+        опрашивается по одному запросу на каждый баг, поэтому только при DUPLICATES_CHECK_REMOTE.
+        Полная перезагрузка (force, в том числе начальная загрузка) не проверяется: почти
+        все ее баги еще не в индексе, и дешевле один раз выполнить полный поиск дубликатов.
+        """
+        if not DUPLICATES_CHECK_ON_UPSERT:
+            return None
+        if force:
+            logger.info(
+                f"Полная загрузка '{namespace}' не проверяется на дубликаты, полный поиск: "
+                f"GET /bugs/duplicates или python -m src.chatbot_app.duplicates --namespace {namespace}"
+            )
+            return None
+        if self.fallback is not None:
+            return DuplicateChecker(self.fallback, namespace)
+        if self.backend.is_local or DUPLICATES_CHECK_REMOTE:
+            return DuplicateChecker(self.backend, namespace)
+        return None
+
+    def find_duplicates(self, namespace: str = PINECONE_NAMESPACE, threshold: float = DUPLICATES_THRESHOLD,
+                        method: str = "auto", limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Поиск дубликатов среди всех багов игры (см. duplicates.find_duplicates)
+
+        Args:
+            namespace: Игра (пространство имен)
+            threshold: Порог косинусной близости
+            method: exact, ann или auto
+            limit: Максимум пар и групп в отчете (None - все)
+
+        Returns:
+            Отчет: число багов, источник эмбеддингов, пары (с названиями) и группы дубликатов
+        """
+        started = time.perf_counter()
+        matrix, ids, source = self._namespace_vectors(namespace)
+        # В памяти остаются только limit самых близких пар, а не все пары выше порога
+        found = find_duplicates(matrix, ids, threshold, method, limit=limit)
+        titles = self._titles({pair[key] for pair in found["pairs"] for key in ("id_a", "id_b")}, namespace)
+        for pair in found["pairs"]:
+            pair["title_a"] = titles.get(pair["id_a"])
+            pair["title_b"] = titles.get(pair["id_b"])
+        return {
+            "namespace": namespace,
+            "threshold": threshold,
+            "source": source,
+            "bugs": len(ids),
+            **found,
+            "seconds": time.perf_counter() - started,
+        }
+
+    def _namespace_vectors(self, namespace: str) -> Tuple[np.ndarray, List[str], str]:
+        """Эмбеддинги всех багов игры: из локального индекса или векторизацией текстов из хранилища документов"""
+        for backend in (self.backend, self.fallback):
+            if isinstance(backend, LocalBackend):
+                found = backend.vectors(namespace)
+                if found is not None:
+                    return found[0], found[1], backend.name
+        # Pinecone не отдает все векторы сразу: тексты векторизуются той же моделью, а эмбеддинги
+        # кэшируются по хэшу содержимого - повторно векторизуются только новые и измененные баги
+        # (в том числе загруженные другим процессом), удаленные из кэша выбрасываются
+        if self.docstore is not None:
+            documents: Iterable[Dict[str, Any]] = self.docstore.iter_documents(namespace)
+        else:
+            documents = BUGS_DATA if namespace == PINECONE_NAMESPACE else []
+        with self._encoded_lock:
+            cached = self._encoded.get(namespace, {})
+        current: Dict[str, Tuple[str, np.ndarray]] = {}
+        ids: List[str] = []
+        stale = []
+        for bug in documents:
+            bug_id, digest = str(bug["id"]), content_hash(bug)
+            ids.append(bug_id)
+            hit = cached.get(bug_id)
+            if hit is not None and hit[0] == digest:
+                current[bug_id] = hit
+            else:
+                stale.append((bug_id, digest, bug_content(bug)))
+        for start in range(0, len(stale), INGEST_ENCODE_BATCH_SIZE):
+            chunk = stale[start:start + INGEST_ENCODE_BATCH_SIZE]
+            vectors = np.asarray(self.vectorize_texts([text for _, _, text in chunk]), dtype=np.float32)
+            for (bug_id, digest, _), vector in zip(chunk, vectors):
+                current[bug_id] = (digest, vector)
+        with self._encoded_lock:
+            self._encoded[namespace] = current
+        if stale:
+            logger.info(f"Векторизовано для поиска дубликатов в '{namespace}': {len(stale)} из {len(ids)} багов")
+        matrix = np.stack([current[bug_id][1] for bug_id in ids]) if ids else np.empty((0, 0), dtype=np.float32)
+        return matrix, ids, "encoded"
+
+    def _titles(self, ids: Iterable[str], namespace: str) -> Dict[str, Optional[str]]:
+        """Названия багов для отчета о дубликатах"""
+        ids = list(ids)
+        if not ids:
+            return {}
+        documents = self.docstore.get_many(ids, namespace) if self.docstore is not None else {}
+        missing = [bug_id for bug_id in ids if bug_id not in documents]
+        if missing:
+            documents.update(self.backend.fetch_metadata(missing, namespace))
+        return {bug_id: document.get("title") for bug_id, document in documents.items()}
+
+    def check_docstore(self, repair: bool = False, namespace: str = PINECONE_NAMESPACE) -> Dict[str, Any]:
+        """
+        Сверка хранилища документов с векторным индексом
+
+        Недостающие документы восстанавливаются из метаданных индекса (записи,
+        загруженные до появления хранилища) или из BUGS_DATA, документы без
+        векторов удаляются.
+
+        Args:
+            repair: Исправить найденные расхождения
+            namespace: Игра (пространство имен)
+
+        Returns:
+            Отчет DocumentStore.check_consistency, при repair - с числом восстановленных и удаленных документов
+        """
+        if self.docstore is None:
+            return {"enabled": False}
+        index_ids = self.backend.list_ids(namespace)
+        if index_ids is None:
+            logger.warning(f"{self.backend.name} не поддерживает перечисление id, сверка хранилища документов пропущена")
+            return {"enabled": True, "checked": False}
+        report = self.docstore.check_consistency(index_ids, namespace)
+        if report["missing"] or report["orphaned"]:
+            logger.warning(
+                f"Хранилище документов расходится с {self.backend.name}: "
+                f"без документа {len(report['missing'])}, без вектора {len(report['orphaned'])}"
+            )
+        if repair and (report["missing"] or report["orphaned"]):
+            with ingest_lock():
+                report.update(self._repair_docstore(report["missing"], report["orphaned"], namespace))
+        return report
+
+    def _repair_docstore(self, missing: List[str], orphaned: List[str], namespace: str) -> Dict[str, Any]:
+        """Восстановление недостающих документов и удаление лишних"""
+        # Встроенные данные bug_data.py относятся к игре по умолчанию
+        sources = {str(bug["id"]): bug for bug in BUGS_DATA} if namespace == PINECONE_NAMESPACE else {}
+        metadata = self.backend.fetch_metadata(missing, namespace) if missing else {}
+        records, unresolved = [], []
+        for bug_id in missing:
+            document = metadata.get(bug_id) or {}
+            if document.get("title") is None and bug_id in sources:
+                document = {"title": sources[bug_id]["title"], "description": sources[bug_id]["description"]}
+            if document.get("title") is None:
+                unresolved.append(bug_id)
+            else:
+                records.append({"id": bug_id, "metadata": document})
+        if records:
+            self.docstore.upsert(records, namespace)
+        if orphaned:
+            self.docstore.delete(orphaned, namespace)
+        if unresolved:
+            logger.error(f"Не удалось восстановить документы {len(unresolved)} багов, нужна повторная загрузка данных")
+        return {"restored": len(records), "removed": len(orphaned), "unresolved": unresolved}
+
+    def upsert_bugs_data(self, force: bool = False) -> Dict[str, Any]:
         """Загрузка данных о багах в векторную базу"""
         try:
-            vectors = []
-            
-            for bug in BUGS_DATA:
-                # Создаем контекст для векторизации (заголовок + описание)
-                content = f"{bug['title']}. {bug['description']}"
-                vector = self.vectorize_text(content)
-                
-                # Создаем запись для Pinecone
-                vectors.append({
-                    "id": bug["id"],
-                    "values": vector,
-                    "metadata": {
-                        "title": bug["title"],
-                        "description": bug["description"]
-                    }
-                })
-            
-            # Загружаем векторы в Pinecone
-            if vectors:  # Проверяем, есть ли данные для загрузки
-                self.index.upsert(vectors=vectors, namespace=PINECONE_NAMESPACE)
-                logger.info(f"Успешно загружено {len(vectors)} багов в Pinecone")
-            else:
-                logger.warning("Нет данных для загрузки в Pinecone")
+            report = self.ingest(BUGS_DATA, force=force)
+            if not report["seen"]:
+                logger.warning(f"Нет данных для загрузки в {self.backend.name}")
+            return report
         except Exception as e:
-            logger.error(f"Ошибка при загрузке данных в Pinecone: {str(e)}")
-            self.log_error_to_n8n("Ошибка загрузки данных в Pinecone", str(e))
+            logger.error(f"Ошибка при загрузке данных в {self.backend.name}: {str(e)}")
+            self.log_error_to_n8n(f"Ошибка загрузки данных в {self.backend.name}", str(e))
             raise
 
-    def search_bugs(self, query: str, top_k: int = 1) -> List[Dict[str, Any]]:
+    def search_bugs(self, query: str, top_k: int = 1, namespace: str = PINECONE_NAMESPACE) -> List[Dict[str, Any]]:
         """
         Поиск багов по запросу пользователя
         
         Args:
             query: Текстовый запрос пользователя
             top_k: Количество результатов для возврата
+            namespace: Игра (пространство имен индекса)
             
         Returns:
-            Список найденных багов с их метаданными и оценкой схожести
+            Список найденных багов с их метаданными и оценкой схожести; при ответе
+            из резервного индекса у результатов есть поле degraded
+
+        Raises:
+            SearchUnavailableError: Поиск не удался ни в одном индексе
         """
         try:
-            logger.info(f"Векторизация запроса: '{query}'")
-            # Векторизуем запрос
-            query_vector = self.vectorize_text(query)
-            logger.info(f"Запрос успешно векторизован. Размер вектора: {len(query_vector)}")
-            
-            # Ищем ближайшие векторы в Pinecone
-            results = self.index.query(
-                vector=query_vector,
-                top_k=top_k,
-                include_metadata=True,
-                namespace=PINECONE_NAMESPACE
-            )
-            logger.info(f"Получен ответ от Pinecone API")
-            
-            # Формируем результаты
-            bug_results = []
-            if results and hasattr(results, 'matches') and results.matches:
-                logger.info(f"Количество сматченных объектов: {len(results.matches)}")
-                for match in results.matches:
-                    bug_results.append({
-                        "id": match.id,
-                        "score": match.score,
-                        "title": match.metadata.get("title") if match.metadata else None,
-                        "description": match.metadata.get("description") if match.metadata else None
-                    })
-            else:
-                logger.warning(f"Pinecone не вернул смчаченных объектов {results}")
-            
+            fast_results = self._lexical_fast_path(query, top_k, namespace)
+            if fast_results is not None:
+                self.log_query_to_n8n(query, fast_results, namespace)
+                return fast_results
+
+            fetch_k = self._fetch_k(top_k)
+            query_vector = self.cache.get_embedding(query) if self.cache is not None else None
+            if query_vector is None:
+                logger.info(f"Векторизация запроса: '{query}'")
+                # Векторизуем запрос
+                with stage("encode"):
+                    query_vector = self.vectorize_text(query)
+                logger.info(f"Запрос успешно векторизован. Размер вектора: {len(query_vector)}")
+                if self.cache is not None:
+                    self.cache.set_embedding(query, query_vector)
+
+            bug_results = self.cache.get_results(query_vector, fetch_k, namespace) if self.cache is not None else None
+            degraded = None
+            if bug_results is None:
+                # Ищем ближайшие векторы в индексе
+                with stage("vector_query"):
+                    bug_results, degraded = self._query_backends(query, query_vector, fetch_k, namespace)
+                if self.cache is not None and not degraded:
+                    self.cache.set_results(query_vector, fetch_k, namespace, bug_results)
+            bug_results = self._shape(query, bug_results, top_k, degraded, namespace)
 
             # Логируем запрос
-            self.log_query_to_n8n(query, bug_results)
+            self.log_query_to_n8n(query, bug_results, namespace)
 
             return bug_results
+        except SearchUnavailableError:
+            raise
         except Exception as e:
-            logger.error(f"Ошибка при поиске в Pinecone: {str(e)}")
-            self.log_error_to_n8n("Ошибка поиска в Pinecone", str(e))
-            return []
+            raise self._search_failed(e) from e
 
-    def log_error_to_n8n(self, error_type: str, error_message: str) -> None:
-        """Отправка сообщения об ошибке в n8n для логирования в Google Sheets"""
-        if N8N_WEBHOOK_URL:
+    async def asearch_bugs(self, query: str, top_k: int = 1, namespace: str = PINECONE_NAMESPACE) -> List[Dict[str, Any]]:
+        """
+        Асинхронный поиск багов по запросу пользователя
+
+        Векторизация выполняется в ограниченном пуле потоков, запрос к Pinecone -
+        через асинхронный клиент, а события для n8n ставятся в очередь телеметрии и не
+        задерживают ответ. Число одновременных поисков ограничено QUERY_MAX_CONCURRENCY.
+
+        Args:
+            query: Текстовый запрос пользователя
+            top_k: Количество результатов для возврата
+            namespace: Игра (пространство имен индекса)
+
+        Returns:
+            Список найденных багов с их метаданными и оценкой схожести; при ответе
+            из резервного индекса у результатов есть поле degraded
+
+        Raises:
+            SearchUnavailableError: Поиск не удался ни в одном индексе
+        """
+        if self._query_semaphore is None:
+            self._query_semaphore = asyncio.Semaphore(QUERY_MAX_CONCURRENCY)
+
+        async with self._query_semaphore:
             try:
-                event = {
-                    "event_type": "error",
-                    "error_type": error_type,
-                    "error_message": error_message,
-                    "timestamp": datetime.now().isoformat()
-                }
-                response = requests.post(N8N_WEBHOOK_URL, json=event, timeout=3)
-
-                if response.status_code == 200:
-                    logger.info("Данные успешно отправлены в n8n")
-                else:
-                    logger.warning(f"n8n вернул статус {response.status_code}: {response.text}")
-            except requests.exceptions.RequestException as req_e:
-                logger.error(f"Ошибка при отправке уведомления в n8n (RequestException): {str(req_e)}")
+                await self._aload_lexical(namespace)
+                fast_results = self._lexical_fast_path(query, top_k, namespace)
+                if fast_results is not None:
+                    self.log_query_to_n8n(query, fast_results, namespace)
+                    return fast_results
+
+                fetch_k = self._fetch_k(top_k)
+                query_vector = await self._cache_call("get_embedding", query)
+                if query_vector is None:
+                    logger.info(f"Векторизация запроса: '{query}'")
+                    with stage("encode"):
+                        query_vector = await self.avectorize_text(query)
+                    logger.info(f"Запрос успешно векторизован. Размер вектора: {len(query_vector)}")
+                    await self._cache_call("set_embedding", query, query_vector)
+
+                bug_results = await self._cache_call("get_results", query_vector, fetch_k, namespace)
+                degraded = None
+                if bug_results is None:
+                    with stage("vector_query"):
+                        bug_results, degraded = await self._aquery_backends(query, query_vector, fetch_k, namespace)
+                    if not degraded:
+                        await self._cache_call("set_results", query_vector, fetch_k, namespace, bug_results)
+                bug_results = self._shape(query, bug_results, top_k, degraded, namespace)
+
+                self.log_query_to_n8n(query, bug_results, namespace)
+                return bug_results
+            except SearchUnavailableError:
+                raise
             except Exception as e:
-                logger.error(f"Ошибка при отправке уведомления в n8n: {str(e)}")
+                raise self._search_failed(e) from e
+
+    async def asearch_bugs_batch(self, queries: List[str], top_k: int = 1,
+                                 namespace: str = PINECONE_NAMESPACE) -> List[Union[List[Dict[str, Any]], Exception]]:
+        """
+        Пакетный поиск багов по списку запросов
+
+        Все отсутствующие в кэше запросы векторизуются одним вызовом модели.
+        Локальный индекс ищет всю пачку одним матричным умножением, удаленный
+        бэкенд опрашивается конкурентно (не более QUERY_MAX_CONCURRENCY запросов).
+
+        Args:
+            queries: Текстовые запросы пользователей
+            top_k: Количество результатов для каждого запроса
+            namespace: Игра (пространство имен индекса) для всей пачки
 
-    def log_query_to_n8n(self, query: str, results: List[Dict[str, Any]]) -> None:
-        """Отправка логов о запросе пользователя в n8n"""
-        if N8N_WEBHOOK_URL:
+        Returns:
+            Результаты поиска в порядке запросов; для неудачных запросов - исключение
+        """
+        outcomes: List[Union[List[Dict[str, Any]], Exception, None]] = [None] * len(queries)
+        fetch_k = self._fetch_k(top_k)
+        await self._aload_lexical(namespace)
+        for i, query in enumerate(queries):
+            outcomes[i] = self._lexical_fast_path(query, top_k, namespace)
+        vectors: List[Any] = [
+            await self._cache_call("get_embedding", query) if outcomes[i] is None else None
+            for i, query in enumerate(queries)
+        ]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None and outcomes[i] is None]
+        if missing:
             try:
-                event = {
-                    "event_type": "query",
-                    "query": query,
-                    "results_count": len(results),
-                    "top_result_id": results[0]["id"] if results else None,
-                    "top_result_score": results[0]["score"] if results else None,
-                    "timestamp": datetime.now().isoformat()
-                }
-                response = requests.post(N8N_WEBHOOK_URL, json=event, timeout=3)
-
-                if response.status_code == 200:
-                    logger.info("Данные успешно отправлены в n8n")
-                else:
-                    logger.warning(f"n8n вернул статус {response.status_code}: {response.text}")
-            except requests.exceptions.RequestException as req_e:
-                 logger.error(f"Ошибка при отправке логов запроса в n8n (RequestException): {str(req_e)}")
+                loop = asyncio.get_running_loop()
+                with stage("encode"):
+                    encoded = await loop.run_in_executor(
+                        self._encode_executor, self.vectorize_texts, [queries[i] for i in missing]
+                    )
+                for i, vector in zip(missing, encoded):
+                    vectors[i] = vector
+                    await self._cache_call("set_embedding", queries[i], vectors[i])
             except Exception as e:
-                logger.error(f"Ошибка при отправке логов запроса в n8n: {str(e)}") 
\ No newline at end of file
+                logger.error(f"Ошибка пакетной векторизации: {str(e)}")
+                self.log_error_to_n8n("Ошибка пакетной векторизации", str(e))
+                for i in missing:
+                    outcomes[i] = e
+
+        pending = []
+        for i, vector in enumerate(vectors):
+            if outcomes[i] is not None:
+                continue
+            cached = await self._cache_call("get_results", vector, fetch_k, namespace)
+            if cached is not None:
+                outcomes[i] = self._shape(queries[i], cached, top_k, None, namespace)
+            else:
+                pending.append(i)
+
+        if pending:
+            if self.backend.is_local:
+                try:
+                    with stage("vector_query"):
+                        found = await self.backend.aquery_batch([vectors[i] for i in pending], fetch_k, namespace)
+                    searched = [(results, None) for results in found]
+                except Exception as e:
+                    searched = [e] * len(pending)
+            else:
+                if self._query_semaphore is None:
+                    self._query_semaphore = asyncio.Semaphore(QUERY_MAX_CONCURRENCY)
+
+                async def search_one(i):
+                    async with self._query_semaphore:
+                        return await self._aquery_backends(queries[i], vectors[i], fetch_k, namespace)
+
+                with stage("vector_query"):
+                    searched = await asyncio.gather(*(search_one(i) for i in pending), return_exceptions=True)
+
+            for i, outcome in zip(pending, searched):
+                if isinstance(outcome, Exception):
+                    logger.error(f"Ошибка при поиске в {self.backend.name}: {str(outcome)}")
+                    self.log_error_to_n8n(f"Ошибка поиска в {self.backend.name}", str(outcome))
+                    outcomes[i] = outcome
+                    continue
+                bug_results, degraded = outcome
+                if not degraded:
+                    await self._cache_call("set_results", vectors[i], fetch_k, namespace, bug_results)
+                outcomes[i] = self._shape(queries[i], bug_results, top_k, degraded, namespace)
+
+        for query, outcome in zip(queries, outcomes):
+            if not isinstance(outcome, Exception):
+                self.log_query_to_n8n(query, outcome, namespace)
+        return outcomes
+
+    async def _aload_lexical(self, namespace: str) -> None:
+        """Построение лексического индекса игры (чтение хранилища документов) в пуле потоков, а не в event loop"""
+        if self.lexical is not None and not self.lexical.is_current(namespace):
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._encode_executor, self.lexical.load, namespace)
+
+    def _lexical_search(self, query: str, top_k: int, namespace: str) -> Tuple[List[Dict[str, Any]], Set[str]]:
+        """
+        Поиск BM25; в event loop - только по уже загруженному индексу
+
+        Проверка версии хранилища документов и построение индекса читают SQLite, поэтому
+        в асинхронных путях они выполняются заранее в пуле потоков (_aload_lexical).
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self.lexical.search(query, top_k, namespace)
+        return self.lexical.search(query, top_k, namespace, load=False)
+
+    def _fetch_k(self, top_k: int) -> int:
+        """Число кандидатов векторного поиска: при гибридном поиске берем запас для переранжирования"""
+        return max(top_k, HYBRID_CANDIDATES) if self.lexical is not None else top_k
+
+    def _lexical_fast_path(self, query: str, top_k: int, namespace: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Ответ без векторизации для коротких запросов из ключевых слов
+
+        Срабатывает, когда все слова запроса (не больше LEXICAL_FAST_PATH_MAX_TOKENS)
+        встречаются ровно в одном баге.
+
+        Returns:
+            Результат с уверенностью LEXICAL_FAST_PATH_CONFIDENCE или None, если нужен полный поиск
+        """
+        if self.lexical is None or not LEXICAL_FAST_PATH or top_k != 1:
+            return None
+        terms = set(tokenize(query))
+        if not terms or len(terms) > LEXICAL_FAST_PATH_MAX_TOKENS:
+            return None
+        with stage("lexical"):
+            results, matched = self._lexical_search(query, 1, namespace)
+        if len(matched) != 1 or not results or results[0]["id"] not in matched:
+            return None
+        LEXICAL_FAST_PATH_HITS.inc()
+        best = results[0]
+        return [dict(best, lexical_score=best["score"], score=LEXICAL_FAST_PATH_CONFIDENCE)]
+
+    def _fuse(self, query: str, vector_results: List[Dict[str, Any]], top_k: int, namespace: str) -> List[Dict[str, Any]]:
+        """Переранжирование векторных кандидатов с учетом оценки BM25"""
+        if self.lexical is None:
+            return vector_results[:top_k]
+        with stage("lexical"):
+            lexical_results, _ = self._lexical_search(query, self._fetch_k(top_k), namespace)
+            return fuse_results(vector_results, lexical_results, HYBRID_LEXICAL_WEIGHT, top_k)
+
+    def _shape(self, query: str, results: List[Dict[str, Any]], top_k: int,
+               degraded: Optional[str], namespace: str) -> List[Dict[str, Any]]:
+        """Переранжирование кандидатов, подстановка текстов из хранилища документов и пометка деградированного пути"""
+        if degraded != "lexical":
+            results = self._fuse(query, results, top_k, namespace)
+        if self.docstore is not None:
+            with stage("hydrate"):
+                results = self.docstore.hydrate(results, namespace)
+        if degraded:
+            results = [dict(result, degraded=degraded) for result in results]
+        return results
+
+    def _query_backends(self, query: str, query_vector: np.ndarray, top_k: int,
+                        namespace: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Поиск в основном бэкенде с переключением на резервный индекс при ошибке
+
+        Returns:
+            Результаты поиска и источник деградированного ответа (local, lexical) или None
+        """
+        try:
+            return self.backend.query(query_vector, top_k, namespace), None
+        except Exception as e:
+            error = self._primary_failed(e)
+        if self.fallback is not None:
+            try:
+                results = self.fallback.query(query_vector, top_k, namespace)
+                return self._degraded("local", results), "local"
+            except Exception as fallback_error:
+                logger.error(f"Ошибка поиска в резервном локальном индексе: {str(fallback_error)}")
+        return self._lexical_degraded(query, top_k, error, namespace), "lexical"
+
+    async def _aquery_backends(self, query: str, query_vector: np.ndarray, top_k: int,
+                               namespace: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Асинхронный поиск (дедлайн и hedging - в ResilientBackend) с переключением на резервный индекс"""
+        try:
+            return await self.backend.aquery(query_vector, top_k, namespace), None
+        except Exception as e:
+            error = self._primary_failed(e)
+        if self.fallback is not None:
+            try:
+                results = await self.fallback.aquery(query_vector, top_k, namespace)
+                return self._degraded("local", results), "local"
+            except Exception as fallback_error:
+                logger.error(f"Ошибка поиска в резервном локальном индексе: {str(fallback_error)}")
+        return self._lexical_degraded(query, top_k, error, namespace), "lexical"
+
+    def _primary_failed(self, error: Exception) -> Exception:
+        """Логирование ошибки основного индекса; открытый автомат не логируется в n8n на каждый запрос"""
+        message = str(error) or type(error).__name__
+        logger.warning(f"Ошибка поиска в {self.backend.name}, используется деградированный путь: {message}")
+        if not isinstance(error, SearchUnavailableError):
+            self.log_error_to_n8n(f"Ошибка поиска в {self.backend.name}", message)
+        return error
+
+    def _lexical_degraded(self, query: str, top_k: int, error: Exception, namespace: str) -> List[Dict[str, Any]]:
+        """Ответ лексического индекса BM25, когда векторный поиск недоступен"""
+        results = []
+        if self.lexical is not None:
+            with stage("lexical"):
+                results, _ = self._lexical_search(query, top_k, namespace)
+        if not results:
+            retry_after = getattr(error, "retry_after", 0.0)
+            raise SearchUnavailableError(f"Индекс {self.backend.name} недоступен: {str(error) or type(error).__name__}", retry_after)
+        return self._degraded("lexical", results)
+
+    @staticmethod
+    def _degraded(source: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        FALLBACK_QUERIES.inc()
+        DEGRADED_RESPONSES.labels(source).inc()
+        return results
+
+    def _search_failed(self, error: Exception) -> SearchUnavailableError:
+        """Ошибка поиска для вызывающего кода: отличается от пустого результата ("Не знаю")"""
+        logger.error(f"Ошибка при поиске в {self.backend.name}: {str(error)}")
+        self.log_error_to_n8n(f"Ошибка поиска в {self.backend.name}", str(error))
+        return SearchUnavailableError(f"Ошибка поиска: {str(error) or type(error).__name__}")
+
+    async def _cache_call(self, method: str, *args) -> Any:
+        """Обращение к кэшу; сетевой бэкенд вызывается в пуле потоков, чтобы не блокировать event loop"""
+        if self.cache is None:
+            return None
+        func = getattr(self.cache, method)
+        with stage("cache"):
+            if self.cache.is_local:
+                return func(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._io_executor, func, *args)
+
+    async def aclose(self) -> None:
+        """Освобождение клиентов индекса и пулов потоков"""
+        await self.backend.aclose()
+        await self.encoder.close()
+        await asyncio.get_running_loop().run_in_executor(None, self.telemetry.close)
+        await asyncio.get_running_loop().run_in_executor(None, self.query_log.close)
+        self._encode_executor.shutdown(wait=False)
+        self._io_executor.shutdown(wait=False)
+
+    def log_error_to_n8n(self, error_type: str, error_message: str) -> None:
+        """Постановка сообщения об ошибке в очередь телеметрии n8n для логирования в Google Sheets"""
+        ERRORS.labels(error_type).inc()
+        self.telemetry.emit({
+            "event_type": "error",
+            "error_type": error_type,
+            "error_message": error_message,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    def log_query_to_n8n(self, query: str, results: List[Dict[str, Any]], namespace: str = PINECONE_NAMESPACE) -> None:
+        """Постановка лога о запросе пользователя в очередь телеметрии n8n"""
+        with stage("telemetry"):
+            self.telemetry.emit({
+                "event_type": "query",
+                "query": query,
+                "namespace": namespace,
+                "results_count": len(results),
+                "top_result_id": results[0]["id"] if results else None,
+                "top_result_score": results[0]["score"] if results else None,
+                "timestamp": datetime.now().isoformat()
+            })
@@ -0,0 +1,108 @@
+"""
+Тесты контроля допуска: ограничение полос, очередь и отказ 503 с Retry-After при перегрузке
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.chatbot_app import main
+from src.chatbot_app.admission import AdmissionController, OverloadedError
+
+
+async def wait_queued(controller: AdmissionController, depth: int) -> None:
+    while controller.queue_depth() < depth:
+        await asyncio.sleep(0)
+
+
+def test_queued_request_gets_released_slot():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout_ms=1000)
+        first = await controller.acquire()
+        waiter = asyncio.ensure_future(controller.acquire())
+        await wait_queued(controller, 1)
+        assert not waiter.done()
+        first.release()
+        second = await waiter
+        # Место передано ожидающему, а не освобождено: в обработке по-прежнему один запрос
+        assert controller.stats()["in_flight"] == 1
+        second.release()
+        second.release()
+        assert controller.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected_with_retry_after(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(main, "admission", AdmissionController(max_in_flight=1, max_queue=0, queue_timeout_ms=1000))
+        await main.admit("interactive")
+        with pytest.raises(HTTPException) as error:
+            await main.admit("interactive")
+        return error.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
+
+
+def test_long_expected_wait_is_rejected_before_queueing():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout_ms=20)
+        slot = await controller.acquire()
+        await asyncio.sleep(0.05)
+        slot.release()
+        # Средняя обработка 50 мс при дедлайне очереди 20 мс: ждать бессмысленно
+        await controller.acquire()
+        with pytest.raises(OverloadedError) as error:
+            await controller.acquire()
+        assert error.value.reason == "expected_wait"
+        assert controller.queue_depth() == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_deadline_rejects_waiting_request():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout_ms=30)
+        await controller.acquire()
+        with pytest.raises(OverloadedError) as error:
+            await controller.acquire()
+        assert error.value.reason == "queue_timeout"
+        assert error.value.retry_after >= 1
+        assert controller.queue_depth() == 0
+
+    asyncio.run(scenario())
+
+
+def test_interactive_lane_goes_first_and_sheds_batch():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=2, queue_timeout_ms=1000, priority_lanes=True)
+        slot = await controller.acquire("interactive")
+        old_batch = asyncio.ensure_future(controller.acquire("batch"))
+        new_batch = asyncio.ensure_future(controller.acquire("batch"))
+        await wait_queued(controller, 2)
+
+        # Очередь заполнена: interactive запрос вытесняет последний batch запрос
+        interactive = asyncio.ensure_future(controller.acquire("interactive"))
+        await wait_queued(controller, 2)
+        with pytest.raises(OverloadedError) as error:
+            await new_batch
+        assert error.value.reason == "shed"
+
+        # Освободившееся место получает interactive запрос, хотя batch ждет дольше
+        slot.release()
+        granted = await interactive
+        assert controller.queue_depth("batch") == 1 and not old_batch.done()
+        granted.release()
+        (await old_batch).release()
+        assert controller.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_unknown_priority_header_falls_back_to_interactive():
+    assert AdmissionController.lane(" Batch ") == "batch"
+    assert AdmissionController.lane("urgent") == "interactive"
+    assert AdmissionController.lane(None, default="batch") == "batch"
@@ -0,0 +1,64 @@
+"""
+Тесты кэша поиска: сброс результатов после загрузки данных в другом процессе
+"""
+
+import numpy as np
+
+from src.chatbot_app.cache import IndexGeneration, InMemoryCache, QueryCache
+
+VECTOR = np.arange(8, dtype=np.float32)
+RESULTS = [{"id": "bug-1", "score": 0.9}]
+
+
+def make_cache(path: str, check_interval: float = 0) -> QueryCache:
+    """Кэш отдельного воркера: свой кэш в памяти и общий файл поколений"""
+    return QueryCache(
+        embeddings=InMemoryCache(16, 0), results=InMemoryCache(16, 0),
+        generation=IndexGeneration(path, check_interval=check_interval),
+    )
+
+
+def test_load_in_other_process_invalidates_results(tmp_path):
+    path = str(tmp_path / "generation.json")
+    worker = make_cache(path)
+    worker.set_results(VECTOR, 5, "game", RESULTS)
+    assert worker.get_results(VECTOR, 5, "game") == RESULTS
+
+    # Загрузка данных в другом процессе (воркер или CLI) увеличивает поколение игры
+    assert IndexGeneration(path).bump("game") == 1
+    assert worker.get_results(VECTOR, 5, "game") is None
+    # Кэш других игр не затрагивается
+    worker.set_results(VECTOR, 5, "other", RESULTS)
+    IndexGeneration(path).bump("game")
+    assert worker.get_results(VECTOR, 5, "other") == RESULTS
+
+
+def test_generation_file_is_checked_once_per_interval(tmp_path):
+    path = str(tmp_path / "generation.json")
+    worker = make_cache(path, check_interval=3600)
+    worker.set_results(VECTOR, 5, "game", RESULTS)
+    IndexGeneration(path).bump("game")
+    # До следующей проверки файла воркер отдает результаты прежнего поколения
+    assert worker.get_results(VECTOR, 5, "game") == RESULTS
+    worker.generation._checked = None
+    assert worker.get_results(VECTOR, 5, "game") is None
+
+
+def test_generation_does_not_go_back(tmp_path):
+    path = tmp_path / "generation.json"
+    generation = IndexGeneration(str(path), check_interval=0)
+    generation.bump("game")
+    generation.bump("game")
+    # Файл перезаписан старым значением или поврежден: поколение не уменьшается
+    path.write_text('{"game": 1}', encoding="utf-8")
+    assert generation.get("game") == 2
+    path.write_text("{", encoding="utf-8")
+    assert generation.get("game") == 2
+    assert generation.bump("game") == 3
+
+
+def test_without_file_generation_is_local(tmp_path):
+    generation = IndexGeneration("", check_interval=0)
+    assert generation.get("game") == 0
+    assert generation.bump("game") == 1
+    assert generation.get("game") == 1
@@ -0,0 +1,123 @@
+"""
+Тесты поиска дубликатов: приближенный поиск пар относительно точного
+"""
+
+import numpy as np
+import pytest
+
+from src.chatbot_app.duplicates import DuplicateChecker, find_duplicate_pairs, find_duplicates, group_duplicates
+from src.chatbot_app.vector_backends import IVFIndex, LocalBackend, normalize_rows
+
+
+def make_corpus_with_duplicates(size: int = 2000, dimension: int = 32, clusters: int = 40, seed: int = 0):
+    """Кластеризованный корпус, в котором у каждого пятого бага есть почти точная копия"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    base = centers[rng.integers(0, clusters, size)] + 0.7 * rng.standard_normal((size, dimension)).astype(np.float32)
+    copies = base[::5] + 0.05 * rng.standard_normal((len(base[::5]), dimension)).astype(np.float32)
+    matrix = np.vstack([base, copies])
+    # Перемешиваем строки, чтобы копии получали как меньшие, так и большие номера
+    matrix = matrix[rng.permutation(len(matrix))]
+    return matrix, [f"bug-{i}" for i in range(len(matrix))]
+
+
+def pair_keys(pairs):
+    return {tuple(sorted((pair["id_a"], pair["id_b"]))) for pair in pairs}
+
+
+def reachable_pairs(matrix: np.ndarray, ids, exact, nprobe: int):
+    """Пары точного поиска, чьи кластеры соседствуют хотя бы с одной стороны"""
+    matrix = normalize_rows(np.asarray(matrix, dtype=np.float32))
+    ivf = IVFIndex.train(matrix, 0)
+    neighbours = np.argsort(-(ivf.centroids @ ivf.centroids.T), axis=1)[:, :nprobe]
+    probes = [set(row.tolist()) for row in neighbours]
+    position = {bug_id: i for i, bug_id in enumerate(ids)}
+    result = set()
+    for a, b in exact:
+        cluster_a = ivf.assignments[position[a]]
+        cluster_b = ivf.assignments[position[b]]
+        if cluster_b in probes[cluster_a] or cluster_a in probes[cluster_b]:
+            result.add((a, b))
+    return result
+
+
+def test_ann_pairs_are_subset_of_exact():
+    matrix, ids = make_corpus_with_duplicates()
+    exact = pair_keys(find_duplicate_pairs(matrix, ids, threshold=0.9, method="exact"))
+    ann = pair_keys(find_duplicate_pairs(matrix, ids, threshold=0.9, method="ann", nprobe=2))
+    assert exact
+    assert ann <= exact
+
+
+def test_ann_finds_every_pair_from_neighbouring_clusters():
+    """Пара находится, даже если кластер второго бага не входит в соседей кластера первого"""
+    matrix, ids = make_corpus_with_duplicates()
+    exact = pair_keys(find_duplicate_pairs(matrix, ids, threshold=0.9, method="exact"))
+    ann = pair_keys(find_duplicate_pairs(matrix, ids, threshold=0.9, method="ann", nprobe=2))
+    assert ann == reachable_pairs(matrix, ids, exact, nprobe=2)
+
+
+def test_ann_with_all_clusters_matches_exact():
+    matrix, ids = make_corpus_with_duplicates(size=500)
+    exact = find_duplicate_pairs(matrix, ids, threshold=0.9, method="exact")
+    ann = find_duplicate_pairs(matrix, ids, threshold=0.9, method="ann", nprobe=len(ids))
+    assert pair_keys(ann) == pair_keys(exact)
+    assert len(ann) == len(exact)
+
+
+def test_group_duplicates_joins_transitive_pairs():
+    pairs = [
+        {"id_a": "a", "id_b": "b", "score": 0.95},
+        {"id_a": "b", "id_b": "c", "score": 0.92},
+        {"id_a": "x", "id_b": "y", "score": 0.99},
+    ]
+    groups = group_duplicates(pairs)
+    assert groups == [{"ids": ["a", "b", "c"], "max_score": 0.95}, {"ids": ["x", "y"], "max_score": 0.99}]
+
+
+def test_limited_report_keeps_closest_pairs_and_all_groups():
+    matrix, ids = make_corpus_with_duplicates(size=500)
+    pairs = find_duplicate_pairs(matrix, ids, threshold=0.5, method="exact")
+    report = find_duplicates(matrix, ids, threshold=0.5, method="exact", limit=10)
+    assert report["pair_count"] == len(pairs) > 10
+    assert [pair["score"] for pair in report["pairs"]] == pytest.approx([pair["score"] for pair in pairs[:10]])
+    groups = group_duplicates(pairs)
+    assert report["group_count"] == len(groups)
+    assert report["groups"] == groups[:10]
+
+
+def test_ann_report_counts_each_pair_once():
+    matrix, ids = make_corpus_with_duplicates()
+    pairs = find_duplicate_pairs(matrix, ids, threshold=0.9, method="ann", nprobe=2)
+    report = find_duplicates(matrix, ids, threshold=0.9, method="ann", nprobe=2, limit=5)
+    assert report["pair_count"] == len(pairs) == len(pair_keys(pairs))
+    assert len(report["pairs"]) == 5
+
+
+def test_checker_finds_duplicates_across_batches_of_one_run():
+    """Предыдущие пачки загрузки еще не в индексе, но сравниваются с новой пачкой"""
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((4, 16)).astype(np.float32)
+    copy = vectors[0] + 0.01 * rng.standard_normal(16).astype(np.float32)
+    backend = LocalBackend()
+    backend.start(16)
+    checker = DuplicateChecker(backend, "game", threshold=0.95)
+    first = checker([{"id": f"bug-{i}", "values": vectors[i]} for i in range(4)])
+    second = checker([{"id": "bug-copy", "values": copy}, {"id": "bug-0", "values": vectors[0]}])
+    assert first == []
+    assert [(item["id"], item["duplicate_of"]) for item in second] == [("bug-copy", "bug-0")]
+
+
+def test_checker_keeps_only_last_batches_of_run():
+    """Буфер загрузки ограничен: проверка пачки не растет с размером загрузки"""
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((6, 16)).astype(np.float32)
+    backend = LocalBackend()
+    backend.start(16)
+    checker = DuplicateChecker(backend, "game", threshold=0.95, run_buffer=4)
+    checker([{"id": f"bug-{i}", "values": vectors[i]} for i in range(2)])
+    checker([{"id": f"bug-{i}", "values": vectors[i]} for i in range(2, 6)])
+    assert sum(len(ids) for ids in checker._checked_ids) == 4
+    # bug-0 вытеснен из буфера, bug-5 еще в нем
+    found = checker([{"id": "copy-0", "values": vectors[0]}, {"id": "copy-5", "values": vectors[5]}])
+    assert [(item["id"], item["duplicate_of"]) for item in found] == [("copy-5", "bug-5")]
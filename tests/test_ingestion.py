@@ -0,0 +1,87 @@
+"""
+Тесты загрузки багов: пропуск неизмененных, перезагрузка измененных и удаление пропавших
+"""
+
+import hashlib
+
+import numpy as np
+
+from src.chatbot_app.ingestion import IngestManifest, IngestionPipeline
+from src.chatbot_app.vector_backends import LocalBackend
+
+DIMENSION = 16
+
+
+class FakeEncoder:
+    """Детерминированные эмбеддинги по хэшу текста и учет закодированных текстов"""
+
+    def __init__(self):
+        self.encoded = []
+
+    def __call__(self, texts):
+        self.encoded.extend(texts)
+        return [
+            np.random.default_rng(int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)).standard_normal(DIMENSION)
+            for text in texts
+        ]
+
+
+def make_bugs(count: int):
+    return [{"id": f"bug-{i}", "title": f"Bug {i}", "description": f"Steps to reproduce {i}"} for i in range(count)]
+
+
+def make_backend(path: str = "") -> LocalBackend:
+    backend = LocalBackend(path, index_type="flat", quantization="none")
+    backend.start(DIMENSION)
+    return backend
+
+
+def test_second_run_skips_unchanged_bugs(tmp_path):
+    backend, encoder = make_backend(), FakeEncoder()
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    first = IngestionPipeline(encoder, [backend], "game", manifest, encode_batch_size=4).run(make_bugs(10))
+    assert (first["upserted"], first["skipped"]) == (10, 0)
+
+    encoder.encoded.clear()
+    second = IngestionPipeline(encoder, [backend], "game", manifest, encode_batch_size=4).run(make_bugs(10))
+    assert (second["upserted"], second["skipped"], second["deleted"]) == (0, 10, 0)
+    assert encoder.encoded == []
+
+
+def test_changed_bug_is_reencoded_and_missing_bug_deleted(tmp_path):
+    backend, encoder = make_backend(), FakeEncoder()
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    IngestionPipeline(encoder, [backend], "game", manifest).run(make_bugs(10))
+
+    bugs = make_bugs(10)[:-1]
+    bugs[0]["description"] = "Crash after loading a save"
+    encoder.encoded.clear()
+    report = IngestionPipeline(encoder, [backend], "game", manifest).run(bugs)
+    assert (report["upserted"], report["skipped"], report["deleted"]) == (1, 8, 1)
+    assert encoder.encoded == ["Bug 0. Crash after loading a save"]
+    assert "bug-9" not in backend.list_ids("game")
+    assert manifest.hashes("game").keys() == {bug["id"] for bug in bugs}
+
+
+def test_keep_missing_bugs_without_delete_missing(tmp_path):
+    backend, encoder = make_backend(), FakeEncoder()
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    IngestionPipeline(encoder, [backend], "game", manifest).run(make_bugs(10))
+    report = IngestionPipeline(encoder, [backend], "game", manifest).run(make_bugs(5), delete_missing=False)
+    assert (report["skipped"], report["deleted"]) == (5, 0)
+    assert backend.count("game") == 10
+    assert len(manifest.hashes("game")) == 10
+
+
+def test_new_process_without_manifest_skips_bugs_from_saved_index(tmp_path):
+    """Манифест не сохраняется на диск: хэши берутся из метаданных загруженного индекса"""
+    index_path = str(tmp_path / "index")
+    IngestionPipeline(FakeEncoder(), [make_backend(index_path)], "game", IngestManifest("")).run(make_bugs(10))
+
+    # Новый процесс: пустой манифест и индекс, загруженный с диска
+    backend, encoder = make_backend(index_path), FakeEncoder()
+    bugs = make_bugs(10)[1:]
+    report = IngestionPipeline(encoder, [backend], "game", IngestManifest("")).run(bugs)
+    assert (report["upserted"], report["skipped"], report["deleted"]) == (0, 9, 1)
+    assert encoder.encoded == []
+    assert sorted(backend.list_ids("game")) == sorted(bug["id"] for bug in bugs)
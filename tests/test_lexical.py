@@ -0,0 +1,80 @@
+"""
+Тесты лексического индекса: сброс при изменении хранилища документов другим процессом
+"""
+
+from src.chatbot_app.docstore import DocumentStore
+from src.chatbot_app.lexical import LexicalIndex, iter_lexical_records
+
+
+def bug_record(bug_id: str, title: str, description: str):
+    return {"id": bug_id, "metadata": {"title": title, "description": description}}
+
+
+def found_ids(index: LexicalIndex, query: str):
+    results, _ = index.search(query, 5, "game")
+    return [result["id"] for result in results]
+
+
+def test_index_is_rebuilt_after_external_docstore_change(tmp_path):
+    path = str(tmp_path / "docstore.sqlite3")
+    docstore = DocumentStore(path)
+    docstore.upsert([bug_record("bug-1", "Crash on startup", "The game crashes after the logo")], "game")
+    index = LexicalIndex(
+        loader=lambda namespace: iter_lexical_records(docstore.iter_documents(namespace)),
+        version=docstore.data_version, version_check_interval=0,
+    )
+    assert found_ids(index, "crash") == ["bug-1"]
+
+    # Другой процесс (отдельное соединение) удаляет баг и добавляет новый в обход индекса
+    other = DocumentStore(path)
+    other.delete(["bug-1"], "game")
+    other.upsert([bug_record("bug-2", "Crash in menu", "Opening settings crashes the game")], "game")
+
+    assert not index.is_current("game")
+    assert found_ids(index, "crash") == ["bug-2"]
+
+
+def test_changes_through_index_are_searchable(tmp_path):
+    docstore = DocumentStore(str(tmp_path / "docstore.sqlite3"))
+    docstore.upsert([bug_record("bug-1", "Crash on startup", "The game crashes after the logo")], "game")
+    index = LexicalIndex(
+        loader=lambda namespace: iter_lexical_records(docstore.iter_documents(namespace)),
+        version=docstore.data_version, version_check_interval=0,
+    )
+    index.load("game")
+    record = bug_record("bug-2", "Crash in menu", "Opening settings crashes the game")
+    docstore.upsert([record], "game")
+    index.upsert([record], "game")
+    assert sorted(found_ids(index, "crash")) == ["bug-1", "bug-2"]
+
+
+def test_search_without_load_uses_only_loaded_snapshot(tmp_path):
+    """Поиск из event loop не читает хранилище: незагруженное пространство имен пусто"""
+    docstore = DocumentStore(str(tmp_path / "docstore.sqlite3"))
+    docstore.upsert([bug_record("bug-1", "Crash on startup", "The game crashes after the logo")], "game")
+    loads = []
+
+    def loader(namespace):
+        loads.append(namespace)
+        return iter_lexical_records(docstore.iter_documents(namespace))
+
+    index = LexicalIndex(loader=loader, version=docstore.data_version, version_check_interval=0)
+    assert index.search("crash", 5, "game", load=False) == ([], set())
+    assert loads == []
+    index.load("game")
+    DocumentStore(str(tmp_path / "docstore.sqlite3")).delete(["bug-1"], "game")
+    # Изменение источника учтется при следующей загрузке, а не в поиске без загрузки
+    results, _ = index.search("crash", 5, "game", load=False)
+    assert [result["id"] for result in results] == ["bug-1"]
+    assert loads == ["game"]
+
+
+def test_update_does_not_change_published_snapshot():
+    index = LexicalIndex()
+    index.upsert([bug_record("bug-1", "Crash on startup", "The game crashes after the logo")], "game")
+    snapshot = index._loaded("game")
+    index.upsert([bug_record("bug-2", "Crash in menu", "Opening settings crashes the game")], "game")
+    index.delete(["bug-1"], "game")
+    assert set(snapshot.lengths) == {"bug-1"}
+    assert set(snapshot.postings["crash"]) == {"bug-1"}
+    assert [result["id"] for result in index.search("crash", 5, "game")[0]] == ["bug-2"]
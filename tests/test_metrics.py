@@ -0,0 +1,32 @@
+"""
+Тесты метрик: перенос статистики компонентов в счетчики и gauge prometheus_client
+"""
+
+from prometheus_client import REGISTRY
+
+from src.chatbot_app.metrics import ComponentStats
+
+
+def test_component_counters_grow_by_increment_and_gauges_follow_value():
+    stats = {"sent": 5, "queue_depth": 3, "backend": "n8n"}
+    component = ComponentStats()
+    component.add("test_component", lambda: stats, counters=("sent",))
+    component.refresh()
+    stats.update(sent=8, queue_depth=1)
+    component.refresh()
+    assert REGISTRY.get_sample_value("test_component_sent_total") == 8
+    assert REGISTRY.get_sample_value("test_component_queue_depth") == 1
+    # Сброс статистики компонента не уменьшает счетчик
+    stats["sent"] = 2
+    component.refresh()
+    assert REGISTRY.get_sample_value("test_component_sent_total") == 10
+
+
+def test_start_skips_counts_accumulated_before_fork():
+    stats = {"sent": 5}
+    component = ComponentStats(refresh_interval=3600)
+    component.add("test_forked", lambda: stats, counters=("sent",))
+    component.start()
+    stats["sent"] = 7
+    component.refresh()
+    assert REGISTRY.get_sample_value("test_forked_sent_total") == 2
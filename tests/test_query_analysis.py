@@ -0,0 +1,48 @@
+"""
+Тесты офлайн-анализа журнала: порог Оцу и порог по размеченным запросам
+"""
+
+import numpy as np
+import pytest
+
+from src.chatbot_app.query_analysis import labeled_threshold, otsu_threshold
+
+
+def test_otsu_threshold_separates_two_modes():
+    rng = np.random.default_rng(0)
+    confidence = np.clip(np.concatenate([
+        rng.normal(0.3, 0.05, 500), rng.normal(0.8, 0.05, 300),
+    ]), 0, 1).astype(np.float32)
+    threshold = otsu_threshold(confidence)
+    assert 0.45 < threshold < 0.65
+    assert otsu_threshold(confidence[confidence < threshold]) < threshold
+
+
+def test_otsu_threshold_needs_spread():
+    assert otsu_threshold(np.array([0.7], dtype=np.float32)) is None
+    assert otsu_threshold(np.full(10, 0.7, dtype=np.float32)) is None
+
+
+def test_labeled_threshold_is_lowest_meeting_target_precision():
+    confidence = np.array([0.9, 0.8, 0.7, 0.6, 0.5], dtype=np.float32)
+    correct = np.array([True, True, False, True, False])
+    strict = labeled_threshold(confidence, correct, positives=3, target_precision=1.0)
+    assert strict["threshold"] == pytest.approx(0.8)
+    assert (strict["precision"], strict["recall"]) == (1.0, pytest.approx(2 / 3))
+    assert strict["meets_target"]
+
+    # С более низкой целевой точностью порог опускается и полнота растет
+    relaxed = labeled_threshold(confidence, correct, positives=3, target_precision=0.75)
+    assert relaxed["threshold"] == pytest.approx(0.6)
+    assert (relaxed["precision"], relaxed["recall"]) == (0.75, 1.0)
+
+
+def test_labeled_threshold_does_not_split_equal_scores_and_falls_back_to_f1():
+    confidence = np.array([0.9, 0.9, 0.5], dtype=np.float32)
+    correct = np.array([True, False, True])
+    result = labeled_threshold(confidence, correct, positives=2, target_precision=0.9)
+    # При пороге 0.9 отвечаются оба запроса с этой оценкой (точность 0.5), цель недостижима
+    assert not result["meets_target"]
+    assert result["threshold"] == pytest.approx(0.5)
+    assert result["f1"] == pytest.approx(0.8)
+    assert labeled_threshold(confidence[:0], correct[:0], positives=0, target_precision=0.9) is None
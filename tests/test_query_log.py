@@ -0,0 +1,68 @@
+"""
+Тесты журнала запросов: ротация и сжатие сегментов, ограничение их числа и чтение оборванных сегментов
+"""
+
+import gzip
+import time
+
+from src.chatbot_app.query_log import QueryLog, iter_segment_lines, segment_paths
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "условие не выполнено за отведенное время"
+        time.sleep(0.01)
+
+
+def read_queries(directory: str):
+    return [line for path in segment_paths(directory) for line in iter_segment_lines(path)]
+
+
+def test_segments_rotate_by_size_and_old_ones_are_removed(tmp_path):
+    log = QueryLog(str(tmp_path), flush_interval=0.01, max_segment_mb=100 / 1024 / 1024, max_files=2)
+    for i in range(5):
+        log.emit({"query": f"crash {i}", "padding": "x" * 100})
+        wait_until(lambda: log.stats()["written"] == i + 1)
+    log.close()
+
+    stats = log.stats()
+    assert stats["segments"] == 5 and stats["dropped"] == 0
+    # Закрытые сегменты сжаты, хранятся только два последних
+    paths = segment_paths(str(tmp_path))
+    assert len(paths) == 2 and all(path.endswith(".jsonl.gz") for path in paths)
+    assert [b"crash 3" in line for line in read_queries(str(tmp_path))] == [True, False]
+
+
+def test_segment_rotates_by_age(tmp_path):
+    log = QueryLog(str(tmp_path), flush_interval=0.01, rotate_seconds=1, max_files=0)
+    log.emit({"query": "first"})
+    wait_until(lambda: log.stats()["written"] == 1)
+    log._opened -= 1
+    log.emit({"query": "second"})
+    wait_until(lambda: log.stats()["written"] == 2)
+    log.close()
+    assert log.stats()["segments"] == 2
+    assert len(segment_paths(str(tmp_path))) == 2
+
+
+def test_orphaned_segment_is_compressed_and_partial_line_skipped(tmp_path):
+    # Сегмент процесса, аварийно остановленного посреди записи строки
+    orphan = tmp_path / "queries-20240101T000000.000000-999999999.jsonl"
+    orphan.write_bytes(b'{"query": "complete"}\n{"query": "parti')
+    log = QueryLog(str(tmp_path), flush_interval=0.01)
+    log.emit({"query": "new"})
+    wait_until(lambda: log.stats()["written"] == 1)
+    log.close()
+
+    assert not orphan.exists()
+    with gzip.open(str(orphan) + ".gz", "rb") as f:
+        assert f.read().endswith(b"parti")
+    assert read_queries(str(tmp_path)) == [b'{"query": "complete"}\n', b'{"query": "new"}\n']
+
+
+def test_disabled_log_writes_nothing(tmp_path):
+    log = QueryLog("")
+    log.emit({"query": "crash"})
+    assert not log.enabled
+    assert log.stats()["emitted"] == 0
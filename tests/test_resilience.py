@@ -0,0 +1,136 @@
+"""
+Тесты устойчивого слоя запросов: автомат отключения, hedged-запросы и дедлайны
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.chatbot_app import resilience
+from src.chatbot_app.resilience import CircuitBreaker, CircuitOpenError, ResilientBackend
+from src.chatbot_app.vector_backends import VectorIndexBackend
+
+
+class ScriptedBackend(VectorIndexBackend):
+    """Бэкенд, отвечающий по сценарию: задержка в секундах или исключение для каждого вызова"""
+
+    name = "scripted"
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            step = self.steps[min(self.calls, len(self.steps) - 1)]
+            self.calls += 1
+            return step, self.calls
+
+    def query(self, vector, top_k, namespace):
+        step, call = self._next()
+        if isinstance(step, Exception):
+            raise step
+        time.sleep(step)
+        return [{"id": f"call-{call}", "score": 1.0}]
+
+    async def aquery(self, vector, top_k, namespace):
+        step, call = self._next()
+        if isinstance(step, Exception):
+            raise step
+        await asyncio.sleep(step)
+        return [{"id": f"call-{call}", "score": 1.0}]
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(4) as pool:
+        yield pool
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(resilience, "VECTOR_HEDGE_DELAY_MS", 20)
+
+
+def test_breaker_opens_after_failures_and_closes_after_successful_probe():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert 0 < breaker.retry_after() <= 0.05
+
+    time.sleep(0.06)
+    # После паузы пропускается ровно один пробный запрос
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_released_probe_lets_next_request_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_slow_request_is_hedged(executor):
+    backend = ScriptedBackend(0.5, 0.0)
+    resilient = ResilientBackend(backend, executor, timeout_ms=1000, hedge=True)
+    started = time.perf_counter()
+    assert resilient.query([0.0], 1, "game")[0]["id"] == "call-2"
+    assert time.perf_counter() - started < 0.3
+    assert backend.calls == 2
+
+
+def test_failed_request_is_retried_without_waiting_for_hedge_delay(executor, monkeypatch):
+    monkeypatch.setattr(resilience, "VECTOR_HEDGE_DELAY_MS", 500)
+    backend = ScriptedBackend(RuntimeError("connection reset"), 0.0)
+    resilient = ResilientBackend(backend, executor, timeout_ms=1000, hedge=True)
+    started = time.perf_counter()
+    assert resilient.query([0.0], 1, "game")[0]["id"] == "call-2"
+    assert time.perf_counter() - started < 0.3
+    assert resilient.breaker.snapshot()["consecutive_failures"] == 0
+
+
+def test_deadline_raises_timeout_and_opens_breaker(executor):
+    backend = ScriptedBackend(0.5)
+    resilient = ResilientBackend(backend, executor, timeout_ms=50, hedge=False)
+    resilient.breaker = CircuitBreaker("scripted", failure_threshold=1, reset_seconds=60)
+    started = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        resilient.query([0.0], 1, "game")
+    assert time.perf_counter() - started < 0.3
+
+    # Открытый автомат отклоняет запрос без обращения к индексу
+    with pytest.raises(CircuitOpenError) as error:
+        resilient.query([0.0], 1, "game")
+    assert backend.calls == 1
+    assert error.value.retry_after > 0
+
+
+def test_async_slow_request_is_hedged_and_deadline_applies(executor):
+    backend = ScriptedBackend(0.5, 0.0)
+    resilient = ResilientBackend(backend, executor, timeout_ms=1000, hedge=True)
+    assert asyncio.run(resilient.aquery([0.0], 1, "game"))[0]["id"] == "call-2"
+
+    slow = ResilientBackend(ScriptedBackend(0.5), executor, timeout_ms=50, hedge=False)
+    started = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        asyncio.run(slow.aquery([0.0], 1, "game"))
+    assert time.perf_counter() - started < 0.3
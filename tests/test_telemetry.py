@@ -0,0 +1,99 @@
+"""
+Тесты телеметрии: отправка пачками, сохранение на диск при недоступности n8n и переотправка
+"""
+
+import json
+import os
+
+import pytest
+
+from src.chatbot_app import telemetry
+from src.chatbot_app.telemetry import TelemetrySink
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.text = ""
+
+
+class FakeSession:
+    """Сессия requests, записывающая отправленные пачки; status - код ответа n8n"""
+
+    def __init__(self, status: int = 200):
+        self.status = status
+        self.batches = []
+
+    def post(self, url, json=None, timeout=None):
+        if self.status == 200:
+            self.batches.append(json["events"])
+        return FakeResponse(self.status)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def session(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(telemetry.requests, "Session", lambda: fake)
+    monkeypatch.setattr(telemetry, "TELEMETRY_MAX_RETRIES", 0)
+    return fake
+
+
+def spill_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("spill"))
+
+
+def test_events_are_sent_in_batches(session):
+    sink = TelemetrySink("http://n8n/webhook", batch_size=3, flush_interval=60)
+    for i in range(7):
+        sink.emit({"n": i})
+    sink.close()
+    assert [len(batch) for batch in session.batches] == [3, 3, 1]
+    assert sink.stats()["sent"] == 7
+
+
+def test_failed_batch_is_spilled_to_own_file_and_replayed(session, tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    session.status = 500
+    sink = TelemetrySink("http://n8n/webhook", flush_interval=60, overflow_policy="spill", spill_path=spill_path)
+    sink.emit({"n": 1})
+    sink.close()
+    assert spill_files(tmp_path) == [f"spill-{os.getpid()}.jsonl"]
+    assert sink.stats()["spilled"] == 1
+
+    session.status = 200
+    sink.emit({"n": 2})
+    sink.close()
+    assert [event["n"] for batch in session.batches for event in batch] == [2, 1]
+    assert spill_files(tmp_path) == []
+
+
+def test_replay_skips_truncated_lines_and_takes_files_of_dead_processes(session, tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    # Файл несуществующего процесса, завершившегося посреди записи строки
+    (tmp_path / "spill-999999999.jsonl").write_text(json.dumps({"n": 1}) + "\n" + '{"n": ', encoding="utf-8")
+    sink = TelemetrySink("http://n8n/webhook", flush_interval=60, overflow_policy="spill", spill_path=spill_path)
+    sink.emit({"n": 2})
+    sink.close()
+    assert [event["n"] for batch in session.batches for event in batch] == [2, 1]
+    assert spill_files(tmp_path) == []
+
+
+def test_flusher_survives_unexpected_errors(session, monkeypatch):
+    sink = TelemetrySink("http://n8n/webhook", batch_size=1, flush_interval=0.01)
+    calls = []
+    original = sink._flush
+
+    def failing_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        original()
+
+    monkeypatch.setattr(sink, "_flush", failing_once)
+    sink.emit({"n": 1})
+    sink.close()
+    assert len(calls) >= 2
+    assert session.batches == [[{"n": 1}]]
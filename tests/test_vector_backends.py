@@ -0,0 +1,101 @@
+"""
+Тесты локального индекса: приближенный и сжатый поиск относительно точного
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.chatbot_app.vector_backends import LocalBackend
+
+
+def make_clustered_corpus(size: int = 3000, dimension: int = 32, clusters: int = 30, seed: int = 0):
+    """Кластеризованный корпус и запросы - зашумленные копии случайных багов корпуса"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    matrix = centers[rng.integers(0, clusters, size)] + 0.5 * rng.standard_normal((size, dimension)).astype(np.float32)
+    sources = rng.choice(size, 100, replace=False)
+    queries = matrix[sources] + 0.3 * rng.standard_normal((len(sources), dimension)).astype(np.float32)
+    return matrix, queries
+
+
+def build_backend(matrix: np.ndarray, path: str = "", **options) -> LocalBackend:
+    backend = LocalBackend(path, **options)
+    backend.start(matrix.shape[1])
+    backend.upsert(
+        [{"id": f"bug-{i}", "values": row, "metadata": {"title": f"Bug {i}"}} for i, row in enumerate(matrix)], "game"
+    )
+    return backend
+
+
+def top1(backend: LocalBackend, queries: np.ndarray):
+    return [backend.query(query, 1, "game")[0]["id"] for query in queries]
+
+
+def agreement(left, right) -> float:
+    return sum(a == b for a, b in zip(left, right)) / len(left)
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    matrix, queries = make_clustered_corpus()
+    return matrix, queries, top1(build_backend(matrix, index_type="flat", quantization="none"), queries)
+
+
+def test_ivf_top1_matches_flat(corpus):
+    matrix, queries, expected = corpus
+    backend = build_backend(matrix, index_type="ivf", nlist=32, nprobe=8, min_train_size=1, quantization="none")
+    # Корпус больше min_train_size: поиск идет по кластерам IVF, а не по всей матрице
+    assert backend._namespaces["game"].ivf is not None
+    assert agreement(top1(backend, queries), expected) >= 0.95
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8", "pq"])
+def test_quantized_top1_after_rerank_matches_flat(corpus, quantization):
+    matrix, queries, expected = corpus
+    backend = build_backend(matrix, index_type="flat", quantization=quantization, rerank_candidates=50)
+    results = [backend.query(query, 1, "game")[0] for query in queries]
+    assert agreement([result["id"] for result in results], expected) >= 0.95
+    # После переоценки по float32 оценка - точный косинус, а не приближение по кодам
+    best = int(results[0]["id"].split("-")[1])
+    query = queries[0] / np.linalg.norm(queries[0])
+    assert results[0]["score"] == pytest.approx(float(matrix[best] @ query / np.linalg.norm(matrix[best])), abs=1e-5)
+
+
+def test_saved_index_is_loaded_by_new_backend(corpus, tmp_path):
+    matrix, _, _ = corpus
+    build_backend(matrix[:500], path=str(tmp_path), index_type="flat", quantization="none")
+    backend = LocalBackend(str(tmp_path), index_type="flat", quantization="none")
+    assert backend.start(matrix.shape[1]) is False
+    # Пространство имен загружается с диска при первом обращении
+    assert backend.stored_namespaces() == ["game"]
+    assert backend.count("game") == 0
+    assert backend.query(matrix[7], 1, "game")[0]["id"] == "bug-7"
+    assert backend.count("game") == 500
+
+
+def test_delete_removes_bug_from_results(corpus):
+    matrix, _, _ = corpus
+    backend = build_backend(matrix[:200], index_type="flat", quantization="int8", rerank_candidates=20)
+    backend.delete(["bug-3"], "game")
+    assert backend.count("game") == 199
+    assert all(result["id"] != "bug-3" for result in backend.query(matrix[3], 5, "game"))
+
+
+def test_aquery_returns_same_results_as_query(corpus):
+    matrix, queries, _ = corpus
+    backend = build_backend(matrix[:500], index_type="flat", quantization="none")
+    results = asyncio.run(backend.aquery(queries[0], 5, "game"))
+    assert results == backend.query(queries[0], 5, "game")
+
+
+def test_index_keeps_only_content_hash_with_docstore(corpus, tmp_path):
+    matrix, _, _ = corpus
+    backend = LocalBackend(str(tmp_path), index_type="flat", quantization="none", include_metadata=False)
+    backend.start(matrix.shape[1])
+    backend.upsert([{"id": "bug-0", "values": matrix[0], "metadata": {"title": "Bug 0", "content_hash": "abc"}}], "game")
+    # Названия подставляет хранилище документов, на диске остается только хэш
+    assert backend.query(matrix[0], 1, "game")[0]["title"] is None
+    assert (tmp_path / "game.meta.json").read_text(encoding="utf-8").count("Bug 0") == 0
+    assert backend.fetch_metadata(["bug-0"], "game") == {"bug-0": {"content_hash": "abc"}}